@@ -235,3 +235,58 @@ CRISPY_TEMPLATE_PACK = "bootstrap5"
 # Para usar variable de entorno: export GOOGLE_MAPS_API_KEY='tu-api-key' (Linux/Mac)
 # o set GOOGLE_MAPS_API_KEY=tu-api-key (Windows)
 GOOGLE_MAPS_API_KEY = os.environ.get('GOOGLE_MAPS_API_KEY', '')
+
+
+# Cache compartido por todos los procesos: workers de gunicorn, worker del
+# Procfile y comandos de gestión. Ahí viven los resultados de búsqueda, los
+# tiles del mapa y las versiones que avisan a cada proceso que reconstruya sus
+# índices en memoria (spatial, autocomplete); con un cache por proceso
+# (LocMemCache) cada cambio solo lo vería el proceso que lo hizo.
+# Con REDIS_URL se usa Redis (requiere el paquete redis); si no, una tabla de
+# la base de datos que se crea con: python manage.py createcachetable
+REDIS_URL = os.environ.get('REDIS_URL')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'core_cache',
+            # Con el límite por defecto (300) el cull podría borrar las claves de versión
+            'OPTIONS': {'MAX_ENTRIES': int(os.environ.get('CACHE_MAX_ENTRIES', 10000))},
+        }
+    }
+
+# Índice espacial en memoria de negocios (core/spatial.py)
+# En False las búsquedas por radio usan el prefiltro por bounding box en la base de datos
+SPATIAL_INDEX_ENABLED = os.environ.get('SPATIAL_INDEX_ENABLED', 'True') == 'True'
+# Segundos máximos antes de reconstruirlo aunque no haya cambios notificados
+SPATIAL_INDEX_TTL = int(os.environ.get('SPATIAL_INDEX_TTL', 300))
+
+# Segundos que se guarda en cache cada tile de clusters del mapa (core/maps.py)
+MAP_TILE_CACHE_TIMEOUT = int(os.environ.get('MAP_TILE_CACHE_TIMEOUT', 300))
+
+# Ranking de tendencias (comando compute_trending)
+TRENDING_HALF_LIFE_HOURS = int(os.environ.get('TRENDING_HALF_LIFE_HOURS', 48))
+TRENDING_SIZE = 50
+TRENDING_CATEGORY_SIZE = 20
+
+# Contador de visitas con escritura diferida (core/view_counter.py)
+VIEW_FLUSH_INTERVAL = int(os.environ.get('VIEW_FLUSH_INTERVAL', 10))
+VIEW_FLUSH_THRESHOLD = int(os.environ.get('VIEW_FLUSH_THRESHOLD', 100))
+# Ventana en segundos para contar una sola visita por sesión y oferta (0 = desactivado)
+VIEW_DEDUP_SECONDS = int(os.environ.get('VIEW_DEDUP_SECONDS', 0))
+
+# Índice de autocompletado en memoria (core/autocomplete.py)
+# Segundos máximos antes de reconstruirlo (refresca los puntajes de popularidad)
+AUTOCOMPLETE_INDEX_TTL = int(os.environ.get('AUTOCOMPLETE_INDEX_TTL', 600))
+
+# Segundos que se guardan los resultados de búsqueda y listados (core/search.py).
+# Los cambios de ofertas y negocios los invalidan antes; el tiempo acota lo
+# desactualizados que pueden quedar los órdenes por likes o visitas.
+SEARCH_CACHE_TIMEOUT = int(os.environ.get('SEARCH_CACHE_TIMEOUT', 300))
@@ -31,7 +31,7 @@ class CategoryAdmin(admin.ModelAdmin):
 @admin.register(Offer)
 class OfferAdmin(admin.ModelAdmin):
     list_display = ['title', 'business', 'category', 'original_price', 'final_price', 
-                   'discount_type', 'discount_value', 'expires_at', 'is_active', 'views']
+                   'discount_type', 'discount_value', 'expires_at', 'is_active', 'views', 'likes_count']
     list_filter = ['category', 'discount_type', 'is_active', 'created_at']
     search_fields = ['title', 'business__business_name']
     date_hierarchy = 'created_at'
@@ -43,18 +43,10 @@ class OfferAdmin(admin.ModelAdmin):
 
 @admin.register(Review)
 class ReviewAdmin(admin.ModelAdmin):
-    list_display = ['user', 'offer', 'rating', 'likes_count', 'dislikes_count', 'created_at']
+    list_display = ['user', 'offer', 'rating', 'likes_count', 'dislikes_count', 'replies_count', 'created_at']
     list_filter = ['rating', 'created_at']
     search_fields = ['user__username', 'offer__title', 'comment']
     date_hierarchy = 'created_at'
-    
-    def likes_count(self, obj):
-        return obj.likes.count()
-    likes_count.short_description = 'Likes'
-    
-    def dislikes_count(self, obj):
-        return obj.dislikes.count()
-    dislikes_count.short_description = 'Dislikes'
 
 
 @admin.register(ReviewReply)
@@ -63,14 +55,6 @@ class ReviewReplyAdmin(admin.ModelAdmin):
     list_filter = ['created_at']
     search_fields = ['user__username', 'review__comment', 'comment']
     date_hierarchy = 'created_at'
-    
-    def likes_count(self, obj):
-        return obj.likes.count()
-    likes_count.short_description = 'Likes'
-    
-    def dislikes_count(self, obj):
-        return obj.dislikes.count()
-    dislikes_count.short_description = 'Dislikes'
 
 
 @admin.register(BusinessRequest)
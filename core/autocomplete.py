@@ -0,0 +1,305 @@
+"""
+Índice en memoria para el autocompletado de la búsqueda (search_api).
+
+Cada proceso guarda un arreglo ordenado de (token, tipo, id) con las palabras
+de los títulos de ofertas vigentes, los nombres de negocios activos y los
+nombres de categorías. Un prefijo se resuelve con bisect sobre ese arreglo y
+las respuestas salen de payloads precalculados, sin consultar el ORM.
+
+Los cambios de una oferta o categoría (ver signals.py) se aplican al índice
+de este proceso en el momento y se anotan en un registro numerado en el cache
+compartido (CACHES en settings): los demás workers aplican las entradas que
+les faltan en su próxima búsqueda, sin reconstruir. Solo los cambios masivos
+(negocios, invalidate_autocomplete_index) suben la versión y obligan a
+reconstruir, igual que el índice espacial. AUTOCOMPLETE_INDEX_TTL limita
+cuánto tiempo pueden quedar desactualizados los puntajes de popularidad.
+"""
+import re
+import threading
+import time
+from bisect import bisect_left, insort
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .utils import bump_cache_version, fold_text, get_cache_version
+
+
+VERSION_CACHE_KEY = 'autocomplete:index_version'
+# Número del último cambio registrado; cada cambio vive en CHANGE_CACHE_KEY.format(número)
+CHANGES_CACHE_KEY = 'autocomplete:changes'
+CHANGE_CACHE_KEY = 'autocomplete:change:{}'
+# Con más cambios pendientes que esto conviene reconstruir
+MAX_REPLAY = 500
+MIN_QUERY_LENGTH = 2
+
+# Orden de los tipos en la respuesta
+OFFER, BUSINESS, CATEGORY = 0, 1, 2
+TYPE_LIMITS = {OFFER: 5, BUSINESS: 5, CATEGORY: 3}
+
+
+def tokenize(text):
+    return re.findall(r'\w+', fold_text(text))
+
+
+class AutocompleteIndex:
+    """Arreglo ordenado de tokens más los payloads de cada entrada"""
+
+    def __init__(self):
+        self.tokens = []   # (token, tipo, id) ordenados
+        self.entries = {}  # (tipo, id) -> (tokens, texto, puntaje, vence, payload)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def add(self, kind, pk, text, payload, score=0, expires=None):
+        """Agregar o reemplazar una entrada. expires es un timestamp o None"""
+        self.remove(kind, pk)
+        words = tokenize(text)
+        if not words:
+            return
+        tokens = frozenset(words)
+        self.entries[(kind, pk)] = (tokens, ' '.join(words), score, expires, payload)
+        for token in tokens:
+            insort(self.tokens, (token, kind, pk))
+
+    def bulk_load(self, items):
+        """Cargar muchas entradas (tipo, id, texto, payload, puntaje, vence) de una vez"""
+        for kind, pk, text, payload, score, expires in items:
+            words = tokenize(text)
+            if words:
+                tokens = frozenset(words)
+                self.entries[(kind, pk)] = (tokens, ' '.join(words), score, expires, payload)
+                self.tokens.extend((token, kind, pk) for token in tokens)
+        self.tokens.sort()
+
+    def remove(self, kind, pk):
+        entry = self.entries.pop((kind, pk), None)
+        if entry is None:
+            return
+        for token in entry[0]:
+            position = bisect_left(self.tokens, (token, kind, pk))
+            if position < len(self.tokens) and self.tokens[position] == (token, kind, pk):
+                del self.tokens[position]
+
+    def _prefix_matches(self, prefix):
+        position = bisect_left(self.tokens, (prefix,))
+        while position < len(self.tokens):
+            token, kind, pk = self.tokens[position]
+            if not token.startswith(prefix):
+                break
+            yield kind, pk
+            position += 1
+
+    def query(self, text, limits=TYPE_LIMITS):
+        """
+        Entradas cuyas palabras empiezan con cada término de la búsqueda.
+        Primero las que empiezan con la frase completa, luego por puntaje.
+        """
+        terms = tokenize(text)
+        if not terms:
+            return []
+        phrase = ' '.join(terms)
+        anchor = max(terms, key=len)
+        others = [term for term in terms if term != anchor]
+        now = time.time()
+
+        matches = {}
+        for key in set(self._prefix_matches(anchor)):
+            kind = key[0]
+            if kind not in limits:
+                continue
+            entry = self.entries.get(key)
+            if entry is None:
+                continue
+            tokens, normalized, score, expires, payload = entry
+            if expires is not None and expires <= now:
+                continue
+            if any(not any(token.startswith(term) for token in tokens) for term in others):
+                continue
+            matches.setdefault(kind, []).append(
+                (not normalized.startswith(phrase), -score, normalized, payload)
+            )
+
+        results = []
+        for kind in sorted(matches):
+            ranked = sorted(matches[kind], key=lambda match: match[:3])
+            results.extend(match[3] for match in ranked[:limits[kind]])
+        return results
+
+
+# ==================== ENTRADAS ====================
+
+def _offer_item(offer_id, title, business_name, score, expires_at):
+    payload = {
+        'type': 'offer',
+        'id': offer_id,
+        'title': title,
+        'business': business_name,
+        'url': f'/offers/{offer_id}/',
+    }
+    return OFFER, offer_id, title, payload, score, expires_at.timestamp()
+
+
+def _business_item(business_id, business_name, description):
+    payload = {
+        'type': 'business',
+        'id': business_id,
+        'title': business_name,
+        'description': description[:100],
+        'url': f'/business/{business_id}/',
+    }
+    return BUSINESS, business_id, business_name, payload, 0, None
+
+
+def _category_item(category_id, name):
+    payload = {
+        'type': 'category',
+        'id': category_id,
+        'title': name,
+        'url': f'/offers/?category={category_id}',
+    }
+    return CATEGORY, category_id, name, payload, 0, None
+
+
+def _load_items():
+    from .models import Category, Offer, User
+
+    offers = Offer.objects.filter(
+        is_active=True,
+        expires_at__gt=timezone.now(),
+        business__business_verified=True,
+        business__business_vetted=False,
+    ).values_list('id', 'title', 'business__business_name', 'popularity_score', 'expires_at')
+    for row in offers.iterator(chunk_size=2000):
+        yield _offer_item(*row)
+
+    businesses = User.objects.active_businesses().values_list('id', 'business_name', 'business_description')
+    for row in businesses.iterator(chunk_size=2000):
+        yield _business_item(*row)
+
+    for row in Category.objects.values_list('id', 'name'):
+        yield _category_item(*row)
+
+
+# ==================== ÍNDICE DEL PROCESO ====================
+
+_lock = threading.Lock()
+_index = None
+_index_version = None
+_index_change = 0
+_index_built_at = 0
+
+
+def _replay(index, change):
+    """Aplicar un cambio registrado: (tipo, id, entrada) o (tipo, id, None) para quitarla"""
+    kind, pk, item = change
+    if item is None:
+        index.remove(kind, pk)
+    else:
+        index.add(*item)
+
+
+def _catch_up(last_change):
+    """
+    Aplicar al índice los cambios registrados hasta last_change. Un cambio que
+    falta al final puede estar escribiéndose todavía: se reintenta en la
+    próxima búsqueda. Retorna False si falta uno seguido de otros presentes
+    (se perdió del cache) y hay que reconstruir.
+    """
+    global _index_change
+
+    keys = [CHANGE_CACHE_KEY.format(number) for number in range(_index_change + 1, last_change + 1)]
+    changes = cache.get_many(keys)
+    for key in keys:
+        if key not in changes:
+            return not any(later in changes for later in keys[keys.index(key) + 1:])
+        _replay(_index, changes[key])
+        _index_change += 1
+    return True
+
+
+def get_autocomplete_index():
+    """Índice del proceso actual, al día con los cambios registrados o reconstruido"""
+    global _index, _index_version, _index_change, _index_built_at
+
+    state = cache.get_many([VERSION_CACHE_KEY, CHANGES_CACHE_KEY])
+    version, last_change = state.get(VERSION_CACHE_KEY, 0), state.get(CHANGES_CACHE_KEY, 0)
+    ttl = getattr(settings, 'AUTOCOMPLETE_INDEX_TTL', 600)
+    index = _index
+    if (index is not None and _index_version == version and _index_change == last_change
+            and time.monotonic() - _index_built_at < ttl):
+        return index
+
+    with _lock:
+        usable = (
+            _index is not None and _index_version == version
+            and _index_change <= last_change <= _index_change + MAX_REPLAY
+            and time.monotonic() - _index_built_at < ttl
+        )
+        if not (usable and _catch_up(last_change)):
+            # Los cambios registrados mientras se carga se vuelven a aplicar
+            # después; add y remove reemplazan, así que repetirlos no duplica
+            index = AutocompleteIndex()
+            index.bulk_load(_load_items())
+            _index = index
+            _index_version = version
+            _index_change = last_change
+            _index_built_at = time.monotonic()
+        return _index
+
+
+def invalidate_autocomplete_index():
+    """Forzar la reconstrucción del índice en todos los procesos"""
+    global _index
+
+    _index = None
+    bump_cache_version(VERSION_CACHE_KEY)
+
+
+def _apply_change(kind, pk, item=None):
+    """
+    Registrar el cambio de una entrada (item None la quita) para todos los
+    procesos y aplicarlo al índice de este si está al día.
+    """
+    global _index_change
+
+    number = bump_cache_version(CHANGES_CACHE_KEY)
+    ttl = getattr(settings, 'AUTOCOMPLETE_INDEX_TTL', 600)
+    # Un índice más viejo que el TTL se reconstruye: no necesita cambios más antiguos
+    cache.set(CHANGE_CACHE_KEY.format(number), (kind, pk, item), timeout=2 * ttl)
+
+    with _lock:
+        if _index is not None and _index_change == number - 1:
+            _replay(_index, (kind, pk, item))
+            _index_change = number
+
+
+def autocomplete(query):
+    """Sugerencias (payloads listos para JSON) para lo que el usuario va escribiendo"""
+    if len(query.strip()) < MIN_QUERY_LENGTH:
+        return []
+    return get_autocomplete_index().query(query)
+
+
+def refresh_offer(offer):
+    """Agregar, actualizar o quitar una oferta según esté vigente o no"""
+    business = offer.business
+    if offer.is_active and offer.expires_at > timezone.now() and business.business_verified and not business.business_vetted:
+        item = _offer_item(offer.pk, offer.title, business.business_name, offer.popularity_score, offer.expires_at)
+        _apply_change(OFFER, offer.pk, item)
+    else:
+        remove_offer(offer.pk)
+
+
+def remove_offer(offer_id):
+    _apply_change(OFFER, offer_id)
+
+
+def refresh_category(category):
+    _apply_change(CATEGORY, category.pk, _category_item(category.pk, category.name))
+
+
+def remove_category(category_id):
+    _apply_change(CATEGORY, category_id)
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from core.models import Offer
+from core.search import invalidate_search_results
+
+
+class Command(BaseCommand):
+    help = 'Recalcula el precio final, el ahorro y la proporción de ahorro guardados de todas las ofertas'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        offers = Offer.objects.only(*Offer.PRICE_FIELDS).order_by('pk')
+        batch = []
+        updated = 0
+        for offer in offers.iterator(chunk_size=batch_size):
+            offer.update_prices()
+            batch.append(offer)
+            if len(batch) >= batch_size:
+                updated += Offer.objects.bulk_update(batch, ['final_price', 'discount_amount', 'savings_ratio'])
+                batch = []
+        if batch:
+            updated += Offer.objects.bulk_update(batch, ['final_price', 'discount_amount', 'savings_ratio'])
+        # bulk_update no dispara señales: descartar los resultados guardados con los precios viejos
+        invalidate_search_results()
+        self.stdout.write(self.style.SUCCESS(f'Precios recalculados para {updated} ofertas'))
@@ -0,0 +1,55 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from core.utils import calculate_distance, calculate_distances
+
+
+class Command(BaseCommand):
+    help = 'Compara calculate_distance (escalar) con calculate_distances (NumPy)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', nargs='+', type=int, default=[1_000, 100_000, 1_000_000],
+            help='Cantidad de puntos a evaluar en cada corrida'
+        )
+        parser.add_argument(
+            '--repeat', type=int, default=3,
+            help='Repeticiones por tamaño (se reporta el mejor tiempo)'
+        )
+
+    def handle(self, *args, **options):
+        origin_lat, origin_lon = 8.9824, -79.5199  # Ciudad de Panamá
+        rng = np.random.default_rng(42)
+
+        self.stdout.write(f"{'puntos':>10} {'escalar (ms)':>14} {'numpy (ms)':>12} {'aceleración':>12}")
+        for size in options['sizes']:
+            lats = rng.uniform(-90, 90, size)
+            lons = rng.uniform(-180, 180, size)
+            lat_list = lats.tolist()
+            lon_list = lons.tolist()
+
+            scalar = self._best_of(options['repeat'], lambda: [
+                calculate_distance(origin_lat, origin_lon, lat, lon)
+                for lat, lon in zip(lat_list, lon_list)
+            ])
+            vectorized = self._best_of(options['repeat'], lambda: calculate_distances(
+                origin_lat, origin_lon, lats, lons
+            ))
+
+            self.stdout.write(
+                f'{size:>10} {scalar * 1000:>14.2f} {vectorized * 1000:>12.2f} '
+                f'{scalar / vectorized:>11.1f}x'
+            )
+
+    @staticmethod
+    def _best_of(repeat, func):
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            elapsed = time.perf_counter() - start
+            if best is None or elapsed < best:
+                best = elapsed
+        return best
@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from core.utils import compute_trending_offers
+
+
+class Command(BaseCommand):
+    help = 'Recalcula el ranking de ofertas en tendencia (general y por categoría)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval', type=int, default=0,
+            help='Segundos entre ejecuciones. Si se indica, el comando queda corriendo como worker'
+        )
+
+    def handle(self, *args, **options):
+        interval = options['interval']
+        while True:
+            entries = compute_trending_offers()
+            self.stdout.write(self.style.SUCCESS(f'Ranking de tendencias actualizado ({entries} entradas)'))
+            if not interval:
+                break
+            close_old_connections()
+            time.sleep(interval)
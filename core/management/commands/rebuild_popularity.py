@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from core.utils import refresh_popularity_scores
+
+
+class Command(BaseCommand):
+    help = 'Recalcula desde cero la puntuación de popularidad de todas las ofertas'
+
+    def handle(self, *args, **options):
+        updated = refresh_popularity_scores()
+        self.stdout.write(self.style.SUCCESS(f'Popularidad recalculada para {updated} ofertas'))
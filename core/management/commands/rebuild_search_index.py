@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from core.search import get_search_backend, rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye desde cero el índice de búsqueda de texto completo de ofertas y negocios'
+
+    def handle(self, *args, **options):
+        if get_search_backend() is None:
+            self.stdout.write(self.style.WARNING('El motor de base de datos no tiene índice de texto completo'))
+            return
+        offers, businesses = rebuild_search_index()
+        self.stdout.write(self.style.SUCCESS(f'Índice reconstruido: {offers} ofertas y {businesses} negocios'))
@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from core.utils import repair_reaction_counters
+
+
+class Command(BaseCommand):
+    help = 'Recuenta los likes de las ofertas y las reacciones y respuestas de las reseñas, y corrige los contadores desviados'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval', type=int, default=0,
+            help='Segundos entre ejecuciones. Si se indica, el comando queda corriendo como worker'
+        )
+
+    def handle(self, *args, **options):
+        interval = options['interval']
+        while True:
+            repaired = repair_reaction_counters()
+            summary = ', '.join(f'{label}: {total}' for label, total in repaired.items())
+            self.stdout.write(self.style.SUCCESS(f'Contadores corregidos ({summary})'))
+            if not interval:
+                break
+            close_old_connections()
+            time.sleep(interval)
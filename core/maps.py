@@ -0,0 +1,176 @@
+"""
+Agrupación (clustering) de ofertas en el servidor para el mapa.
+
+El viewport se divide en tiles de Web Mercator (los mismos que usa Google
+Maps) y cada tile en una rejilla de CLUSTER_GRID x CLUSTER_GRID celdas. Las
+ofertas de una celda se agregan en un solo cluster (cantidad, centroide y
+oferta principal). El resultado de cada tile se guarda en el cache compartido
+(CACHES en settings), así que al desplazar el mapa solo se calculan los tiles
+nuevos y todos los workers aprovechan lo que calculó cualquiera de ellos.
+"""
+from math import asinh, atan, degrees, floor, pi, radians, sinh, tan
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .utils import bump_cache_version, filter_by_box, get_cache_version
+
+
+MAX_ZOOM = 20
+MAX_LATITUDE = 85.05112878  # Límite de Web Mercator
+CLUSTER_GRID = 4
+MAX_TILES = 64
+VERSION_CACHE_KEY = 'maps:tiles_version'
+
+
+def lat_lon_to_tile(lat, lon, zoom):
+    """Coordenadas fraccionarias del tile que contiene un punto"""
+    lat = min(max(lat, -MAX_LATITUDE), MAX_LATITUDE)
+    n = 2 ** zoom
+    x = (lon + 180) / 360 * n
+    y = (1 - asinh(tan(radians(lat))) / pi) / 2 * n
+    return x, y
+
+
+def tile_bounds(x, y, zoom):
+    """Retorna (south, west, north, east) de un tile"""
+    n = 2 ** zoom
+
+    def tile_lat(tile_y):
+        return degrees(atan(sinh(pi * (1 - 2 * tile_y / n))))
+
+    return tile_lat(y + 1), x / n * 360 - 180, tile_lat(y), (x + 1) / n * 360 - 180
+
+
+def _viewport_tile_range(south, west, north, east, zoom):
+    """Retorna (first_x, last_x, first_y, last_y) de los tiles que cubren el viewport"""
+    n = 2 ** zoom
+    first_x, first_y = lat_lon_to_tile(north, west, zoom)
+    last_x, last_y = lat_lon_to_tile(south, east, zoom)
+    first_x, last_x = int(floor(first_x)) % n, int(floor(min(last_x, n - 1e-9)))
+    first_y, last_y = max(int(floor(first_y)), 0), int(floor(min(last_y, n - 1e-9)))
+    return first_x, last_x, first_y, last_y
+
+
+def count_viewport_tiles(south, west, north, east, zoom):
+    """Cantidad de tiles de get_viewport_tiles, sin enumerarlos"""
+    first_x, last_x, first_y, last_y = _viewport_tile_range(south, west, north, east, zoom)
+    columns = last_x - first_x + 1 if first_x <= last_x else 2 ** zoom - first_x + last_x + 1
+    return columns * (last_y - first_y + 1)
+
+
+def get_viewport_tiles(south, west, north, east, zoom):
+    """
+    Tiles (x, y) que cubren el viewport. Si el viewport cruza el antimeridiano
+    (west > east) se recorren ambos lados.
+    """
+    first_x, last_x, first_y, last_y = _viewport_tile_range(south, west, north, east, zoom)
+    if first_x <= last_x:
+        columns = range(first_x, last_x + 1)
+    else:
+        columns = list(range(first_x, 2 ** zoom)) + list(range(0, last_x + 1))
+    return [(x, y) for x in columns for y in range(first_y, last_y + 1)]
+
+
+def invalidate_map_tiles():
+    """Descartar todos los tiles del cache (ofertas o negocios modificados)"""
+    bump_cache_version(VERSION_CACHE_KEY)
+
+
+def _tile_cache_key(version, zoom, x, y):
+    return f'maps:tile:{version}:{zoom}:{x}:{y}'
+
+
+def _live_offers_in_box(south, west, north, east):
+    from .models import Offer
+
+    offers = Offer.objects.filter(
+        is_active=True,
+        expires_at__gt=timezone.now(),
+        business__business_verified=True,
+        business__business_vetted=False,
+    )
+    offers = filter_by_box(offers, south, north, west, east, prefix='business__')
+    return offers.select_related('business').only(
+        'id', 'title', 'popularity_score', 'discount_type', 'discount_value', 'quantity_x',
+        'quantity_y', 'bundle_price', 'business__business_name',
+        'business__latitude', 'business__longitude',
+    )
+
+
+def _build_clusters(offers, zoom):
+    """Agregar ofertas por tile y celda. Retorna {(x, y): [clusters]}"""
+    cells = {}
+    for offer in offers:
+        lat, lon = offer.business.latitude, offer.business.longitude
+        fx, fy = lat_lon_to_tile(lat, lon, zoom)
+        tile = (int(floor(fx)) % (2 ** zoom), int(floor(fy)))
+        cell = (int((fx % 1) * CLUSTER_GRID), int((fy % 1) * CLUSTER_GRID))
+        group = cells.setdefault((tile, cell), {'count': 0, 'lat': 0.0, 'lng': 0.0, 'top': None})
+        group['count'] += 1
+        group['lat'] += lat
+        group['lng'] += lon
+        if group['top'] is None or offer.popularity_score > group['top'].popularity_score:
+            group['top'] = offer
+
+    tiles = {}
+    for (tile, _), group in cells.items():
+        top = group['top']
+        tiles.setdefault(tile, []).append({
+            'count': group['count'],
+            'lat': round(group['lat'] / group['count'], 6),
+            'lng': round(group['lng'] / group['count'], 6),
+            'top_offer': {
+                'id': top.id,
+                'title': top.title,
+                'offer_display': top.offer_display,
+                'business': top.business.business_name,
+                'url': f'/offers/{top.id}/',
+            },
+        })
+    return tiles
+
+
+def get_offer_clusters(south, west, north, east, zoom):
+    """
+    Clusters de ofertas en el viewport para un nivel de zoom.
+    Cada tile se calcula una vez y se reutiliza desde el cache.
+    """
+    zoom = max(0, min(int(zoom), MAX_ZOOM))
+    # Un viewport demasiado grande para el zoom se agrupa con tiles más grandes;
+    # se cuentan sin enumerarlos (un box mundial a zoom 20 son ~10^12 tiles)
+    while zoom > 0 and count_viewport_tiles(south, west, north, east, zoom) > MAX_TILES:
+        zoom -= 1
+    tiles = get_viewport_tiles(south, west, north, east, zoom)
+
+    version = get_cache_version(VERSION_CACHE_KEY)
+    keys = {tile: _tile_cache_key(version, zoom, *tile) for tile in tiles}
+    cached = cache.get_many(list(keys.values()))
+
+    clusters = []
+    missing = []
+    for tile, key in keys.items():
+        if key in cached:
+            clusters.extend(cached[key])
+        else:
+            missing.append(tile)
+
+    if missing:
+        # Una sola consulta para el área que cubren todos los tiles faltantes
+        bounds = [tile_bounds(x, y, zoom) for x, y in missing]
+        box_south = min(b[0] for b in bounds)
+        box_north = max(b[2] for b in bounds)
+        if len({x for x, _ in missing}) == 2 ** zoom or west > east:
+            box_west, box_east = -180, 180
+        else:
+            box_west = min(b[1] for b in bounds)
+            box_east = max(b[3] for b in bounds)
+        built = _build_clusters(_live_offers_in_box(box_south, box_west, box_north, box_east), zoom)
+
+        timeout = getattr(settings, 'MAP_TILE_CACHE_TIMEOUT', 300)
+        cache.set_many({keys[tile]: built.get(tile, []) for tile in missing}, timeout)
+        for tile in missing:
+            clusters.extend(built.get(tile, []))
+
+    return zoom, clusters
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-17 02:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_review_dislikes_review_likes_reviewreply'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['latitude', 'longitude'], name='user_location_idx'),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 4.2.7 on 2026-10-17 02:24
+
+from django.db import migrations, models
+from django.db.models import Avg, Count, F, FloatField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def fill_popularity_scores(apps, schema_editor):
+    Offer = apps.get_model('core', 'Offer')
+    Review = apps.get_model('core', 'Review')
+    likes = Offer.likes.through.objects.filter(
+        offer_id=OuterRef('pk')
+    ).values('offer_id').annotate(total=Count('*')).values('total')
+    reviews = Review.objects.filter(
+        offer_id=OuterRef('pk')
+    ).values('offer_id').annotate(total=Count('*')).values('total')
+    ratings = Review.objects.filter(
+        offer_id=OuterRef('pk')
+    ).values('offer_id').annotate(average=Avg('rating')).values('average')
+    Offer.objects.update(popularity_score=(
+        F('views') +
+        Coalesce(Subquery(likes), 0) * 5 +
+        Coalesce(Subquery(reviews), 0) * 10 +
+        Coalesce(Subquery(ratings, output_field=FloatField()), Value(0.0)) * 20
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_user_location_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='offer',
+            name='popularity_score',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='offer',
+            index=models.Index(fields=['-popularity_score', '-id'], name='offer_popularity_idx'),
+        ),
+        migrations.RunPython(fill_popularity_scores, migrations.RunPython.noop),
+    ]
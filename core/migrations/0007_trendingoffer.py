@@ -0,0 +1,29 @@
+# Generated by Django 4.2.7 on 2026-10-17 02:24
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_offer_popularity_score'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrendingOffer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveIntegerField()),
+                ('score', models.FloatField()),
+                ('computed_at', models.DateTimeField()),
+                ('category', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='trending_entries', to='core.category')),
+                ('offer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='trending_entries', to='core.offer')),
+            ],
+            options={
+                'ordering': ['rank'],
+                'indexes': [models.Index(fields=['category', 'rank'], name='trending_category_rank_idx')],
+            },
+        ),
+    ]
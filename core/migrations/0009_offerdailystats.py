@@ -0,0 +1,53 @@
+# Generated by Django 4.2.7 on 2026-10-17 02:27
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+import django.db.models.deletion
+
+
+def fill_review_stats(apps, schema_editor):
+    """Las reseñas tienen fecha, así que su historial se puede reconstruir"""
+    Review = apps.get_model('core', 'Review')
+    OfferDailyStats = apps.get_model('core', 'OfferDailyStats')
+    rows = Review.objects.annotate(
+        day=TruncDate('created_at')
+    ).values('offer_id', 'day').annotate(
+        total=Count('id'), ratings=Sum('rating')
+    ).order_by()
+    OfferDailyStats.objects.bulk_create([
+        OfferDailyStats(
+            offer_id=row['offer_id'], date=row['day'],
+            reviews=row['total'], rating_sum=row['ratings']
+        )
+        for row in rows
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_user_managers'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OfferDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('views', models.PositiveIntegerField(default=0)),
+                ('likes', models.IntegerField(default=0)),
+                ('reviews', models.IntegerField(default=0)),
+                ('rating_sum', models.IntegerField(default=0)),
+                ('offer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='core.offer')),
+            ],
+            options={
+                'verbose_name_plural': 'Offer daily stats',
+                'ordering': ['-date'],
+                'indexes': [models.Index(fields=['date'], name='offer_daily_stats_date_idx')],
+                'unique_together': {('offer', 'date')},
+            },
+        ),
+        migrations.RunPython(fill_review_stats, migrations.RunPython.noop),
+    ]
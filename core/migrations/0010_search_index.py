@@ -0,0 +1,81 @@
+"""
+Índice de texto completo para ofertas y negocios (ver core/search.py).
+
+Las tablas FTS5 y las columnas tsvector no son campos de los modelos: se
+crean según el motor y el ORM no las toca.
+"""
+from django.db import migrations
+
+
+SQLITE_FORWARD = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS core_offer_fts USING fts5("
+    "title, description, business_name, tokenize='unicode61 remove_diacritics 2')",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS core_business_fts USING fts5("
+    "business_name, business_description, location_name, tokenize='unicode61 remove_diacritics 2')",
+    "INSERT INTO core_offer_fts (rowid, title, description, business_name) "
+    "SELECT core_offer.id, core_offer.title, core_offer.description, coalesce(core_user.business_name, '') "
+    "FROM core_offer JOIN core_user ON core_user.id = core_offer.business_id",
+    "INSERT INTO core_business_fts (rowid, business_name, business_description, location_name) "
+    "SELECT id, business_name, business_description, location_name FROM core_user WHERE role = 'business'",
+]
+SQLITE_BACKWARD = [
+    'DROP TABLE IF EXISTS core_offer_fts',
+    'DROP TABLE IF EXISTS core_business_fts',
+]
+
+POSTGRESQL_FORWARD = [
+    'ALTER TABLE core_offer ADD COLUMN search_vector tsvector',
+    'ALTER TABLE core_user ADD COLUMN search_vector tsvector',
+    """UPDATE core_offer SET search_vector =
+        setweight(to_tsvector('spanish', coalesce(core_offer.title, '')), 'A') ||
+        setweight(to_tsvector('spanish', coalesce(core_user.business_name, '')), 'B') ||
+        setweight(to_tsvector('spanish', coalesce(core_offer.description, '')), 'C')
+    FROM core_user WHERE core_user.id = core_offer.business_id""",
+    """UPDATE core_user SET search_vector =
+        setweight(to_tsvector('spanish', coalesce(business_name, '')), 'A') ||
+        setweight(to_tsvector('spanish', coalesce(location_name, '')), 'B') ||
+        setweight(to_tsvector('spanish', coalesce(business_description, '')), 'C')
+    WHERE role = 'business'""",
+    'CREATE INDEX offer_search_vector_idx ON core_offer USING GIN (search_vector)',
+    'CREATE INDEX user_search_vector_idx ON core_user USING GIN (search_vector)',
+]
+POSTGRESQL_BACKWARD = [
+    'DROP INDEX IF EXISTS offer_search_vector_idx',
+    'DROP INDEX IF EXISTS user_search_vector_idx',
+    'ALTER TABLE core_offer DROP COLUMN IF EXISTS search_vector',
+    'ALTER TABLE core_user DROP COLUMN IF EXISTS search_vector',
+]
+
+
+def _statements(schema_editor, forward):
+    connection = schema_editor.connection
+    if connection.vendor == 'postgresql':
+        return POSTGRESQL_FORWARD if forward else POSTGRESQL_BACKWARD
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA compile_options')
+            if any(row[0] == 'ENABLE_FTS5' for row in cursor.fetchall()):
+                return SQLITE_FORWARD if forward else SQLITE_BACKWARD
+    # Otros motores usan la búsqueda con icontains
+    return []
+
+
+def create_search_index(apps, schema_editor):
+    for statement in _statements(schema_editor, forward=True):
+        schema_editor.execute(statement)
+
+
+def drop_search_index(apps, schema_editor):
+    for statement in _statements(schema_editor, forward=False):
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_offerdailystats'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,100 @@
+# Generated by Django 4.2.7 on 2026-10-17 02:33
+
+import unicodedata
+
+from django.db import migrations, models
+
+
+def fold(text):
+    text = unicodedata.normalize('NFKD', str(text or '').lower())
+    return ' '.join(''.join(char for char in text if not unicodedata.combining(char)).split())
+
+
+def join_fold(*parts):
+    return fold(' '.join(part for part in parts if part))
+
+
+def fill_search_text(apps, schema_editor):
+    Offer = apps.get_model('core', 'Offer')
+    User = apps.get_model('core', 'User')
+    
+    businesses = list(User.objects.filter(role='business').only(
+        'business_name', 'location_name', 'business_description'
+    ))
+    for business in businesses:
+        business.search_text = join_fold(
+            business.business_name, business.location_name, business.business_description
+        )
+    User.objects.bulk_update(businesses, ['search_text'], batch_size=500)
+    
+    offers = list(Offer.objects.select_related('business').only(
+        'title', 'description', 'business__business_name'
+    ))
+    for offer in offers:
+        offer.search_text = join_fold(offer.title, offer.business.business_name, offer.description)
+    Offer.objects.bulk_update(offers, ['search_text'], batch_size=500)
+    
+    if schema_editor.connection.vendor == 'postgresql':
+        # Los tsvector de la migración 0010 pasan a construirse con el texto normalizado
+        with schema_editor.connection.cursor() as cursor:
+            cursor.executemany(
+                """UPDATE core_offer SET search_vector =
+                    setweight(to_tsvector('spanish', %s), 'A') ||
+                    setweight(to_tsvector('spanish', %s), 'B') ||
+                    setweight(to_tsvector('spanish', %s), 'C')
+                WHERE id = %s""",
+                [(fold(offer.title), fold(offer.business.business_name), fold(offer.description), offer.pk)
+                 for offer in offers]
+            )
+            cursor.executemany(
+                """UPDATE core_user SET search_vector =
+                    setweight(to_tsvector('spanish', %s), 'A') ||
+                    setweight(to_tsvector('spanish', %s), 'B') ||
+                    setweight(to_tsvector('spanish', %s), 'C')
+                WHERE id = %s""",
+                [(fold(business.business_name), fold(business.location_name),
+                  fold(business.business_description), business.pk)
+                 for business in businesses]
+            )
+
+
+def create_trigram_indexes(apps, schema_editor):
+    """Índices de trigramas para buscar subcadenas en search_text (solo PostgreSQL)"""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    schema_editor.execute(
+        'CREATE INDEX offer_search_text_trgm_idx ON core_offer USING GIN (search_text gin_trgm_ops)'
+    )
+    schema_editor.execute(
+        'CREATE INDEX user_search_text_trgm_idx ON core_user USING GIN (search_text gin_trgm_ops)'
+    )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS offer_search_text_trgm_idx')
+    schema_editor.execute('DROP INDEX IF EXISTS user_search_text_trgm_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='offer',
+            name='search_text',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='search_text',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.RunPython(fill_search_text, migrations.RunPython.noop),
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
@@ -0,0 +1,89 @@
+# Generated by Django 4.2.7 on 2026-10-17 02:35
+
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db import migrations, models
+
+
+# Copia de utils.calculate_offer_prices al crear la migración: la migración no
+# debe cambiar si más adelante cambia el cálculo
+def calculate_offer_prices(discount_type, original_price, discount_value,
+                           quantity_x, quantity_y, bundle_price):
+    original_price = Decimal(original_price) if original_price else None
+    discount_value = Decimal(discount_value) if discount_value else None
+    bundle_price = Decimal(bundle_price) if bundle_price else None
+    final_price = original_price or Decimal('0')
+    discount_amount = Decimal('0')
+    
+    if discount_type == 'percentage':
+        if discount_value and original_price:
+            final_price = original_price - original_price * (discount_value / 100)
+            discount_amount = original_price - final_price
+    elif discount_type == 'fixed':
+        if discount_value and original_price:
+            final_price = max(original_price - discount_value, Decimal('0'))
+            discount_amount = original_price - final_price
+    elif discount_type == 'buy_x_get_y':
+        if quantity_x and quantity_y and original_price:
+            final_price = original_price * quantity_x / (quantity_x + quantity_y)
+            discount_amount = original_price * quantity_x - final_price * (quantity_x + quantity_y)
+    elif discount_type == 'buy_x_for_price':
+        if quantity_x and bundle_price:
+            final_price = bundle_price / quantity_x
+            if original_price:
+                discount_amount = original_price * quantity_x - bundle_price
+    
+    cent = Decimal('0.01')
+    final_price = final_price.quantize(cent, rounding=ROUND_HALF_UP)
+    discount_amount = discount_amount.quantize(cent, rounding=ROUND_HALF_UP)
+    savings_ratio = 0.0
+    if original_price:
+        savings_ratio = min(max(float(1 - final_price / original_price), 0.0), 1.0)
+    return final_price, discount_amount, round(savings_ratio, 4)
+
+
+def fill_offer_prices(apps, schema_editor):
+    Offer = apps.get_model('core', 'Offer')
+    offers = list(Offer.objects.only(
+        'discount_type', 'original_price', 'discount_value', 'quantity_x', 'quantity_y', 'bundle_price'
+    ))
+    for offer in offers:
+        offer.final_price, offer.discount_amount, offer.savings_ratio = calculate_offer_prices(
+            offer.discount_type, offer.original_price, offer.discount_value,
+            offer.quantity_x, offer.quantity_y, offer.bundle_price
+        )
+    Offer.objects.bulk_update(offers, ['final_price', 'discount_amount', 'savings_ratio'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_search_text'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='offer',
+            name='discount_amount',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='offer',
+            name='final_price',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=10),
+        ),
+        migrations.AddField(
+            model_name='offer',
+            name='savings_ratio',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='offer',
+            index=models.Index(fields=['final_price', 'id'], name='offer_final_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='offer',
+            index=models.Index(fields=['-savings_ratio', '-id'], name='offer_savings_idx'),
+        ),
+        migrations.RunPython(fill_offer_prices, migrations.RunPython.noop),
+    ]
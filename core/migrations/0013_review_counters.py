@@ -0,0 +1,78 @@
+# Generated by Django 4.2.7 on 2026-10-17 02:44
+
+from django.db import migrations, models
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_subquery(queryset, field):
+    """Conteo correlacionado de queryset agrupado por field (copia de models.count_subquery)"""
+    counts = queryset.values(field).annotate(total=Count('*')).values('total')
+    return Coalesce(Subquery(counts, output_field=models.IntegerField()), 0)
+
+
+def fill_review_counters(apps, schema_editor):
+    Review = apps.get_model('core', 'Review')
+    ReviewReply = apps.get_model('core', 'ReviewReply')
+    
+    for model, field in ((Review, 'review_id'), (ReviewReply, 'reviewreply_id')):
+        likes = model.likes.through.objects.filter(**{field: OuterRef('pk')})
+        dislikes = model.dislikes.through.objects.filter(**{field: OuterRef('pk')})
+        model.objects.update(
+            likes_count=count_subquery(likes, field),
+            dislikes_count=count_subquery(dislikes, field),
+        )
+        model.objects.update(net_likes=F('likes_count') - F('dislikes_count'))
+    
+    replies = ReviewReply.objects.filter(review_id=OuterRef('pk'))
+    Review.objects.update(replies_count=count_subquery(replies, 'review_id'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_offer_prices'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='review',
+            name='dislikes_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='review',
+            name='likes_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='review',
+            name='net_likes',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='review',
+            name='replies_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='reviewreply',
+            name='dislikes_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='reviewreply',
+            name='likes_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='reviewreply',
+            name='net_likes',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_review_counters, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['offer', '-net_likes', '-created_at'], name='review_net_likes_idx'),
+        ),
+    ]
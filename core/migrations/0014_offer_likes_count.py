@@ -0,0 +1,38 @@
+# Generated by Django 4.2.7 on 2026-10-17 02:52
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_subquery(queryset, field):
+    """Conteo correlacionado de queryset agrupado por field (copia de models.count_subquery)"""
+    counts = queryset.values(field).annotate(total=Count('*')).values('total')
+    return Coalesce(Subquery(counts, output_field=models.IntegerField()), 0)
+
+
+def fill_offer_likes_count(apps, schema_editor):
+    Offer = apps.get_model('core', 'Offer')
+    
+    likes = Offer.likes.through.objects.filter(offer_id=OuterRef('pk'))
+    Offer.objects.update(likes_count=count_subquery(likes, 'offer_id'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_review_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='offer',
+            name='likes_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_offer_likes_count, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='offer',
+            index=models.Index(fields=['-likes_count', '-views', '-id'], name='offer_likes_idx'),
+        ),
+    ]
@@ -0,0 +1,53 @@
+"""
+Índice de subcadenas sobre search_text en SQLite (ver core/search.py).
+
+Tablas FTS5 con el tokenizador trigram (SQLite 3.34 o superior), el
+equivalente del índice de trigramas que la migración 0011 crea en
+PostgreSQL. En otros motores no hace nada.
+"""
+from django.db import migrations
+
+
+SQLITE_FORWARD = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS core_offer_trigram USING fts5(search_text, tokenize='trigram')",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS core_business_trigram USING fts5(search_text, tokenize='trigram')",
+    "INSERT INTO core_offer_trigram (rowid, search_text) SELECT id, search_text FROM core_offer",
+    "INSERT INTO core_business_trigram (rowid, search_text) "
+    "SELECT id, search_text FROM core_user WHERE role = 'business'",
+]
+SQLITE_BACKWARD = [
+    'DROP TABLE IF EXISTS core_offer_trigram',
+    'DROP TABLE IF EXISTS core_business_trigram',
+]
+
+
+def _statements(schema_editor, forward):
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite' or connection.Database.sqlite_version_info < (3, 34, 0):
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA compile_options')
+        if any(row[0] == 'ENABLE_FTS5' for row in cursor.fetchall()):
+            return SQLITE_FORWARD if forward else SQLITE_BACKWARD
+    return []
+
+
+def create_trigram_index(apps, schema_editor):
+    for statement in _statements(schema_editor, forward=True):
+        schema_editor.execute(statement)
+
+
+def drop_trigram_index(apps, schema_editor):
+    for statement in _statements(schema_editor, forward=False):
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_offer_likes_count'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
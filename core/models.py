@@ -1,9 +1,45 @@
 from django.db import models
-from django.contrib.auth.models import AbstractUser
+from django.db.models import Avg, Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.contrib.auth.models import AbstractUser, UserManager as BaseUserManager
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils import timezone
 from decimal import Decimal
 
+from .utils import build_search_text, calculate_offer_prices
+
+
+def count_subquery(queryset, field):
+    """
+    Conteo correlacionado de queryset agrupado por field (debe filtrar con OuterRef).
+    Anotar varios conteos así evita que los JOIN multipliquen las filas.
+    """
+    counts = queryset.values(field).annotate(total=Count('*')).values('total')
+    return Coalesce(Subquery(counts, output_field=models.IntegerField()), 0)
+
+
+class UserQuerySet(models.QuerySet):
+    def active_businesses(self):
+        """Negocios verificados y no vetados"""
+        return self.filter(role='business', business_verified=True, business_vetted=False)
+    
+    def with_business_counts(self):
+        """Anotar offers_count (ofertas vigentes) y followers_count sin multiplicar filas"""
+        live_offers = Offer.objects.filter(
+            business_id=OuterRef('pk'),
+            is_active=True,
+            expires_at__gt=timezone.now()
+        )
+        followers = User.following_businesses.through.objects.filter(to_user_id=OuterRef('pk'))
+        return self.annotate(
+            offers_count=count_subquery(live_offers, 'business_id'),
+            followers_count=count_subquery(followers, 'to_user_id'),
+        )
+
+
+class UserManager(BaseUserManager.from_queryset(UserQuerySet)):
+    pass
+
 
 class User(AbstractUser):
     """Usuario personalizado con roles"""
@@ -27,6 +63,8 @@ class User(AbstractUser):
     business_verified = models.BooleanField(default=False)
     business_vetted = models.BooleanField(default=False)
     veto_reason = models.TextField(blank=True)
+    # Nombre, ubicación y descripción del negocio sin acentos ni mayúsculas (ver utils.fold_text)
+    search_text = models.TextField(blank=True, default='', editable=False)
     
     # Seguimiento
     following_businesses = models.ManyToManyField(
@@ -41,11 +79,32 @@ class User(AbstractUser):
         blank=True
     )
     
+    objects = UserManager()
+    
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            models.Index(fields=['latitude', 'longitude'], name='user_location_idx'),
+        ]
+    
     def __str__(self):
         if self.role == 'business' and self.business_name:
             return f"{self.business_name} ({self.username})"
         return self.username
     
+    SEARCH_FIELDS = ('role', 'business_name', 'location_name', 'business_description')
+    
+    def build_search_text(self):
+        if self.role != 'business':
+            return ''
+        return build_search_text(self.business_name, self.location_name, self.business_description)
+    
+    def save(self, *args, **kwargs):
+        self.search_text = self.build_search_text()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and set(self.SEARCH_FIELDS) & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'search_text'}
+        super().save(*args, **kwargs)
+    
     @property
     def is_admin(self):
         return self.role == 'admin' or self.is_superuser
@@ -134,6 +193,32 @@ class Category(models.Model):
         return self.name
 
 
+class OfferQuerySet(models.QuerySet):
+    def live(self):
+        """Ofertas visibles: activas, vigentes y de negocios verificados no vetados"""
+        return self.filter(
+            is_active=True,
+            expires_at__gt=timezone.now(),
+            business__business_verified=True,
+            business__business_vetted=False
+        )
+    
+    def with_counts(self):
+        """
+        Anotar likes_total, reviews_total y avg_rating.
+        likes_total es el contador likes_count que mantienen las señales; las
+        reseñas se cuentan en su propia subconsulta, así los JOIN no
+        multiplican filas ni inflan los conteos.
+        """
+        reviews = Review.objects.filter(offer_id=OuterRef('pk'))
+        ratings = reviews.values('offer_id').annotate(average=Avg('rating')).values('average')
+        return self.annotate(
+            likes_total=F('likes_count'),
+            reviews_total=count_subquery(reviews, 'offer_id'),
+            avg_rating=Coalesce(Subquery(ratings, output_field=models.FloatField()), Value(0.0)),
+        )
+
+
 class Offer(models.Model):
     """Ofertas creadas por empresas"""
     business = models.ForeignKey(User, on_delete=models.CASCADE, related_name='offers')
@@ -196,63 +281,64 @@ class Offer(models.Model):
     # Métricas
     views = models.PositiveIntegerField(default=0)
     likes = models.ManyToManyField(User, related_name='liked_offers', blank=True)
+    # Total de likes, lo mantienen las señales de likes (ver signals.update_reaction_counters)
+    likes_count = models.PositiveIntegerField(default=0, editable=False)
+    # Puntuación basada en vistas, likes y reseñas (ver utils.refresh_popularity_scores)
+    popularity_score = models.FloatField(default=0, editable=False)
+    
+    # Título, negocio y descripción sin acentos ni mayúsculas (ver utils.fold_text)
+    search_text = models.TextField(blank=True, default='', editable=False)
+    
+    # Precios efectivos, calculados al guardar (ver utils.calculate_offer_prices)
+    final_price = models.DecimalField(max_digits=10, decimal_places=2, default=0, editable=False)
+    discount_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0, editable=False)
+    savings_ratio = models.FloatField(default=0, editable=False)
     
     # Estado
     is_active = models.BooleanField(default=True)
     
+    objects = OfferQuerySet.as_manager()
+    
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['-popularity_score', '-id'], name='offer_popularity_idx'),
+            models.Index(fields=['final_price', 'id'], name='offer_final_price_idx'),
+            models.Index(fields=['-savings_ratio', '-id'], name='offer_savings_idx'),
+            models.Index(fields=['-likes_count', '-views', '-id'], name='offer_likes_idx'),
+        ]
     
     def __str__(self):
         return f"{self.title} - {self.business.business_name}"
     
-    @property
-    def final_price(self):
-        if self.discount_type == 'percentage':
-            if self.discount_value and self.original_price:
-                discount_amount = self.original_price * (self.discount_value / 100)
-                return self.original_price - discount_amount
-            return self.original_price or Decimal('0')
-        elif self.discount_type == 'fixed':
-            if self.discount_value and self.original_price:
-                return max(self.original_price - self.discount_value, Decimal('0'))
-            return self.original_price or Decimal('0')
-        elif self.discount_type == 'buy_x_get_y':
-            # Para 2x1: precio por unidad = (precio_original * X) / (X + Y)
-            # Ejemplo: 2x1 con precio $12 = (12 * 2) / (2 + 1) = 24 / 3 = $8 por unidad
-            if self.quantity_x and self.quantity_y and self.original_price:
-                total_items = self.quantity_x + self.quantity_y
-                total_price = self.original_price * self.quantity_x
-                return total_price / total_items
-            return self.original_price or Decimal('0')
-        elif self.discount_type == 'buy_x_for_price':
-            # Para 2x20$: precio por unidad = bundle_price / X
-            # Ejemplo: 2x20$ = 20 / 2 = $10 por unidad
-            if self.quantity_x and self.bundle_price:
-                return self.bundle_price / self.quantity_x
-            return self.original_price or Decimal('0')
-        return self.original_price or Decimal('0')
+    SEARCH_FIELDS = ('title', 'description', 'business')
+    PRICE_FIELDS = (
+        'original_price', 'discount_type', 'discount_value', 'quantity_x', 'quantity_y', 'bundle_price'
+    )
     
-    @property
-    def discount_amount(self):
-        """Cantidad ahorrada"""
-        if self.discount_type in ['percentage', 'fixed']:
-            if self.original_price:
-                return self.original_price - self.final_price
-            return Decimal('0')
-        elif self.discount_type == 'buy_x_get_y':
-            # Ahorro = (precio_original * X) - (precio_final * (X + Y))
-            if self.quantity_x and self.quantity_y and self.original_price:
-                original_total = self.original_price * self.quantity_x
-                final_total = self.final_price * (self.quantity_x + self.quantity_y)
-                return original_total - final_total
-        elif self.discount_type == 'buy_x_for_price':
-            # Ahorro = (precio_original * X) - bundle_price
-            # Solo calcular si hay precio original (es opcional para este tipo)
-            if self.quantity_x and self.bundle_price and self.original_price:
-                original_total = self.original_price * self.quantity_x
-                return original_total - self.bundle_price
-        return Decimal('0')
+    def build_search_text(self):
+        return build_search_text(self.title, self.business.business_name, self.description)
+    
+    def update_prices(self):
+        """Recalcular final_price, discount_amount y savings_ratio"""
+        self.final_price, self.discount_amount, self.savings_ratio = calculate_offer_prices(
+            self.discount_type, self.original_price, self.discount_value,
+            self.quantity_x, self.quantity_y, self.bundle_price
+        )
+    
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or set(self.SEARCH_FIELDS) & set(update_fields):
+            self.search_text = self.build_search_text()
+            if update_fields is not None:
+                update_fields = set(update_fields) | {'search_text'}
+        if update_fields is None or set(self.PRICE_FIELDS) & set(update_fields):
+            self.update_prices()
+            if update_fields is not None:
+                update_fields = set(update_fields) | {'final_price', 'discount_amount', 'savings_ratio'}
+        if update_fields is not None:
+            kwargs['update_fields'] = update_fields
+        super().save(*args, **kwargs)
     
     @property
     def offer_display(self):
@@ -278,13 +364,65 @@ class Offer(models.Model):
     @property
     def is_expired(self):
         return timezone.now() > self.expires_at
+
+
+class TrendingOffer(models.Model):
+    """
+    Ranking de ofertas en tendencia, precalculado por el comando compute_trending.
+    category vacío corresponde al ranking general.
+    """
+    category = models.ForeignKey(
+        Category,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='trending_entries'
+    )
+    offer = models.ForeignKey(Offer, on_delete=models.CASCADE, related_name='trending_entries')
+    rank = models.PositiveIntegerField()
+    score = models.FloatField()
+    computed_at = models.DateTimeField()
+    
+    class Meta:
+        ordering = ['rank']
+        indexes = [
+            models.Index(fields=['category', 'rank'], name='trending_category_rank_idx'),
+        ]
+    
+    def __str__(self):
+        return f"#{self.rank} {self.offer.title}"
+
+
+class OfferDailyStats(models.Model):
+    """
+    Acumulado diario de métricas por oferta, mantenido de forma incremental
+    (ver utils.record_daily_stats) para graficar tendencias sin recorrer
+    las tablas de visitas, likes y reseñas.
+    """
+    offer = models.ForeignKey(Offer, on_delete=models.CASCADE, related_name='daily_stats')
+    date = models.DateField()
+    views = models.PositiveIntegerField(default=0)
+    # Likes netos del día (puede ser negativo si se quitaron más de los que se dieron)
+    likes = models.IntegerField(default=0)
+    reviews = models.IntegerField(default=0)
+    rating_sum = models.IntegerField(default=0)
+    
+    class Meta:
+        ordering = ['-date']
+        unique_together = ['offer', 'date']
+        indexes = [
+            models.Index(fields=['date'], name='offer_daily_stats_date_idx'),
+        ]
+        verbose_name_plural = 'Offer daily stats'
+    
+    def __str__(self):
+        return f"{self.offer.title} - {self.date}"
     
     @property
-    def popularity_score(self):
-        """Puntuación basada en vistas, likes y reseñas"""
-        reviews_count = self.reviews.count()
-        avg_rating = self.reviews.aggregate(models.Avg('rating'))['rating__avg'] or 0
-        return (self.views * 1) + (self.likes.count() * 5) + (reviews_count * 10) + (avg_rating * 20)
+    def avg_rating(self):
+        if self.reviews > 0:
+            return self.rating_sum / self.reviews
+        return 0
 
 
 class Review(models.Model):
@@ -317,29 +455,22 @@ class Review(models.Model):
         blank=True
     )
     
+    # Contadores mantenidos por señales (ver signals.update_reaction_counters)
+    likes_count = models.PositiveIntegerField(default=0, editable=False)
+    dislikes_count = models.PositiveIntegerField(default=0, editable=False)
+    # Likes menos dislikes, para ordenar las reseñas con el índice
+    net_likes = models.IntegerField(default=0, editable=False)
+    replies_count = models.PositiveIntegerField(default=0, editable=False)
+    
     class Meta:
         ordering = ['-created_at']
         unique_together = ['offer', 'user']
+        indexes = [
+            models.Index(fields=['offer', '-net_likes', '-created_at'], name='review_net_likes_idx'),
+        ]
     
     def __str__(self):
         return f"{self.user.username} - {self.offer.title} ({self.rating}★)"
-    
-    @property
-    def likes_count(self):
-        return self.likes.count()
-    
-    @property
-    def dislikes_count(self):
-        return self.dislikes.count()
-    
-    @property
-    def net_likes(self):
-        """Likes menos dislikes para ordenamiento"""
-        return self.likes.count() - self.dislikes.count()
-    
-    @property
-    def replies_count(self):
-        return self.replies.count()
 
 
 class ReviewReply(models.Model):
@@ -364,25 +495,17 @@ class ReviewReply(models.Model):
         symmetrical=False
     )
     
+    # Contadores mantenidos por señales (ver signals.update_reaction_counters)
+    likes_count = models.PositiveIntegerField(default=0, editable=False)
+    dislikes_count = models.PositiveIntegerField(default=0, editable=False)
+    net_likes = models.IntegerField(default=0, editable=False)
+    
     class Meta:
         ordering = ['created_at']
         verbose_name_plural = 'Review Replies'
     
     def __str__(self):
         return f"Respuesta de {self.user.username} a {self.review.user.username}"
-    
-    @property
-    def likes_count(self):
-        return self.likes.count()
-    
-    @property
-    def dislikes_count(self):
-        return self.dislikes.count()
-    
-    @property
-    def net_likes(self):
-        """Likes menos dislikes para ordenamiento"""
-        return self.likes.count() - self.dislikes.count()
 
 
 class Notification(models.Model):
@@ -0,0 +1,142 @@
+"""
+Paginación por cursor (keyset).
+
+En lugar de OFFSET, cada página recuerda la clave de ordenamiento de su último
+elemento y la siguiente consulta continúa desde ahí, así una página profunda
+cuesta lo mismo que la primera. Los cursores viajan como tokens opacos.
+"""
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+
+def encode_cursor(values):
+    """Convertir una lista de valores de ordenamiento en un token opaco"""
+    raw = json.dumps(values, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Valores de ordenamiento de un token, o None si el token no es válido"""
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        values = json.loads(raw)
+    except (ValueError, TypeError):
+        return None
+    return values if isinstance(values, list) else None
+
+
+def _cursor_value(value):
+    # Decimal y fechas viajan como texto; el campo los vuelve a convertir al filtrar
+    if isinstance(value, (int, float, str)) or value is None:
+        return value
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return str(value)
+
+
+NEXT, PREVIOUS = 'n', 'p'
+
+
+class KeysetPage:
+    """
+    Página de KeysetPaginator. Cumple la parte del contrato de Page que usan
+    las plantillas (iterar, has_next, has_previous, has_other_pages, paginator)
+    y en lugar de números de página expone next_cursor y previous_cursor.
+    """
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None, paginator=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.paginator = paginator
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginator:
+    """
+    Paginación por cursor sobre un queryset ordenado por ordering (el último
+    campo debe ser único, normalmente 'id' o '-id', y los campos no pueden ser
+    nulos). Con un índice que siga el mismo orden, cada página lee solo
+    per_page + 1 filas y no hace COUNT.
+
+    count es opcional: si se conoce (por ejemplo de las facetas) se pasa al
+    construir; si no, se consulta solo cuando alguien lo pide.
+    """
+
+    def __init__(self, queryset, ordering, per_page, count=None):
+        self.queryset = queryset.order_by(*ordering)
+        self.fields = [(field.lstrip('-'), field.startswith('-')) for field in ordering]
+        self.per_page = per_page
+        self._count = count
+
+    @cached_property
+    def count(self):
+        if self._count is not None:
+            return self._count
+        return self.queryset.count()
+
+    def _after(self, values, reverse=False):
+        """Filtro 'viene después de values' en el orden del paginador (o antes si reverse)"""
+        condition = Q()
+        for position, (field, descending) in enumerate(self.fields):
+            lookup = 'lt' if descending != reverse else 'gt'
+            step = Q(**{f'{field}__{lookup}': values[position]})
+            for earlier, (previous, _) in enumerate(self.fields[:position]):
+                step &= Q(**{previous: values[earlier]})
+            condition |= step
+        return condition
+
+    def _cursor(self, direction, obj):
+        return encode_cursor([direction] + [_cursor_value(getattr(obj, field)) for field, _ in self.fields])
+
+    def get_page(self, cursor):
+        """
+        Página indicada por el cursor (next_cursor o previous_cursor de otra
+        página). Un cursor inválido o vencido lleva a la primera página.
+        """
+        values = decode_cursor(cursor)
+        direction = None
+        queryset = self.queryset
+        if values and values[0] in (NEXT, PREVIOUS) and len(values) == len(self.fields) + 1:
+            direction = values[0]
+            try:
+                queryset = queryset.filter(self._after(values[1:], reverse=direction == PREVIOUS))
+            except (ValueError, TypeError, ValidationError):
+                direction, queryset = None, self.queryset
+        if direction == PREVIOUS:
+            queryset = queryset.reverse()
+
+        objects = list(queryset[:self.per_page + 1])
+        more = len(objects) > self.per_page
+        objects = objects[:self.per_page]
+        if direction is not None and not objects:
+            return self.get_page(None)
+
+        if direction == PREVIOUS:
+            objects.reverse()
+            next_cursor = self._cursor(NEXT, objects[-1])
+            previous_cursor = self._cursor(PREVIOUS, objects[0]) if more else None
+        else:
+            next_cursor = self._cursor(NEXT, objects[-1]) if more else None
+            previous_cursor = self._cursor(PREVIOUS, objects[0]) if direction == NEXT else None
+        return KeysetPage(objects, next_cursor, previous_cursor, self)
@@ -0,0 +1,213 @@
+"""
+Servicio común para las reacciones de un usuario: likes y dislikes de
+ofertas, reseñas y respuestas, y seguir negocios o categorías.
+
+Cada reacción es una fila de la tabla intermedia de un ManyToMany. En lugar
+de cargar la relación completa (request.user in obj.likes.all()) el servicio
+inserta (ON CONFLICT DO NOTHING) o borra solo la fila del usuario y, según las
+filas afectadas, ajusta los contadores con un UPDATE que retorna los totales,
+así el costo no depende de cuántas reacciones tenga el objeto. Los seguidores
+no tienen contador: su total sale de un COUNT indexado.
+
+Como se trabaja directo sobre la tabla intermedia no se disparan las señales
+m2m_changed: los efectos que ellas aplican (contadores de likes y dislikes,
+popularidad y acumulado diario de likes) se aplican aquí.
+
+apply_reactions aplica en una sola transacción las operaciones que el cliente
+acumula y envía juntas a reactions_batch_api.
+"""
+from django.db import connection, transaction
+
+from .models import Offer, Review, ReviewReply, User
+from .utils import POPULARITY_LIKE_WEIGHT, record_daily_stats
+
+
+class ReactionType:
+    """
+    Un ManyToMany entre usuarios y un modelo, visto como reacción.
+    user_is_source indica que el campo está declarado en User (seguir).
+    counter es el contador del modelo que se ajusta con la reacción; sin
+    counter, el total (count_name) se cuenta en la tabla intermedia.
+    """
+
+    def __init__(self, descriptor, user_is_source=False, targets=None, counter=None,
+                 count_name=None, opposite=None):
+        field = descriptor.field
+        self.through = field.remote_field.through
+        if user_is_source:
+            self.model = field.related_model
+            self.user_column, self.target_column = field.m2m_column_name(), field.m2m_reverse_name()
+        else:
+            self.model = field.model
+            self.target_column, self.user_column = field.m2m_column_name(), field.m2m_reverse_name()
+        self.targets = targets if targets is not None else self.model._default_manager.all()
+        self.counter = counter
+        self.count_name = count_name or counter
+        self.opposite = opposite
+
+    def rows(self, user_id, target_id):
+        return self.through.objects.filter(**{self.user_column: user_id, self.target_column: target_id})
+
+
+REACTIONS = {
+    'offer_like': ReactionType(Offer.likes, counter='likes_count'),
+    'review_like': ReactionType(Review.likes, counter='likes_count', opposite='review_dislike'),
+    'review_dislike': ReactionType(Review.dislikes, counter='dislikes_count', opposite='review_like'),
+    'reply_like': ReactionType(ReviewReply.likes, counter='likes_count', opposite='reply_dislike'),
+    'reply_dislike': ReactionType(ReviewReply.dislikes, counter='dislikes_count', opposite='reply_like'),
+    'follow_business': ReactionType(
+        User.following_businesses, user_is_source=True,
+        targets=User.objects.filter(role='business'), count_name='followers_count'
+    ),
+    'follow_category': ReactionType(User.following_categories, user_is_source=True, count_name='followers_count'),
+}
+
+# Contadores de cada modelo que se leen de la fila bloqueada
+COUNTER_FIELDS = {
+    Offer: ('likes_count',),
+    Review: ('likes_count', 'dislikes_count', 'net_likes'),
+    ReviewReply: ('likes_count', 'dislikes_count', 'net_likes'),
+}
+
+# Máximo de operaciones por petición a reactions_batch_api
+BATCH_MAX_OPERATIONS = 50
+
+
+def _insert_reaction(reaction, user_id, target_id):
+    """INSERT ... ON CONFLICT DO NOTHING de la fila del usuario; True si se insertó"""
+    quote = connection.ops.quote_name
+    sql = (
+        f'INSERT INTO {quote(reaction.through._meta.db_table)} '
+        f'({quote(reaction.user_column)}, {quote(reaction.target_column)}) VALUES (%s, %s) '
+        f'ON CONFLICT DO NOTHING'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [user_id, target_id])
+        return cursor.rowcount > 0
+
+
+def _update_counters(model, target_id, deltas):
+    """
+    Sumar deltas ({contador: delta}) a la fila target_id en un solo UPDATE,
+    junto con net_likes y la popularidad de las ofertas. Retorna los
+    contadores de COUNTER_FIELDS ya actualizados, o None si la fila no existe.
+    """
+    fields = COUNTER_FIELDS[model]
+    deltas = dict(deltas)
+    if 'net_likes' in fields:
+        deltas['net_likes'] = deltas.get('likes_count', 0) - deltas.get('dislikes_count', 0)
+    if model is Offer:
+        deltas['popularity_score'] = deltas['likes_count'] * POPULARITY_LIKE_WEIGHT
+
+    quote = connection.ops.quote_name
+
+    def column(field):
+        return quote(model._meta.get_field(field).column)
+
+    sql = (
+        f'UPDATE {quote(model._meta.db_table)} SET '
+        f'{", ".join(f"{column(field)} = {column(field)} + %s" for field in deltas)} '
+        f'WHERE {quote(model._meta.pk.column)} = %s'
+    )
+    # RETURNING existe en PostgreSQL y en SQLite desde 3.35, igual que en los INSERT
+    returning = connection.features.can_return_columns_from_insert
+    if returning:
+        sql += f' RETURNING {", ".join(column(field) for field in fields)}'
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [*deltas.values(), target_id])
+        if returning:
+            row = cursor.fetchone()
+            return dict(zip(fields, row)) if row else None
+        if not cursor.rowcount:
+            return None
+    return model._default_manager.filter(pk=target_id).values(*fields).first()
+
+
+def set_reaction(user, kind, target_id, active=None):
+    """
+    Dejar la reacción kind (ver REACTIONS) del usuario sobre target_id activa
+    (active=True), inactiva (False) o alternarla (None). Es idempotente: pedir
+    el estado que ya tiene no cambia nada. Activar un like quita el dislike
+    opuesto y viceversa.
+
+    Retorna (activa, totales), con totales como {'likes_count': ...}.
+    Lanza model.DoesNotExist si el objeto no existe.
+    """
+    reaction = REACTIONS[kind]
+    opposite = REACTIONS[reaction.opposite] if reaction.opposite else None
+
+    with transaction.atomic():
+        if not reaction.counter and not reaction.targets.filter(pk=target_id).exists():
+            raise reaction.model.DoesNotExist
+
+        # Sin leer antes la fila del usuario: las filas afectadas del DELETE o
+        # del INSERT dicen si la reacción cambió (alternar borra y, si no había
+        # nada que borrar, inserta)
+        removed = 0
+        if not active:
+            removed = reaction.rows(user.pk, target_id).delete()[0]
+            if active is None:
+                active = not removed
+        added = active and _insert_reaction(reaction, user.pk, target_id)
+
+        deltas = {}
+        if added:
+            deltas[kind] = 1
+            if opposite and opposite.rows(user.pk, target_id).delete()[0]:
+                deltas[reaction.opposite] = -1
+        elif removed:
+            deltas[kind] = -1
+
+        if reaction.counter:
+            # Los contadores cambian en un UPDATE que también retorna los totales;
+            # si no existe la fila se deshace lo insertado
+            if deltas:
+                counts = _update_counters(
+                    reaction.model, target_id,
+                    {REACTIONS[changed_kind].counter: delta for changed_kind, delta in deltas.items()}
+                )
+            else:
+                counts = reaction.targets.filter(pk=target_id).values(*COUNTER_FIELDS[reaction.model]).first()
+            if counts is None:
+                raise reaction.model.DoesNotExist
+        if kind == 'offer_like' and deltas:
+            record_daily_stats([target_id], likes=deltas[kind])
+
+    if not reaction.counter:
+        counts = {reaction.count_name: reaction.through.objects.filter(
+            **{reaction.target_column: target_id}
+        ).count()}
+    return active, counts
+
+
+def toggle_reaction(user, kind, target_id):
+    """Alternar la reacción del usuario (ver set_reaction)"""
+    return set_reaction(user, kind, target_id)
+
+
+def apply_reactions(user, operations):
+    """
+    Aplicar una lista de operaciones (kind, target_id, active) en una sola
+    transacción con set_reaction. Cada operación deja un estado, no lo
+    alterna, así que reenviar la misma lista no cambia nada.
+
+    Retorna un resultado por operación con type, id y active más los totales,
+    o con error='not_found' si el objeto ya no existe.
+    """
+    # Actualizar (y así bloquear) las filas siempre en el mismo orden (modelo,
+    # id) evita interbloqueos entre lotes simultáneos; el orden es estable, así
+    # que el like y el dislike de un mismo objeto se aplican en el orden en que llegaron
+    operations = sorted(
+        operations, key=lambda operation: (REACTIONS[operation[0]].model._meta.label, operation[1])
+    )
+
+    results = []
+    with transaction.atomic():
+        for kind, target_id, active in operations:
+            try:
+                active, counts = set_reaction(user, kind, target_id, active)
+            except REACTIONS[kind].model.DoesNotExist:
+                results.append({'type': kind, 'id': target_id, 'error': 'not_found'})
+                continue
+            results.append({'type': kind, 'id': target_id, 'active': active, **counts})
+    return results
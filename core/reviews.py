@@ -0,0 +1,112 @@
+"""
+Carga de las reseñas de una oferta para su página de detalle.
+
+La página muestra solo la primera tanda de reseñas; las demás y las
+respuestas de cada reseña se piden por cursor (offer_reviews_api y
+review_replies_api). Cada carga cuesta un número fijo de consultas sin
+importar cuántas reseñas o respuestas tenga la oferta, y el estado de las
+reacciones del usuario sale en una sola consulta (UNION) como conjuntos para
+que la plantilla compruebe pertenencia en O(1).
+"""
+from django.db.models import Avg, Count, IntegerField, Value
+
+from .models import Offer, Review, ReviewReply, User
+from .pagination import KeysetPaginator
+
+
+REVIEWS_PAGE_SIZE = 10
+REPLIES_PAGE_SIZE = 10
+REVIEW_ORDERING = ('-net_likes', '-created_at', '-id')
+REPLY_ORDERING = ('created_at', 'id')
+
+
+# Tipos de reacción en la consulta del usuario
+OFFER_LIKE, FOLLOWING, REVIEW_LIKE, REVIEW_DISLIKE, REPLY_LIKE, REPLY_DISLIKE = range(6)
+
+REACTION_KEYS = {
+    OFFER_LIKE: 'liked_offers',
+    FOLLOWING: 'followed_businesses',
+    REVIEW_LIKE: 'liked_reviews',
+    REVIEW_DISLIKE: 'disliked_reviews',
+    REPLY_LIKE: 'liked_replies',
+    REPLY_DISLIKE: 'disliked_replies',
+}
+
+
+def _reaction_rows(kind, queryset, target_field):
+    return queryset.annotate(
+        kind=Value(kind, output_field=IntegerField())
+    ).values_list('kind', target_field)
+
+
+def load_viewer_reactions(user, offer_ids=(), business_ids=(), review_ids=(), reply_ids=()):
+    """
+    Qué ofertas, negocios, reseñas y respuestas de los ids dados marcó el
+    usuario, en una sola consulta. Retorna un dict de conjuntos de ids
+    (ver REACTION_KEYS); vacíos y sin consultar si es anónimo.
+    """
+    reactions = {key: set() for key in REACTION_KEYS.values()}
+    if not user.is_authenticated:
+        return reactions
+
+    parts = [
+        (OFFER_LIKE, Offer.likes.through.objects.filter(user_id=user.pk, offer_id__in=offer_ids), 'offer_id'),
+        (FOLLOWING, User.following_businesses.through.objects.filter(
+            from_user_id=user.pk, to_user_id__in=business_ids), 'to_user_id'),
+        (REVIEW_LIKE, Review.likes.through.objects.filter(user_id=user.pk, review_id__in=review_ids), 'review_id'),
+        (REVIEW_DISLIKE, Review.dislikes.through.objects.filter(
+            user_id=user.pk, review_id__in=review_ids), 'review_id'),
+        (REPLY_LIKE, ReviewReply.likes.through.objects.filter(
+            user_id=user.pk, reviewreply_id__in=reply_ids), 'reviewreply_id'),
+        (REPLY_DISLIKE, ReviewReply.dislikes.through.objects.filter(
+            user_id=user.pk, reviewreply_id__in=reply_ids), 'reviewreply_id'),
+    ]
+    # Las partes con una lista de ids vacía se omiten al armar el UNION
+    queries = [_reaction_rows(kind, queryset, field) for kind, queryset, field in parts]
+    rows = queries[0].union(*queries[1:], all=True)
+    for kind, target_id in rows:
+        reactions[REACTION_KEYS[kind]].add(target_id)
+    return reactions
+
+
+def get_reviews_page(offer, cursor=None):
+    """Página de reseñas de la oferta, más likes netos primero (índice review_net_likes_idx)"""
+    reviews = offer.reviews.select_related('user')
+    return KeysetPaginator(reviews, REVIEW_ORDERING, REVIEWS_PAGE_SIZE).get_page(cursor)
+
+
+def get_replies_page(review, cursor=None):
+    """Página de respuestas de una reseña, en orden cronológico"""
+    replies = review.replies.select_related('user')
+    return KeysetPaginator(replies, REPLY_ORDERING, REPLIES_PAGE_SIZE).get_page(cursor)
+
+
+def load_offer_detail(offer, user):
+    """
+    Primera página de reseñas, totales y estado del usuario para
+    offers/detail.html. Son cuatro consultas (dos si el usuario es anónimo)
+    para cualquier cantidad de reseñas; offer debe venir con business cargado.
+    """
+    reviews = get_reviews_page(offer)
+    totals = offer.reviews.aggregate(count=Count('id'), avg=Avg('rating'))
+    reactions = load_viewer_reactions(
+        user,
+        offer_ids=[offer.pk],
+        business_ids=[offer.business_id],
+        review_ids=[review.id for review in reviews],
+    )
+
+    # Siempre su propia consulta (índice por oferta y usuario): buscarla primero
+    # en la página haría que el costo dependa de cuántas reseñas haya
+    user_review = offer.reviews.filter(user=user).first() if user.is_authenticated else None
+
+    return {
+        'reviews': reviews,
+        'review_count': totals['count'],
+        'avg_rating': round(totals['avg'] or 0, 1),
+        'user_review': user_review,
+        'user_liked': offer.pk in reactions['liked_offers'],
+        'is_following': offer.business_id in reactions['followed_businesses'],
+        'user_liked_reviews': reactions['liked_reviews'],
+        'user_disliked_reviews': reactions['disliked_reviews'],
+    }
@@ -0,0 +1,475 @@
+"""
+Búsqueda de texto completo de ofertas y negocios.
+
+Hay un backend por motor de base de datos, detrás de la misma API:
+
+- SQLite: tablas virtuales FTS5 (core_offer_fts y core_business_fts) cuyo
+  rowid es el id de la oferta o del negocio. Se ordena con bm25().
+- PostgreSQL: columna search_vector (tsvector) con índice GIN en core_offer y
+  core_user. Se ordena con ts_rank().
+
+Las tablas y columnas se crean en la migración 0010 y se mantienen al día
+desde signals.py (index_offers, index_businesses, unindex_*). Todo el texto
+indexado y los términos buscados pasan por utils.fold_text, así "cafe"
+encuentra "Café" en cualquier motor.
+
+Además de las palabras, se buscan subcadenas dentro de las columnas
+normalizadas search_text, como hacía la búsqueda con icontains: en
+PostgreSQL con su índice de trigramas (migración 0011) y en SQLite 3.34 o
+superior con las tablas FTS5 trigram core_offer_trigram y
+core_business_trigram (migración 0015). Sin índice de texto completo (otros
+motores, o SQLite sin FTS5) se filtra solo por search_text.
+"""
+import atexit
+import hashlib
+import json
+import logging
+import re
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import BooleanField, Case, Count, F, FloatField, IntegerField, Q, Value, When
+from django.db.models.expressions import RawSQL
+
+from .utils import bump_cache_version, fold_text, get_cache_version
+
+
+OFFER_FTS_TABLE = 'core_offer_fts'
+BUSINESS_FTS_TABLE = 'core_business_fts'
+OFFER_TRIGRAM_TABLE = 'core_offer_trigram'
+BUSINESS_TRIGRAM_TABLE = 'core_business_trigram'
+# El tokenizador trigram solo indexa subcadenas de 3 o más caracteres
+MIN_TRIGRAM_TERM = 3
+SEARCH_CONFIG = 'spanish'
+MAX_TERMS = 8
+
+# Pesos por columna: el título y el nombre del negocio valen más que la descripción
+OFFER_BM25_WEIGHTS = '10.0, 2.0, 5.0'      # title, description, business_name
+BUSINESS_BM25_WEIGHTS = '10.0, 2.0, 3.0'   # business_name, business_description, location_name
+
+# Columnas indexadas en el orden de la tabla FTS5 y su peso en PostgreSQL
+OFFER_INDEX_COLUMNS = (('title', 'A'), ('description', 'C'), ('business_name', 'B'))
+BUSINESS_INDEX_COLUMNS = (('business_name', 'A'), ('business_description', 'C'), ('location_name', 'B'))
+
+RESULTS_VERSION_KEY = 'search:results_version'
+METRIC_KEYS = {'hits': 'search:cache_hits', 'misses': 'search:cache_misses'}
+# Los aciertos y fallos se acumulan por proceso y se suman al cache compartido
+# cada METRIC_FLUSH_THRESHOLD búsquedas o METRIC_FLUSH_INTERVAL segundos
+METRIC_FLUSH_THRESHOLD = 100
+METRIC_FLUSH_INTERVAL = 60
+
+logger = logging.getLogger(__name__)
+
+_fts5_available = None
+
+
+def sqlite_has_fts5(conn=connection):
+    """Si la versión de SQLite en uso trae el módulo FTS5"""
+    global _fts5_available
+    if _fts5_available is None:
+        with conn.cursor() as cursor:
+            cursor.execute('PRAGMA compile_options')
+            _fts5_available = any(row[0] == 'ENABLE_FTS5' for row in cursor.fetchall())
+    return _fts5_available
+
+
+def sqlite_has_trigram(conn=connection):
+    """Si SQLite trae el tokenizador trigram de FTS5 (3.34 o superior)"""
+    return sqlite_has_fts5(conn) and conn.Database.sqlite_version_info >= (3, 34, 0)
+
+
+def get_search_backend(conn=connection):
+    """'postgresql', 'sqlite' o None si no hay índice de texto completo"""
+    if conn.vendor == 'postgresql':
+        return 'postgresql'
+    if conn.vendor == 'sqlite' and sqlite_has_fts5(conn):
+        return 'sqlite'
+    return None
+
+
+def get_search_terms(query):
+    """Palabras normalizadas de la búsqueda, sin los operadores de cada motor"""
+    return re.findall(r'\w+', fold_text(query))[:MAX_TERMS]
+
+
+def _fts5_match(terms):
+    # Cada palabra entre comillas y como prefijo: "pizz"* encuentra "pizzería"
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def _trigram_match(terms):
+    # Cada palabra entre comillas es una subcadena: "izz" encuentra "pizza"
+    return ' AND '.join(f'"{term}"' for term in terms)
+
+
+def _tsquery(terms):
+    return ' & '.join(f'{term}:*' for term in terms)
+
+
+def _apply_search(queryset, query, table, fts_table, trigram_table, weights):
+    terms = get_search_terms(query)
+    if not terms:
+        return queryset.none()
+
+    backend = get_search_backend()
+    if backend == 'sqlite':
+        match = _fts5_match(terms)
+        matching_ids, params = f'SELECT rowid FROM {fts_table} WHERE {fts_table} MATCH %s', [match]
+        if sqlite_has_trigram() and min(len(term) for term in terms) >= MIN_TRIGRAM_TERM:
+            matching_ids += f' UNION SELECT rowid FROM {trigram_table} WHERE {trigram_table} MATCH %s'
+            params.append(_trigram_match(terms))
+        return queryset.filter(pk__in=RawSQL(matching_ids, params)).annotate(search_rank=RawSQL(
+            # coalesce: las filas que solo coinciden por subcadena no tienen bm25
+            f'coalesce((SELECT -bm25({fts_table}, {weights}) FROM {fts_table} '
+            f'WHERE {fts_table} MATCH %s AND rowid = {table}.id), 0)',
+            [match], output_field=FloatField()
+        ))
+
+    # Todas las palabras como subcadenas de search_text (índice de trigramas en PostgreSQL)
+    substrings = Q()
+    for term in terms:
+        substrings &= Q(search_text__contains=term)
+
+    if backend == 'postgresql':
+        tsquery = _tsquery(terms)
+        return queryset.filter(RawSQL(
+            f"{table}.search_vector @@ to_tsquery('{SEARCH_CONFIG}', %s)",
+            [tsquery], output_field=BooleanField()
+        ) | substrings).annotate(search_rank=RawSQL(
+            # coalesce: las filas que solo coinciden por subcadena no tienen vector
+            f"coalesce(ts_rank({table}.search_vector, to_tsquery('{SEARCH_CONFIG}', %s)), 0)",
+            [tsquery], output_field=FloatField()
+        ))
+
+    return queryset.filter(substrings).annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+
+def search_offers_queryset(queryset, query):
+    """
+    Filtrar un queryset de Offer por texto y anotar search_rank (mayor es
+    más relevante). Se puede seguir filtrando y ordenar por '-search_rank'.
+    """
+    return _apply_search(queryset, query, 'core_offer', OFFER_FTS_TABLE, OFFER_TRIGRAM_TABLE, OFFER_BM25_WEIGHTS)
+
+
+def search_businesses_queryset(queryset, query):
+    """Igual que search_offers_queryset, para un queryset de negocios (User)"""
+    return _apply_search(
+        queryset, query, 'core_user', BUSINESS_FTS_TABLE, BUSINESS_TRIGRAM_TABLE, BUSINESS_BM25_WEIGHTS
+    )
+
+
+def order_by_relevance(queryset, *fallback):
+    """Ordenar por search_rank y desempatar con los campos dados"""
+    return queryset.order_by(F('search_rank').desc(nulls_last=True), *fallback)
+
+
+# ==================== MANTENIMIENTO DEL ÍNDICE ====================
+
+def _write_index(backend, table, fts_table, trigram_table, columns, ids, rows, search_texts):
+    """
+    Escribir en el índice las filas (id, texto por columna...) ya normalizadas
+    y, en SQLite, el search_text de cada id ({id: texto}) en la tabla trigram.
+    Los ids sin fila salen del índice.
+    """
+    names = [name for name, _ in columns]
+    with connection.cursor() as cursor:
+        if backend == 'sqlite':
+            placeholders = ', '.join(['%s'] * len(ids))
+            cursor.execute(f'DELETE FROM {fts_table} WHERE rowid IN ({placeholders})', ids)
+            cursor.executemany(
+                f'INSERT INTO {fts_table} (rowid, {", ".join(names)}) '
+                f'VALUES (%s{", %s" * len(names)})',
+                rows
+            )
+            if sqlite_has_trigram():
+                cursor.execute(f'DELETE FROM {trigram_table} WHERE rowid IN ({placeholders})', ids)
+                cursor.executemany(
+                    f'INSERT INTO {trigram_table} (rowid, search_text) VALUES (%s, %s)',
+                    list(search_texts.items())
+                )
+            return
+
+        vector = ' || '.join(
+            f"setweight(to_tsvector('{SEARCH_CONFIG}', %s), '{weight}')" for _, weight in columns
+        )
+        cursor.executemany(
+            f'UPDATE {table} SET search_vector = {vector} WHERE id = %s',
+            [(*texts, pk) for pk, *texts in rows]
+        )
+        missing = set(ids) - {row[0] for row in rows}
+        if missing:
+            placeholders = ', '.join(['%s'] * len(missing))
+            cursor.execute(
+                f'UPDATE {table} SET search_vector = NULL WHERE id IN ({placeholders})', list(missing)
+            )
+
+
+def index_offers(offer_ids):
+    """(Re)indexar ofertas después de crearlas o modificarlas"""
+    from .models import Offer
+
+    offer_ids = list(offer_ids)
+    backend = get_search_backend()
+    if not offer_ids or backend is None:
+        return
+
+    rows, search_texts = [], {}
+    for pk, title, description, business_name, search_text in Offer.objects.filter(pk__in=offer_ids).values_list(
+        'id', 'title', 'description', 'business__business_name', 'search_text'
+    ):
+        rows.append((pk, fold_text(title), fold_text(description), fold_text(business_name)))
+        search_texts[pk] = search_text
+    _write_index(
+        backend, 'core_offer', OFFER_FTS_TABLE, OFFER_TRIGRAM_TABLE, OFFER_INDEX_COLUMNS,
+        offer_ids, rows, search_texts
+    )
+
+
+def _unindex(fts_table, trigram_table, pk):
+    if get_search_backend() == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {fts_table} WHERE rowid = %s', [pk])
+            if sqlite_has_trigram():
+                cursor.execute(f'DELETE FROM {trigram_table} WHERE rowid = %s', [pk])
+
+
+def unindex_offer(offer_id):
+    """Quitar una oferta borrada (en PostgreSQL la columna se va con la fila)"""
+    _unindex(OFFER_FTS_TABLE, OFFER_TRIGRAM_TABLE, offer_id)
+
+
+def index_businesses(business_ids):
+    """(Re)indexar negocios. Los usuarios que no son negocios salen del índice"""
+    from .models import User
+
+    business_ids = list(business_ids)
+    backend = get_search_backend()
+    if not business_ids or backend is None:
+        return
+
+    rows, search_texts = [], {}
+    for pk, name, description, location, search_text in User.objects.filter(
+        pk__in=business_ids, role='business'
+    ).values_list('id', 'business_name', 'business_description', 'location_name', 'search_text'):
+        rows.append((pk, fold_text(name), fold_text(description), fold_text(location)))
+        search_texts[pk] = search_text
+    _write_index(
+        backend, 'core_user', BUSINESS_FTS_TABLE, BUSINESS_TRIGRAM_TABLE, BUSINESS_INDEX_COLUMNS,
+        business_ids, rows, search_texts
+    )
+
+
+def unindex_business(business_id):
+    """Quitar un negocio borrado del índice"""
+    _unindex(BUSINESS_FTS_TABLE, BUSINESS_TRIGRAM_TABLE, business_id)
+
+
+def refresh_business_offers_search_text(business):
+    """El search_text de las ofertas incluye el nombre del negocio: recalcularlo"""
+    from .models import Offer
+
+    offers = list(business.offers.only('id', 'title', 'description', 'business'))
+    for offer in offers:
+        offer.business = business
+        offer.search_text = offer.build_search_text()
+    Offer.objects.bulk_update(offers, ['search_text'], batch_size=500)
+    return [offer.pk for offer in offers]
+
+
+def rebuild_search_index():
+    """Reconstruir desde cero el índice de ofertas y negocios"""
+    from .models import Offer, User
+
+    backend = get_search_backend()
+    if backend is None:
+        return 0, 0
+    if backend == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {OFFER_FTS_TABLE}')
+            cursor.execute(f'DELETE FROM {BUSINESS_FTS_TABLE}')
+            if sqlite_has_trigram():
+                cursor.execute(f'DELETE FROM {OFFER_TRIGRAM_TABLE}')
+                cursor.execute(f'DELETE FROM {BUSINESS_TRIGRAM_TABLE}')
+
+    offer_ids = list(Offer.objects.values_list('id', flat=True))
+    business_ids = list(User.objects.filter(role='business').values_list('id', flat=True))
+    for start in range(0, len(offer_ids), 500):
+        index_offers(offer_ids[start:start + 500])
+    for start in range(0, len(business_ids), 500):
+        index_businesses(business_ids[start:start + 500])
+    invalidate_search_results()
+    return len(offer_ids), len(business_ids)
+
+
+# ==================== CACHE DE RESULTADOS ====================
+
+def normalize_query(query):
+    """Forma canónica de una búsqueda para usarla como clave del cache"""
+    return ' '.join(get_search_terms(query))
+
+
+def invalidate_search_results():
+    """Descartar todos los resultados guardados (llamado desde signals.py)"""
+    bump_cache_version(RESULTS_VERSION_KEY)
+
+
+def _results_cache_key(params):
+    digest = hashlib.sha1(json.dumps(params, sort_keys=True, default=str).encode()).hexdigest()
+    return f'search:results:{get_cache_version(RESULTS_VERSION_KEY)}:{digest}'
+
+
+_metrics_lock = threading.Lock()
+_pending_metrics = Counter()
+_metrics_flushed_at = time.monotonic()
+
+
+def _count_metric(name):
+    """Contar un acierto o fallo en memoria, como view_counter con las visitas"""
+    with _metrics_lock:
+        _pending_metrics[name] += 1
+        due = (
+            sum(_pending_metrics.values()) >= METRIC_FLUSH_THRESHOLD
+            or time.monotonic() - _metrics_flushed_at >= METRIC_FLUSH_INTERVAL
+        )
+    if due:
+        flush_search_metrics()
+
+
+def flush_search_metrics():
+    """Sumar al cache compartido los aciertos y fallos acumulados en este proceso"""
+    global _pending_metrics, _metrics_flushed_at
+
+    with _metrics_lock:
+        batch, _pending_metrics = _pending_metrics, Counter()
+        _metrics_flushed_at = time.monotonic()
+    try:
+        for name in list(batch):
+            key = METRIC_KEYS[name]
+            # add no pisa un contador existente; incr falla si la clave no existe
+            cache.add(key, 0, timeout=None)
+            cache.incr(key, batch[name])
+            del batch[name]
+    except Exception:
+        # Devolver al buffer lo que no se pudo sumar para el próximo intento
+        logger.exception('No se pudieron guardar las métricas del cache de búsqueda')
+        with _metrics_lock:
+            _pending_metrics.update(batch)
+
+
+atexit.register(flush_search_metrics)
+
+
+def get_cached_results(params, compute):
+    """
+    Resultados de una búsqueda identificada por params (dict ya normalizado).
+    compute() retorna (datos serializables, objetos) y solo se llama si no
+    están en el cache. Retorna (datos, objetos o None si vinieron del cache).
+    """
+    key = _results_cache_key(params)
+    data = cache.get(key)
+    if data is not None:
+        _count_metric('hits')
+        return data, None
+
+    _count_metric('misses')
+    data, objects = compute()
+    cache.set(key, data, getattr(settings, 'SEARCH_CACHE_TIMEOUT', 300))
+    return data, objects
+
+
+def fetch_in_order(queryset, ids):
+    """Objetos de queryset con esos ids, en el mismo orden que la lista"""
+    objects = queryset.in_bulk(ids)
+    return [objects[pk] for pk in ids if pk in objects]
+
+
+def get_search_cache_metrics():
+    """
+    Aciertos y fallos del cache de resultados: los sumados por todos los
+    procesos (ver CACHES en settings) más los que este aún no ha volcado
+    """
+    stored = cache.get_many(list(METRIC_KEYS.values()))
+    with _metrics_lock:
+        pending = dict(_pending_metrics)
+    hits = stored.get(METRIC_KEYS['hits'], 0) + pending.get('hits', 0)
+    misses = stored.get(METRIC_KEYS['misses'], 0) + pending.get('misses', 0)
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': round(hits / total, 4) if total else None,
+        'version': get_cache_version(RESULTS_VERSION_KEY),
+    }
+
+
+# ==================== FACETAS ====================
+
+# Rangos de precio final por unidad: (mínimo, máximo), None = sin límite
+PRICE_BUCKETS = ((None, 5), (5, 10), (10, 25), (25, 50), (50, None))
+
+
+def _price_bucket_label(lower, upper):
+    if lower is None:
+        return f'Menos de ${upper}'
+    if upper is None:
+        return f'${lower} o más'
+    return f'${lower} - ${upper}'
+
+
+def compute_offer_facets(queryset, category_id=None, discount_type=None, min_price=None, max_price=None):
+    """
+    Conteos por categoría, tipo de descuento y rango de precio final con una
+    sola consulta agrupada. queryset solo trae el filtro de texto; la
+    categoría, el tipo y el precio se aplican aquí para que cada faceta cuente
+    sin su propio filtro (así se ven las demás opciones).
+    """
+    bucket = Case(
+        *[When(final_price__lt=upper, then=Value(position))
+          for position, (_, upper) in enumerate(PRICE_BUCKETS) if upper is not None],
+        default=Value(len(PRICE_BUCKETS) - 1),
+        output_field=IntegerField()
+    )
+    price_filter = Q()
+    if min_price is not None:
+        price_filter &= Q(final_price__gte=min_price)
+    if max_price is not None:
+        price_filter &= Q(final_price__lte=max_price)
+    # total cuenta todo el grupo (para los rangos de precio); in_price solo lo
+    # que cumple el filtro de precio (para categorías, tipos y el total)
+    rows = list(queryset.order_by().annotate(price_bucket=bucket).values(
+        'category_id', 'discount_type', 'price_bucket'
+    ).annotate(total=Count('id'), in_price=Count('id', filter=price_filter)))
+
+    category_id = int(category_id) if category_id else None
+    in_category = [row for row in rows if category_id is None or row['category_id'] == category_id]
+    in_type = [row for row in rows if not discount_type or row['discount_type'] == discount_type]
+
+    categories = {}
+    for row in in_type:
+        categories[row['category_id']] = categories.get(row['category_id'], 0) + row['in_price']
+
+    discount_types = {}
+    for row in in_category:
+        discount_types[row['discount_type']] = discount_types.get(row['discount_type'], 0) + row['in_price']
+
+    buckets = [0] * len(PRICE_BUCKETS)
+    total = 0
+    for row in in_category:
+        if not discount_type or row['discount_type'] == discount_type:
+            buckets[row['price_bucket']] += row['total']
+            total += row['in_price']
+
+    return {
+        'total': total,
+        'categories': categories,
+        'discount_types': discount_types,
+        'price_buckets': [
+            {'min': lower, 'max': upper, 'label': _price_bucket_label(lower, upper), 'count': count}
+            for (lower, upper), count in zip(PRICE_BUCKETS, buckets)
+        ],
+    }
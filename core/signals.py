@@ -1,7 +1,39 @@
-from django.db.models.signals import post_save, pre_save
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_save, pre_save, post_delete, pre_delete, m2m_changed
 from django.dispatch import receiver
 from django.utils import timezone
-from .models import BusinessRequest, Offer, Review, Notification, User
+from .models import BusinessRequest, Category, Offer, Review, ReviewReply, Notification, User
+from . import autocomplete
+from .maps import invalidate_map_tiles
+from .spatial import invalidate_business_index
+from .search import (index_businesses, index_offers, invalidate_search_results,
+                     refresh_business_offers_search_text, unindex_business, unindex_offer)
+from .utils import POPULARITY_LIKE_WEIGHT, adjust_reaction_counts, record_daily_stats, refresh_popularity_scores
+
+
+# Campos de User que afectan al índice espacial de negocios
+SPATIAL_INDEX_FIELDS = ('role', 'latitude', 'longitude', 'business_verified', 'business_vetted')
+
+# Campos que cambian lo que muestra el autocompletado
+OFFER_AUTOCOMPLETE_FIELDS = {'title', 'is_active', 'expires_at', 'business'}
+BUSINESS_AUTOCOMPLETE_FIELDS = (
+    'role', 'business_name', 'business_description', 'business_verified', 'business_vetted'
+)
+
+
+def get_previous_user(instance):
+    """
+    Estado guardado de un usuario antes de un save, consultado una sola vez
+    y compartido entre los receptores de pre_save.
+    """
+    if not instance.pk:
+        return None
+    if not hasattr(instance, '_previous_user'):
+        instance._previous_user = User.objects.filter(pk=instance.pk).first()
+    return instance._previous_user
 
 
 @receiver(post_save, sender=BusinessRequest)
@@ -100,8 +132,8 @@ def notify_admin_new_business_registration(sender, instance, created, **kwargs):
 @receiver(pre_save, sender=User)
 def notify_business_veto(sender, instance, **kwargs):
     """Notificar a empresa cuando es vetada"""
-    if instance.pk:
-        old_instance = User.objects.get(pk=instance.pk)
+    old_instance = get_previous_user(instance)
+    if old_instance:
         if not old_instance.business_vetted and instance.business_vetted:
             Notification.objects.create(
                 user=instance,
@@ -115,8 +147,8 @@ def notify_business_veto(sender, instance, **kwargs):
 @receiver(pre_save, sender=User)
 def notify_business_verification(sender, instance, **kwargs):
     """Notificar a empresa cuando es verificada"""
-    if instance.pk and instance.role == 'business':
-        old_instance = User.objects.get(pk=instance.pk)
+    old_instance = get_previous_user(instance) if instance.role == 'business' else None
+    if old_instance:
         if not old_instance.business_verified and instance.business_verified:
             Notification.objects.create(
                 user=instance,
@@ -124,4 +156,278 @@ def notify_business_verification(sender, instance, **kwargs):
                 title='¡Cuenta verificada!',
                 message='Tu cuenta empresarial ha sido verificada. Ya puedes crear y gestionar ofertas.',
                 link='/business-dashboard/'
-            )
\ No newline at end of file
+            )
+
+
+@receiver(pre_save, sender=User)
+def track_business_location_changes(sender, instance, **kwargs):
+    """Detectar cambios que afectan al índice espacial de negocios"""
+    old_instance = get_previous_user(instance)
+    if old_instance is None:
+        instance._spatial_index_changed = instance.role == 'business'
+    else:
+        instance._spatial_index_changed = any(
+            getattr(old_instance, field) != getattr(instance, field)
+            for field in SPATIAL_INDEX_FIELDS
+        )
+
+
+@receiver(post_save, sender=User)
+def refresh_business_index(sender, instance, **kwargs):
+    """Reconstruir el índice espacial cuando cambia la ubicación o el estado de un negocio"""
+    if getattr(instance, '_spatial_index_changed', False):
+        transaction.on_commit(invalidate_business_index)
+        transaction.on_commit(invalidate_map_tiles)
+    # El siguiente save debe volver a comparar contra la base de datos
+    instance.__dict__.pop('_previous_user', None)
+    instance._spatial_index_changed = False
+
+
+@receiver(post_delete, sender=User)
+def remove_business_from_index(sender, instance, **kwargs):
+    """Quitar del índice espacial a los negocios eliminados"""
+    if instance.role == 'business':
+        transaction.on_commit(invalidate_business_index)
+        transaction.on_commit(invalidate_map_tiles)
+
+
+@receiver(pre_save, sender=User)
+def track_business_search_changes(sender, instance, **kwargs):
+    """Detectar cambios que afectan al índice de búsqueda de negocios"""
+    old_instance = get_previous_user(instance)
+    if old_instance is None:
+        instance._search_index_changed = instance.role == 'business'
+    else:
+        instance._search_index_changed = any(
+            getattr(old_instance, field) != getattr(instance, field)
+            for field in User.SEARCH_FIELDS
+        )
+
+
+@receiver(post_save, sender=User)
+def update_business_search_index(sender, instance, **kwargs):
+    """Reindexar el negocio y sus ofertas (que incluyen el nombre del negocio)"""
+    if instance.__dict__.pop('_search_index_changed', False):
+        index_businesses([instance.pk])
+        index_offers(refresh_business_offers_search_text(instance))
+
+
+@receiver(post_delete, sender=User)
+def remove_business_from_search_index(sender, instance, **kwargs):
+    """Quitar del índice de búsqueda a los negocios eliminados"""
+    if instance.role == 'business':
+        unindex_business(instance.pk)
+
+
+@receiver(post_save, sender=Offer)
+def update_offer_search_index(sender, instance, **kwargs):
+    """Reindexar la oferta cuando cambia su texto"""
+    update_fields = kwargs.get('update_fields')
+    if update_fields and not set(Offer.SEARCH_FIELDS) & set(update_fields):
+        return
+    index_offers([instance.pk])
+
+
+@receiver(post_delete, sender=Offer)
+def remove_offer_from_search_index(sender, instance, **kwargs):
+    """Quitar del índice de búsqueda las ofertas eliminadas"""
+    unindex_offer(instance.pk)
+
+
+@receiver(pre_save, sender=User)
+def track_business_autocomplete_changes(sender, instance, **kwargs):
+    """Detectar cambios de un negocio que afectan al autocompletado"""
+    old_instance = get_previous_user(instance)
+    if old_instance is None:
+        instance._autocomplete_changed = instance.role == 'business'
+    else:
+        instance._autocomplete_changed = any(
+            getattr(old_instance, field) != getattr(instance, field)
+            for field in BUSINESS_AUTOCOMPLETE_FIELDS
+        )
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def refresh_autocomplete_for_business(sender, instance, **kwargs):
+    """
+    Un negocio que cambia de nombre o de estado también cambia sus ofertas:
+    se reconstruye el índice completo (es poco frecuente)
+    """
+    changed = instance.__dict__.pop('_autocomplete_changed', False)
+    if changed or (kwargs.get('signal') is post_delete and instance.role == 'business'):
+        transaction.on_commit(autocomplete.invalidate_autocomplete_index)
+        # El nombre y el estado del negocio también filtran los resultados de búsqueda
+        transaction.on_commit(invalidate_search_results)
+
+
+@receiver(post_save, sender=Offer)
+def refresh_autocomplete_offer(sender, instance, **kwargs):
+    """Actualizar la oferta en el índice de autocompletado"""
+    update_fields = kwargs.get('update_fields')
+    if update_fields and not OFFER_AUTOCOMPLETE_FIELDS & set(update_fields):
+        return
+    transaction.on_commit(lambda: autocomplete.refresh_offer(instance))
+
+
+@receiver(post_delete, sender=Offer)
+def remove_autocomplete_offer(sender, instance, **kwargs):
+    """Quitar la oferta eliminada del autocompletado"""
+    offer_id = instance.pk
+    transaction.on_commit(lambda: autocomplete.remove_offer(offer_id))
+
+
+@receiver(post_save, sender=Category)
+def refresh_autocomplete_category(sender, instance, **kwargs):
+    """Actualizar la categoría en el autocompletado"""
+    transaction.on_commit(lambda: autocomplete.refresh_category(instance))
+
+
+@receiver(post_delete, sender=Category)
+def remove_autocomplete_category(sender, instance, **kwargs):
+    """Quitar la categoría eliminada del autocompletado"""
+    category_id = instance.pk
+    transaction.on_commit(lambda: autocomplete.remove_category(category_id))
+
+
+@receiver(post_save, sender=Offer)
+@receiver(post_delete, sender=Offer)
+def refresh_search_results(sender, instance, **kwargs):
+    """Nueva generación del cache de resultados de búsqueda cuando cambian las ofertas"""
+    update_fields = kwargs.get('update_fields')
+    if update_fields and set(update_fields) <= {'views'}:
+        return
+    transaction.on_commit(invalidate_search_results)
+
+
+@receiver(post_save, sender=Offer)
+@receiver(post_delete, sender=Offer)
+def refresh_map_tiles(sender, instance, **kwargs):
+    """Descartar los clusters del mapa cuando cambian las ofertas"""
+    update_fields = kwargs.get('update_fields')
+    if update_fields and set(update_fields) <= {'views'}:
+        # Las visitas no cambian los clusters
+        return
+    transaction.on_commit(invalidate_map_tiles)
+
+
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def update_popularity_on_review(sender, instance, **kwargs):
+    """Recalcular la popularidad de la oferta cuando cambian sus reseñas"""
+    refresh_popularity_scores([instance.offer_id])
+
+
+def record_daily_likes(offer_ids, sign):
+    """Sumar (o restar con sign=-1) al acumulado diario un like por cada aparición de la oferta"""
+    offers_by_delta = {}
+    for offer_id, total in Counter(offer_ids).items():
+        offers_by_delta.setdefault(total, []).append(offer_id)
+    for total, ids in offers_by_delta.items():
+        record_daily_stats(ids, likes=sign * total)
+
+
+@receiver(pre_save, sender=Review)
+def track_review_rating(sender, instance, **kwargs):
+    """Guardar la calificación anterior para ajustar el acumulado diario"""
+    if instance.pk:
+        instance._previous_rating = Review.objects.filter(
+            pk=instance.pk
+        ).values_list('rating', flat=True).first()
+
+
+@receiver(post_save, sender=Review)
+def record_daily_review(sender, instance, created, **kwargs):
+    """Registrar la reseña en el acumulado del día en que se creó"""
+    day = timezone.localdate(instance.created_at)
+    if created:
+        record_daily_stats([instance.offer_id], day=day, reviews=1, rating_sum=instance.rating)
+        return
+    
+    previous_rating = instance.__dict__.pop('_previous_rating', None)
+    if previous_rating is not None and previous_rating != instance.rating:
+        record_daily_stats(
+            [instance.offer_id], day=day, create=False,
+            rating_sum=instance.rating - previous_rating
+        )
+
+
+@receiver(post_delete, sender=Review)
+def remove_daily_review(sender, instance, **kwargs):
+    """Descontar la reseña borrada del acumulado del día en que se creó"""
+    record_daily_stats(
+        [instance.offer_id], day=timezone.localdate(instance.created_at), create=False,
+        reviews=-1, rating_sum=-instance.rating
+    )
+
+
+# Tabla intermedia -> (modelo, columna del modelo en la tabla, contador, peso en popularity_score)
+REACTION_COUNTERS = {
+    Offer.likes.through: (Offer, 'offer_id', 'likes_count', POPULARITY_LIKE_WEIGHT),
+    Review.likes.through: (Review, 'review_id', 'likes_count', 0),
+    Review.dislikes.through: (Review, 'review_id', 'dislikes_count', 0),
+    ReviewReply.likes.through: (ReviewReply, 'reviewreply_id', 'likes_count', 0),
+    ReviewReply.dislikes.through: (ReviewReply, 'reviewreply_id', 'dislikes_count', 0),
+}
+
+
+@receiver(m2m_changed, sender=Offer.likes.through)
+@receiver(m2m_changed, sender=Review.likes.through)
+@receiver(m2m_changed, sender=Review.dislikes.through)
+@receiver(m2m_changed, sender=ReviewReply.likes.through)
+@receiver(m2m_changed, sender=ReviewReply.dislikes.through)
+def update_reaction_counters(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Mantener likes_count y popularity_score de ofertas y likes_count,
+    dislikes_count y net_likes de reseñas y respuestas. Los likes de ofertas
+    también se suman al acumulado diario con los mismos ids.
+    """
+    model, target_field, counter, weight = REACTION_COUNTERS[sender]
+    if action in ('pre_remove', 'pre_clear'):
+        # Solo cuentan las reacciones que realmente existen antes de borrarse
+        if reverse:
+            rows = sender.objects.filter(user_id=instance.pk)
+            if action == 'pre_remove':
+                rows = rows.filter(**{f'{target_field}__in': pk_set})
+        else:
+            rows = sender.objects.filter(**{target_field: instance.pk})
+            if action == 'pre_remove':
+                rows = rows.filter(user_id__in=pk_set)
+        instance.__dict__.setdefault('_removed_reactions', {})[sender] = list(
+            rows.values_list(target_field, flat=True)
+        )
+        return
+    
+    if action == 'post_add' and pk_set:
+        # En post_add pk_set ya excluye las reacciones que existían
+        target_ids, sign = (list(pk_set) if reverse else [instance.pk] * len(pk_set)), 1
+    elif action in ('post_remove', 'post_clear'):
+        target_ids, sign = instance.__dict__.get('_removed_reactions', {}).pop(sender, []), -1
+    else:
+        return
+    
+    adjust_reaction_counts(model, counter, target_ids, sign=sign, popularity_weight=weight)
+    if sender is Offer.likes.through:
+        record_daily_likes(target_ids, sign)
+
+
+@receiver(pre_delete, sender=User)
+def remove_user_reactions(sender, instance, **kwargs):
+    """
+    Al borrar un usuario sus reacciones se borran en cascada sin m2m_changed:
+    descontarlas antes de los contadores de ofertas, reseñas y respuestas
+    """
+    for through, (model, target_field, counter, weight) in REACTION_COUNTERS.items():
+        target_ids = through.objects.filter(user_id=instance.pk).values_list(target_field, flat=True)
+        adjust_reaction_counts(model, counter, list(target_ids), sign=-1, popularity_weight=weight)
+
+
+@receiver(post_save, sender=ReviewReply)
+def increment_replies_count(sender, instance, created, **kwargs):
+    if created:
+        Review.objects.filter(pk=instance.review_id).update(replies_count=F('replies_count') + 1)
+
+
+@receiver(post_delete, sender=ReviewReply)
+def decrement_replies_count(sender, instance, **kwargs):
+    Review.objects.filter(pk=instance.review_id).update(replies_count=F('replies_count') - 1)
@@ -0,0 +1,237 @@
+"""
+Índice espacial en memoria de los negocios activos.
+
+Cada proceso mantiene un KD-tree con la ubicación (business_id, lat, lon) de
+los negocios verificados y no vetados. Los puntos se convierten a vectores
+unitarios en 3D, así la distancia euclidiana (cuerda) crece igual que la
+distancia sobre la esfera y el árbol puede descartar ramas completas de forma
+exacta. La distancia final se calcula con utils.calculate_distances.
+
+El índice se reconstruye cuando cambia la versión guardada en el cache
+(ver invalidate_business_index, llamado desde signals.py) o cuando pasa
+SPATIAL_INDEX_TTL segundos. El cache es compartido (CACHES en settings), así
+los demás workers también se enteran.
+
+Con SPATIAL_INDEX_ENABLED=False no se mantiene el árbol: cada búsqueda lee de
+la base de datos solo los negocios del bounding box del radio (índice
+user_location_idx) y calcula la distancia exacta a esos candidatos.
+"""
+import heapq
+import threading
+import time
+from math import asin, sin
+
+import numpy as np
+from django.conf import settings
+
+from .utils import EARTH_RADIUS_KM, bump_cache_version, calculate_distances, filter_by_radius, get_cache_version
+
+
+LEAF_SIZE = 16
+VERSION_CACHE_KEY = 'spatial:business_index_version'
+
+
+def _to_unit_vectors(lats, lons):
+    lat = np.radians(np.asarray(lats, dtype=np.float64))
+    lon = np.radians(np.asarray(lons, dtype=np.float64))
+    cos_lat = np.cos(lat)
+    return np.column_stack((cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)))
+
+
+def _chord_for_distance(distance_km):
+    """Longitud de la cuerda (esfera unitaria) equivalente a una distancia en km"""
+    angle = min(distance_km / EARTH_RADIUS_KM, np.pi)
+    return 2 * sin(angle / 2)
+
+
+def _distance_for_chord(chord):
+    return 2 * EARTH_RADIUS_KM * asin(min(chord / 2, 1.0))
+
+
+class BusinessLocationIndex:
+    """KD-tree inmutable sobre ubicaciones de negocios"""
+
+    def __init__(self, points):
+        """points: iterable de (business_id, lat, lon)"""
+        points = list(points)
+        self.ids = np.array([p[0] for p in points], dtype=np.int64)
+        self.lats = np.array([p[1] for p in points], dtype=np.float64)
+        self.lons = np.array([p[2] for p in points], dtype=np.float64)
+        self.xyz = _to_unit_vectors(self.lats, self.lons) if points else np.empty((0, 3))
+
+        # Nodos: (inicio, fin, mínimos, máximos, hijo_izq, hijo_der)
+        self.nodes = []
+        if points:
+            self._order = np.arange(len(points))
+            self._build(0, len(points))
+            self.ids = self.ids[self._order]
+            self.lats = self.lats[self._order]
+            self.lons = self.lons[self._order]
+            self.xyz = self.xyz[self._order]
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _build(self, start, end):
+        order = self._order
+        points = self.xyz[order[start:end]]
+        lower = points.min(axis=0)
+        upper = points.max(axis=0)
+        node_index = len(self.nodes)
+        self.nodes.append([start, end, lower, upper, None, None])
+
+        if end - start > LEAF_SIZE:
+            axis = int(np.argmax(upper - lower))
+            middle = (start + end) // 2
+            partition = np.argpartition(points[:, axis], middle - start)
+            order[start:end] = order[start:end][partition]
+            self.nodes[node_index][4] = self._build(start, middle)
+            self.nodes[node_index][5] = self._build(middle, end)
+        return node_index
+
+    @staticmethod
+    def _box_distance(point, lower, upper):
+        gap = np.maximum(np.maximum(lower - point, point - upper), 0)
+        return float(np.sqrt(gap @ gap))
+
+    def query_radius(self, lat, lon, radius_km):
+        """
+        Negocios a radius_km o menos del punto.
+        Retorna una lista de (business_id, distancia_km) ordenada por distancia.
+        """
+        if not self.nodes:
+            return []
+        point = _to_unit_vectors([lat], [lon])[0]
+        chord = _chord_for_distance(radius_km)
+
+        candidates = []
+        stack = [0]
+        while stack:
+            start, end, lower, upper, left, right = self.nodes[stack.pop()]
+            if self._box_distance(point, lower, upper) > chord:
+                continue
+            if left is None:
+                candidates.append((start, end))
+            else:
+                stack.extend((left, right))
+
+        if not candidates:
+            return []
+        index = np.concatenate([np.arange(start, end) for start, end in candidates])
+        distances = calculate_distances(lat, lon, self.lats[index], self.lons[index])
+        inside = distances <= radius_km
+        index, distances = index[inside], distances[inside]
+        ranking = np.lexsort((self.ids[index], distances))
+        return list(zip(self.ids[index][ranking].tolist(), distances[ranking].tolist()))
+
+    def query_nearest(self, lat, lon, k=10, max_distance_km=None):
+        """
+        Los k negocios más cercanos al punto (opcionalmente dentro de un radio).
+        Retorna una lista de (business_id, distancia_km) ordenada por distancia.
+        """
+        if not self.nodes or k <= 0:
+            return []
+        point = _to_unit_vectors([lat], [lon])[0]
+        limit = _chord_for_distance(max_distance_km) if max_distance_km is not None else float('inf')
+
+        # Heap con los k mejores como (-cuerda, -business_id): la raíz es el peor
+        best = []
+        queue = [(0.0, 0)]
+        while queue:
+            box_distance, node_index = heapq.heappop(queue)
+            bound = -best[0][0] if len(best) == k else limit
+            if box_distance > bound:
+                break
+            start, end, lower, upper, left, right = self.nodes[node_index]
+            if left is None:
+                diff = self.xyz[start:end] - point
+                chords = np.sqrt(np.einsum('ij,ij->i', diff, diff))
+                for offset, chord in enumerate(chords.tolist()):
+                    if chord > limit:
+                        continue
+                    entry = (-chord, -int(self.ids[start + offset]))
+                    if len(best) < k:
+                        heapq.heappush(best, entry)
+                    elif entry > best[0]:
+                        heapq.heapreplace(best, entry)
+            else:
+                for child in (left, right):
+                    _, _, child_lower, child_upper, _, _ = self.nodes[child]
+                    heapq.heappush(queue, (self._box_distance(point, child_lower, child_upper), child))
+
+        results = [(-business_id, _distance_for_chord(-chord)) for chord, business_id in best]
+        results.sort(key=lambda item: (item[1], item[0]))
+        return results
+
+
+_lock = threading.Lock()
+_index = None
+_index_version = None
+_index_built_at = 0
+
+
+def _business_locations():
+    from .models import User
+
+    return User.objects.filter(
+        role='business',
+        business_verified=True,
+        business_vetted=False,
+        latitude__isnull=False,
+        longitude__isnull=False,
+    )
+
+
+def _load_business_points():
+    return _business_locations().values_list('id', 'latitude', 'longitude')
+
+
+def query_radius_db(lat, lon, radius_km):
+    """
+    Lo mismo que BusinessLocationIndex.query_radius, consultando la base de
+    datos: solo los negocios del bounding box llegan al cálculo exacto.
+    """
+    candidates = filter_by_radius(_business_locations(), lat, lon, radius_km)
+    points = np.array(list(candidates.values_list('id', 'latitude', 'longitude')), dtype=float).reshape(-1, 3)
+    distances = calculate_distances(lat, lon, points[:, 1], points[:, 2])
+    inside = distances <= radius_km
+    ids, distances = points[inside, 0].astype(np.int64), distances[inside]
+    ranking = np.lexsort((ids, distances))
+    return list(zip(ids[ranking].tolist(), distances[ranking].tolist()))
+
+
+def find_nearby_businesses(lat, lon, radius_km):
+    """
+    Negocios a radius_km o menos del punto, como (business_id, distancia_km)
+    ordenados por distancia. Usa el índice en memoria salvo que
+    SPATIAL_INDEX_ENABLED sea False.
+    """
+    if not getattr(settings, 'SPATIAL_INDEX_ENABLED', True):
+        return query_radius_db(lat, lon, radius_km)
+    return get_business_index().query_radius(lat, lon, radius_km)
+
+
+def get_business_index():
+    """Índice del proceso actual, reconstruido si está desactualizado"""
+    global _index, _index_version, _index_built_at
+
+    version = get_cache_version(VERSION_CACHE_KEY)
+    ttl = getattr(settings, 'SPATIAL_INDEX_TTL', 300)
+    index = _index
+    if index is not None and _index_version == version and time.monotonic() - _index_built_at < ttl:
+        return index
+
+    with _lock:
+        if _index is None or _index_version != version or time.monotonic() - _index_built_at >= ttl:
+            _index = BusinessLocationIndex(_load_business_points())
+            _index_version = version
+            _index_built_at = time.monotonic()
+        return _index
+
+
+def invalidate_business_index():
+    """Forzar la reconstrucción del índice en todos los procesos"""
+    global _index
+
+    _index = None
+    bump_cache_version(VERSION_CACHE_KEY)
@@ -0,0 +1,83 @@
+// ==================== GRÁFICAS DE TENDENCIAS ====================
+// Dibuja la serie diaria (vistas, likes, reseñas y calificación promedio)
+// que generan las vistas a partir de OfferDailyStats. Requiere Chart.js.
+
+function initDailyTrendsChart(canvasId, dataElementId) {
+    const trends = JSON.parse(document.getElementById(dataElementId).textContent);
+
+    const labels = trends.map(item => {
+        const date = new Date(item.date + 'T00:00:00');
+        return date.toLocaleDateString('es-ES', { day: '2-digit', month: 'short' });
+    });
+
+    return new Chart(document.getElementById(canvasId), {
+        type: 'line',
+        data: {
+            labels: labels,
+            datasets: [
+                {
+                    label: 'Vistas',
+                    data: trends.map(item => item.views),
+                    borderColor: '#8B9A7E',
+                    backgroundColor: 'rgba(139, 154, 126, 0.1)',
+                    tension: 0.4,
+                    fill: true,
+                    yAxisID: 'y'
+                },
+                {
+                    label: 'Me Gusta',
+                    data: trends.map(item => item.likes),
+                    borderColor: '#E07A5F',
+                    tension: 0.4,
+                    yAxisID: 'y'
+                },
+                {
+                    label: 'Reseñas',
+                    data: trends.map(item => item.reviews),
+                    borderColor: '#3D5A80',
+                    tension: 0.4,
+                    yAxisID: 'y'
+                },
+                {
+                    label: 'Calificación Promedio',
+                    data: trends.map(item => item.avg_rating),
+                    borderColor: '#F2CC8F',
+                    borderDash: [5, 5],
+                    spanGaps: true,
+                    tension: 0.4,
+                    yAxisID: 'rating'
+                }
+            ]
+        },
+        options: {
+            responsive: true,
+            maintainAspectRatio: true,
+            interaction: {
+                mode: 'index',
+                intersect: false
+            },
+            plugins: {
+                legend: {
+                    display: true,
+                    position: 'top'
+                }
+            },
+            scales: {
+                y: {
+                    beginAtZero: true,
+                    ticks: {
+                        precision: 0
+                    }
+                },
+                rating: {
+                    position: 'right',
+                    min: 0,
+                    max: 5,
+                    grid: {
+                        drawOnChartArea: false
+                    }
+                }
+            }
+        }
+    });
+}
@@ -19,53 +19,131 @@ function getCookie(name) {
 
 const csrftoken = getCookie('csrftoken');
 
-// ==================== LIKES ====================
-function toggleLike(offerId) {
-    fetch(`/api/offers/${offerId}/like/`, {
+// ==================== REACCIONES ====================
+// Los likes, dislikes y seguimientos se muestran al instante y se envían
+// juntos a /api/reactions/batch/ tras una pausa corta. Cada operación lleva
+// el estado deseado, así que si el usuario cambia de opinión varias veces
+// solo viaja el último. Cada tipo registra en reactionViews cómo leer su
+// estado actual y cómo pintarlo (data trae los totales del servidor).
+const REACTIONS_BATCH_URL = '/api/reactions/batch/';
+const REACTIONS_FLUSH_DELAY = 400;
+
+const reactionViews = {};
+let pendingReactions = new Map();
+let reactionsTimer = null;
+let reactionsInFlight = false;
+
+function toggleReaction(type, id) {
+    const view = reactionViews[type];
+    const key = `${type}:${id}`;
+    const pending = pendingReactions.get(key);
+    const active = !(pending ? pending.active : view.isActive(id));
+    
+    view.render(id, active);
+    // El último cambio va al final para que el servidor respete el orden
+    pendingReactions.delete(key);
+    pendingReactions.set(key, { type: type, id: id, active: active });
+    
+    clearTimeout(reactionsTimer);
+    reactionsTimer = setTimeout(flushReactions, REACTIONS_FLUSH_DELAY);
+}
+
+function flushReactions(keepalive = false) {
+    clearTimeout(reactionsTimer);
+    // Un lote a la vez: las respuestas llegan en orden
+    if (!pendingReactions.size || (reactionsInFlight && !keepalive)) return;
+    
+    const operations = Array.from(pendingReactions.values());
+    pendingReactions = new Map();
+    reactionsInFlight = true;
+    
+    fetch(REACTIONS_BATCH_URL, {
         method: 'POST',
+        keepalive: keepalive,
         headers: {
             'X-CSRFToken': csrftoken,
             'Content-Type': 'application/json',
         },
+        body: JSON.stringify({ operations: operations }),
+    })
+    .then(response => {
+        if (!response.ok) {
+            throw new Error(`HTTP error! status: ${response.status}`);
+        }
+        return response.json();
     })
-    .then(response => response.json())
     .then(data => {
+        data.results.forEach(result => {
+            // Si hay un cambio más nuevo en cola, su respuesta pintará el estado
+            if (result.error || pendingReactions.has(`${result.type}:${result.id}`)) return;
+            reactionViews[result.type].render(result.id, result.active, result);
+        });
+    })
+    .catch(error => {
+        console.error('Error:', error);
+        // Volver al estado anterior de lo que no se pudo guardar
+        operations.forEach(operation => {
+            if (pendingReactions.has(`${operation.type}:${operation.id}`)) return;
+            reactionViews[operation.type].render(operation.id, !operation.active);
+        });
+    })
+    .finally(() => {
+        reactionsInFlight = false;
+        if (pendingReactions.size) {
+            reactionsTimer = setTimeout(flushReactions, REACTIONS_FLUSH_DELAY);
+        }
+    });
+}
+
+// Enviar lo pendiente antes de salir de la página
+document.addEventListener('visibilitychange', function() {
+    if (document.visibilityState === 'hidden') flushReactions(true);
+});
+window.addEventListener('pagehide', () => flushReactions(true));
+
+// ==================== LIKES ====================
+reactionViews.offer_like = {
+    isActive: offerId => {
+        const likeBtn = document.querySelector(`[data-offer-id="${offerId}"]`);
+        return !!likeBtn && likeBtn.classList.contains('liked');
+    },
+    render: (offerId, liked, data) => {
         const likeBtn = document.querySelector(`[data-offer-id="${offerId}"]`);
         const likeCount = document.querySelector(`#like-count-${offerId}`);
         
         if (likeBtn) {
-            if (data.liked) {
-                likeBtn.classList.add('liked');
-                likeBtn.innerHTML = '<i class="fas fa-heart"></i>';
+            likeBtn.classList.toggle('liked', liked);
+            const icon = likeBtn.querySelector('.fa-heart');
+            if (icon) {
+                icon.classList.toggle('fas', liked);
+                icon.classList.toggle('far', !liked);
             } else {
-                likeBtn.classList.remove('liked');
-                likeBtn.innerHTML = '<i class="far fa-heart"></i>';
+                likeBtn.innerHTML = `<i class="${liked ? 'fas' : 'far'} fa-heart"></i>`;
             }
         }
         
-        if (likeCount) {
+        if (likeCount && data) {
             likeCount.textContent = data.likes_count;
         }
-    })
-    .catch(error => console.error('Error:', error));
+    },
+};
+
+function toggleLike(offerId) {
+    toggleReaction('offer_like', offerId);
 }
 
 // ==================== SEGUIR EMPRESA ====================
-function toggleFollowBusiness(businessId) {
-    fetch(`/api/business/${businessId}/follow/`, {
-        method: 'POST',
-        headers: {
-            'X-CSRFToken': csrftoken,
-            'Content-Type': 'application/json',
-        },
-    })
-    .then(response => response.json())
-    .then(data => {
+reactionViews.follow_business = {
+    isActive: businessId => {
+        const followBtn = document.querySelector(`#follow-btn-${businessId}`);
+        return !!followBtn && followBtn.classList.contains('btn-secondary');
+    },
+    render: (businessId, following, data) => {
         const followBtn = document.querySelector(`#follow-btn-${businessId}`);
         const followCount = document.querySelector(`#followers-count-${businessId}`);
         
         if (followBtn) {
-            if (data.following) {
+            if (following) {
                 followBtn.innerHTML = '<i class="fas fa-check"></i> Siguiendo';
                 followBtn.classList.remove('btn-primary');
                 followBtn.classList.add('btn-secondary');
@@ -76,39 +154,41 @@ function toggleFollowBusiness(businessId) {
             }
         }
         
-        if (followCount) {
+        if (followCount && data) {
             followCount.textContent = data.followers_count;
         }
-    })
-    .catch(error => console.error('Error:', error));
+    },
+};
+
+function toggleFollowBusiness(businessId) {
+    toggleReaction('follow_business', businessId);
 }
 
 // ==================== SEGUIR CATEGORÍA ====================
-function toggleFollowCategory(categoryId) {
-    fetch(`/api/category/${categoryId}/follow/`, {
-        method: 'POST',
-        headers: {
-            'X-CSRFToken': csrftoken,
-            'Content-Type': 'application/json',
-        },
-    })
-    .then(response => response.json())
-    .then(data => {
+reactionViews.follow_category = {
+    isActive: categoryId => {
+        const followBtn = document.querySelector(`#follow-cat-${categoryId}`);
+        return !!followBtn && !followBtn.classList.contains('btn-outline-primary');
+    },
+    render: (categoryId, following) => {
         const followBtn = document.querySelector(`#follow-cat-${categoryId}`);
         
         if (followBtn) {
-            if (data.following) {
+            if (following) {
                 followBtn.innerHTML = '<i class="fas fa-check"></i> Siguiendo';
-                followBtn.classList.remove('btn-outline-primary');
+                followBtn.classList.remove('btn-outline-primary', 'btn-secondary');
                 followBtn.classList.add('btn-primary');
             } else {
                 followBtn.innerHTML = '<i class="fas fa-plus"></i> Seguir';
-                followBtn.classList.remove('btn-primary');
+                followBtn.classList.remove('btn-primary', 'btn-secondary');
                 followBtn.classList.add('btn-outline-primary');
             }
         }
-    })
-    .catch(error => console.error('Error:', error));
+    },
+};
+
+function toggleFollowCategory(categoryId) {
+    toggleReaction('follow_category', categoryId);
 }
 
 // ==================== NOTIFICACIONES ====================
@@ -168,7 +248,7 @@ function initializeSearch() {
                     if (data.results.length > 0) {
                         let html = '<div class="list-group">';
                         data.results.forEach(result => {
-                            const icon = result.type === 'offer' ? 'tag' : 'store';
+                            const icon = { offer: 'tag', business: 'store', category: 'th-large' }[result.type] || 'search';
                             html += `
                                 <a href="${result.url}" class="list-group-item list-group-item-action">
                                     <i class="fas fa-${icon} me-2"></i>
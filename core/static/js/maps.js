@@ -0,0 +1,67 @@
+// ==================== MAPA DE OFERTAS ====================
+// Muestra las ofertas agrupadas en clusters calculados por el servidor
+// (/api/offers/map/). Requiere que la página cargue la API de Google Maps.
+
+function initOffersMap(elementId, options = {}) {
+    const map = new google.maps.Map(document.getElementById(elementId), {
+        center: options.center || { lat: 8.9824, lng: -79.5199 },
+        zoom: options.zoom || 12,
+    });
+
+    let markers = [];
+    let requestId = 0;
+
+    function clearMarkers() {
+        markers.forEach(marker => marker.setMap(null));
+        markers = [];
+    }
+
+    function renderClusters(clusters) {
+        clearMarkers();
+        clusters.forEach(cluster => {
+            const position = { lat: cluster.lat, lng: cluster.lng };
+            const marker = new google.maps.Marker({
+                position: position,
+                map: map,
+                title: cluster.count > 1
+                    ? `${cluster.count} ofertas`
+                    : `${cluster.top_offer.title} - ${cluster.top_offer.business}`,
+                label: cluster.count > 1 ? String(cluster.count) : undefined,
+            });
+
+            marker.addListener('click', () => {
+                if (cluster.count > 1) {
+                    map.setCenter(position);
+                    map.setZoom(map.getZoom() + 2);
+                } else {
+                    window.location.href = cluster.top_offer.url;
+                }
+            });
+            markers.push(marker);
+        });
+    }
+
+    function loadClusters() {
+        const bounds = map.getBounds();
+        if (!bounds) {
+            return;
+        }
+        const sw = bounds.getSouthWest();
+        const ne = bounds.getNorthEast();
+        const bbox = [sw.lat(), sw.lng(), ne.lat(), ne.lng()].map(value => value.toFixed(5)).join(',');
+        const currentRequest = ++requestId;
+
+        fetch(`/api/offers/map/?bbox=${bbox}&zoom=${map.getZoom()}`)
+            .then(response => response.json())
+            .then(data => {
+                // Ignorar respuestas de viewports anteriores
+                if (currentRequest === requestId && data.clusters) {
+                    renderClusters(data.clusters);
+                }
+            })
+            .catch(error => console.error('Error:', error));
+    }
+
+    map.addListener('idle', loadClusters);
+    return map;
+}
@@ -0,0 +1,91 @@
+// ==================== CARGA CONTINUA DE OFERTAS ====================
+// Pide a /api/offers/feed/ la siguiente tanda de tarjetas cuando el usuario
+// llega al final de la lista y las agrega a la grilla con una plantilla
+// <template>, sin volver a cargar la página. La paginación normal queda
+// como respaldo si el navegador no tiene IntersectionObserver.
+
+function fillOfferCard(template, offer) {
+    const card = template.content.firstElementChild.cloneNode(true);
+    const setText = (field, value) => {
+        const element = card.querySelector(`[data-field="${field}"]`);
+        if (!element) return;
+        if (value === null || value === undefined || value === '') {
+            element.remove();
+        } else {
+            element.textContent = value;
+        }
+    };
+
+    setText('offer_display', offer.offer_display);
+    setText('title', offer.title);
+    setText('business', offer.business);
+    setText('category', offer.category);
+    setText('description', offer.description);
+    setText('original_price', offer.original_price ? `$${offer.original_price}` : null);
+    setText('price_label', offer.price_label);
+    setText('views', offer.views);
+    setText('likes_count', offer.likes_count);
+
+    const image = card.querySelector('[data-field="image"]');
+    image.src = offer.image_url;
+    image.alt = offer.title;
+    card.querySelector('[data-field="url"]').href = offer.url;
+    return card;
+}
+
+function initOffersFeed(gridId, templateId, paginationId) {
+    const grid = document.getElementById(gridId);
+    const template = document.getElementById(templateId);
+    if (!grid || !template || !('IntersectionObserver' in window)) return;
+
+    let nextCursor = grid.dataset.nextCursor;
+    if (!nextCursor) return;
+
+    const pagination = document.getElementById(paginationId);
+    if (pagination) pagination.classList.add('d-none');
+
+    const sentinel = document.createElement('div');
+    sentinel.className = 'text-center text-muted py-3';
+    sentinel.innerHTML = '<i class="fas fa-spinner fa-spin"></i>';
+    grid.after(sentinel);
+
+    let loading = false;
+    const observer = new IntersectionObserver(function(entries) {
+        if (!entries[0].isIntersecting || loading || !nextCursor) return;
+        loading = true;
+
+        const url = new URL(grid.dataset.feedUrl, window.location.origin);
+        url.searchParams.set('cursor', nextCursor);
+        fetch(url)
+            .then(response => response.json())
+            .then(data => {
+                const fragment = document.createDocumentFragment();
+                data.results.forEach(offer => fragment.appendChild(fillOfferCard(template, offer)));
+                grid.appendChild(fragment);
+
+                nextCursor = data.next_cursor;
+                if (!nextCursor) {
+                    observer.disconnect();
+                    sentinel.remove();
+                }
+            })
+            .catch(error => {
+                // Si falla, se vuelve a la paginación normal
+                console.error('Error:', error);
+                nextCursor = null;
+                observer.disconnect();
+                sentinel.remove();
+                if (pagination) pagination.classList.remove('d-none');
+            })
+            .finally(() => {
+                loading = false;
+                if (nextCursor) {
+                    // Volver a observar: si el final sigue visible se pide otra tanda
+                    observer.unobserve(sentinel);
+                    observer.observe(sentinel);
+                }
+            });
+    }, { rootMargin: '400px' });
+
+    observer.observe(sentinel);
+}
@@ -0,0 +1,949 @@
+import json
+import re
+import runpy
+import time
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from . import autocomplete
+from .maps import MAX_TILES, count_viewport_tiles, get_viewport_tiles
+from .models import Category, Offer, OfferDailyStats, Review, ReviewReply, TrendingOffer, User
+from .pagination import KeysetPaginator, encode_cursor
+from .reactions import BATCH_MAX_OPERATIONS, set_reaction
+from . import search
+from .search import flush_search_metrics, search_businesses_queryset, search_offers_queryset
+from .spatial import find_nearby_businesses, get_business_index
+from .utils import POPULARITY_LIKE_WEIGHT, calculate_offer_prices, refresh_popularity_scores
+from . import view_counter
+from .view_counter import flush_views
+
+
+def create_business(username, **fields):
+    fields.setdefault('business_name', username)
+    return User.objects.create(username=username, role='business', business_verified=True, **fields)
+
+
+def create_offer(business, category, title='Oferta', expires_in=timedelta(days=3), original_price=Decimal('100'),
+                 **fields):
+    fields.setdefault('discount_type', 'percentage')
+    fields.setdefault('discount_value', Decimal('10'))
+    return Offer.objects.create(
+        business=business,
+        category=category,
+        title=title,
+        description='Descripción',
+        expires_at=timezone.now() + expires_in,
+        original_price=original_price,
+        **fields
+    )
+
+
+class CountAnnotationTests(TestCase):
+    """
+    Los conteos de with_counts y with_business_counts salen de subconsultas
+    por relación: con varias relaciones a la vez los JOIN multiplicarían las
+    filas (likes x reseñas, ofertas x seguidores) e inflarían los totales.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Comida')
+        cls.users = [User.objects.create(username=f'user{i}') for i in range(6)]
+        cls.business = create_business('negocio')
+        cls.other_business = create_business('otro')
+
+        cls.offer = create_offer(cls.business, cls.category)
+        cls.offer.likes.add(*cls.users[:4])
+        for user, rating in zip(cls.users[:3], (5, 4, 3)):
+            Review.objects.create(offer=cls.offer, user=user, rating=rating, comment='ok')
+        cls.quiet_offer = create_offer(cls.business, cls.category, title='Sin reacciones')
+        create_offer(cls.business, cls.category, title='Vencida', expires_in=-timedelta(days=1))
+
+        for user in cls.users[:5]:
+            user.following_businesses.add(cls.business)
+
+    def assert_single_query_without_joins(self, context):
+        self.assertEqual(len(context.captured_queries), 1)
+        self.assertIsNone(re.search(r'\bJOIN\b', context.captured_queries[0]['sql'], re.IGNORECASE))
+
+    def test_offer_counts_do_not_multiply(self):
+        with CaptureQueriesContext(connection) as context:
+            offers = {offer.pk: offer for offer in Offer.objects.with_counts()}
+        self.assert_single_query_without_joins(context)
+
+        self.assertEqual(len(offers), Offer.objects.count())
+        offer = offers[self.offer.pk]
+        self.assertEqual((offer.likes_total, offer.reviews_total), (4, 3))
+        self.assertAlmostEqual(offer.avg_rating, 4.0)
+        quiet = offers[self.quiet_offer.pk]
+        self.assertEqual((quiet.likes_total, quiet.reviews_total, quiet.avg_rating), (0, 0, 0.0))
+
+    def test_business_counts_do_not_multiply(self):
+        businesses = User.objects.filter(role='business').with_business_counts()
+        with CaptureQueriesContext(connection) as context:
+            counts = {
+                business.pk: (business.offers_count, business.followers_count)
+                for business in businesses
+            }
+        self.assert_single_query_without_joins(context)
+
+        self.assertEqual(len(counts), User.objects.filter(role='business').count())
+        # Solo cuentan las ofertas vigentes
+        self.assertEqual(counts[self.business.pk], (2, 5))
+        self.assertEqual(counts[self.other_business.pk], (0, 0))
+
+
+class OfferFacetTests(TestCase):
+    """Cada faceta de offers_list cuenta sin su propio filtro"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.food = Category.objects.create(name='Comida')
+        cls.tech = Category.objects.create(name='Tecnología')
+        business = create_business('negocio')
+        # Precio final con 10% de descuento: 9, 18, 45 y 90
+        cls.offers = [
+            create_offer(business, category, original_price=Decimal(price))
+            for category, price in ((cls.food, 10), (cls.food, 20), (cls.tech, 50), (cls.tech, 100))
+        ]
+
+    def tearDown(self):
+        # Las métricas del cache de búsqueda quedan en memoria: guardarlas mientras exista la base de prueba
+        flush_search_metrics()
+
+    def get_facets(self, **params):
+        context = self.client.get('/offers/', params).context
+        return {
+            'total': context['total_results'],
+            'prices': [facet['count'] for facet in context['price_facets']],
+            'categories': {category.name: category.offers_count for category in context['categories']},
+            'discount_types': {facet['value']: facet['count'] for facet in context['discount_type_facets']},
+        }
+
+    def test_price_filter_keeps_other_price_buckets(self):
+        facets = self.get_facets(min_price='10', max_price='25')
+
+        self.assertEqual(facets['total'], 1)
+        self.assertEqual(facets['prices'], [0, 1, 1, 1, 1])
+        self.assertEqual(facets['categories'], {'Comida': 1, 'Tecnología': 0})
+        self.assertEqual(facets['discount_types']['percentage'], 1)
+
+    def test_trending_facets_count_the_listed_ranking(self):
+        now = timezone.now()
+        # Ranking general: 20 y 100; ranking de tecnología: solo 50
+        for rank, (offer, category) in enumerate(
+            ((self.offers[1], None), (self.offers[3], None), (self.offers[2], self.tech)), start=1
+        ):
+            TrendingOffer.objects.create(offer=offer, category=category, rank=rank, score=1, computed_at=now)
+
+        context = self.client.get('/offers/', {'sort': 'trending'}).context
+        self.assertEqual(list(context['page_obj']), [self.offers[1], self.offers[3]])
+        facets = self.get_facets(sort='trending')
+        self.assertEqual(facets['total'], 2)
+        self.assertEqual(facets['prices'], [0, 0, 1, 0, 1])
+        self.assertEqual(facets['categories'], {'Comida': 1, 'Tecnología': 1})
+
+        context = self.client.get('/offers/', {'sort': 'trending', 'category': str(self.tech.pk)}).context
+        self.assertEqual(list(context['page_obj']), [self.offers[2]])
+        self.assertEqual(context['total_results'], 1)
+
+    def test_category_filter_counts_price_buckets_in_category(self):
+        facets = self.get_facets(category=str(self.tech.pk), max_price='50')
+
+        self.assertEqual(facets['total'], 1)
+        self.assertEqual(facets['prices'], [0, 0, 0, 1, 1])
+        self.assertEqual(facets['categories'], {'Comida': 2, 'Tecnología': 1})
+
+
+class KeysetPaginatorTests(TestCase):
+    """La paginación por cursor recorre todo el orden sin saltos ni repetidos"""
+
+    ORDERING = ('-popularity_score', '-id')
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Comida')
+        business = create_business('negocio')
+        # Claves de ordenamiento repetidas: el desempate por -id decide el orden
+        for score in (3, 3, 2, 2, 2, 1, 1):
+            offer = create_offer(business, category)
+            Offer.objects.filter(pk=offer.pk).update(popularity_score=score)
+        cls.expected = list(Offer.objects.order_by(*cls.ORDERING).values_list('id', flat=True))
+        cls.expected_recent = sorted(cls.expected, reverse=True)
+
+    def paginator(self):
+        return KeysetPaginator(Offer.objects.all(), self.ORDERING, 3)
+
+    def ids(self, page):
+        return [offer.id for offer in page]
+
+    def test_forward_and_back(self):
+        pages = [self.paginator().get_page(None)]
+        while pages[-1].has_next():
+            pages.append(self.paginator().get_page(pages[-1].next_cursor))
+        self.assertEqual([len(page) for page in pages], [3, 3, 1])
+        self.assertEqual([pk for page in pages for pk in self.ids(page)], self.expected)
+
+        # De regreso se ven exactamente las mismas páginas
+        page = pages[-1]
+        for previous in reversed(pages[:-1]):
+            page = self.paginator().get_page(page.previous_cursor)
+            self.assertEqual(self.ids(page), self.ids(previous))
+        self.assertFalse(page.has_previous())
+        self.assertTrue(page.has_next())
+
+    def test_page_attributes(self):
+        first = self.paginator().get_page(None)
+        self.assertTrue(first.has_next())
+        self.assertFalse(first.has_previous())
+        self.assertTrue(first.has_other_pages())
+        self.assertIsNone(first.previous_cursor)
+        self.assertEqual(first.paginator.count, 7)
+
+        last = self.paginator().get_page(self.paginator().get_page(first.next_cursor).next_cursor)
+        self.assertFalse(last.has_next())
+        self.assertIsNone(last.next_cursor)
+        self.assertTrue(last.has_previous())
+
+        single = KeysetPaginator(Offer.objects.all(), self.ORDERING, 10).get_page(None)
+        self.assertEqual(len(single), 7)
+        self.assertFalse(single.has_other_pages())
+
+    def test_invalid_cursor_returns_first_page(self):
+        first = self.ids(self.paginator().get_page(None))
+        cursors = [
+            'no-es-un-cursor', '!!!', encode_cursor({'n': 1}), encode_cursor(['x', 1, 1]),
+            encode_cursor(['n', 1]), encode_cursor(['n', 'abc', 1]), encode_cursor(['n', {'a': 1}, [1]]),
+            # Un cursor más allá del final
+            encode_cursor(['n', -1, 0]),
+        ]
+        for cursor in cursors:
+            with self.subTest(cursor=cursor):
+                page = self.paginator().get_page(cursor)
+                self.assertEqual(self.ids(page), first)
+                self.assertIsNone(page.previous_cursor)
+
+    def test_invalid_cursor_in_view(self):
+        # Orden 'recent' (-created_at, -id) con una fecha imposible
+        response = self.client.get('/offers/', {'cursor': encode_cursor(['n', '2024-13-45', 1])})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.ids(response.context['page_obj']), self.expected_recent)
+        flush_search_metrics()
+
+
+class OfferDetailQueryTests(TestCase):
+    """offer_detail cuesta las mismas consultas sin importar cuántas reseñas y respuestas haya"""
+
+    # Oferta, primera página de reseñas, total y promedio, ofertas relacionadas
+    ANONYMOUS_QUERIES = 4
+    # Además: sesión, usuario, reacciones del usuario (UNION) y su reseña
+    AUTHENTICATED_QUERIES = 8
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Comida')
+        cls.business = create_business('negocio')
+        cls.viewer = User.objects.create(username='visitante')
+        cls.offers = {}
+        for size in (1, 5, 20):
+            offer = create_offer(cls.business, cls.category, title=f'{size} reseñas')
+            offer.likes.add(cls.viewer)
+            for i in range(size):
+                author = User.objects.create(username=f'autor{size}_{i}')
+                review = Review.objects.create(offer=offer, user=author, rating=1 + i % 5, comment='ok')
+                review.likes.add(cls.viewer)
+                for _ in range(3):
+                    reply = ReviewReply.objects.create(review=review, user=cls.business, comment='gracias')
+                    reply.dislikes.add(cls.viewer)
+            cls.offers[size] = offer
+
+    def tearDown(self):
+        # Las visitas quedan en el buffer en memoria: guardarlas mientras exista la base de prueba
+        flush_views()
+
+    def assert_constant_queries(self, expected):
+        for size, offer in self.offers.items():
+            with self.subTest(reviews=size):
+                with self.assertNumQueries(expected):
+                    response = self.client.get(f'/offers/{offer.pk}/')
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.context['review_count'], size)
+
+    def test_anonymous(self):
+        self.assert_constant_queries(self.ANONYMOUS_QUERIES)
+
+    def test_authenticated(self):
+        self.client.force_login(self.viewer)
+        self.assert_constant_queries(self.AUTHENTICATED_QUERIES)
+
+
+class OfferLikeQueryTests(TestCase):
+    """Dar o quitar un like a una oferta cuesta lo mismo sin importar cuántos likes tenga"""
+
+    # Sentencias dentro de la transacción, sin SAVEPOINT/RELEASE (en producción
+    # la transacción de set_reaction es la externa): INSERT ... ON CONFLICT o
+    # DELETE del like, UPDATE ... RETURNING de likes_count y popularity_score y
+    # el upsert del día. Alternar hacia activo prueba antes el DELETE
+    SET_STATEMENTS = 3
+    TOGGLE_ON_STATEMENTS = 4
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Comida')
+        business = create_business('negocio')
+        cls.viewer = User.objects.create(username='visitante')
+        cls.offers = {}
+        for size in (1, 30):
+            offer = create_offer(business, category, title=f'{size} likes')
+            offer.likes.add(*[User.objects.create(username=f'fan{size}_{i}') for i in range(size)])
+            cls.offers[size] = offer
+
+    def statements(self, *args):
+        with CaptureQueriesContext(connection) as context:
+            result = set_reaction(self.viewer, *args)
+        queries = [query['sql'] for query in context.captured_queries]
+        return result, [sql for sql in queries if not sql.startswith(('SAVEPOINT', 'RELEASE'))]
+
+    def test_toggle_like(self):
+        for size, offer in self.offers.items():
+            with self.subTest(likes=size):
+                for expected_active, expected_likes, expected_statements in (
+                    (True, size + 1, self.TOGGLE_ON_STATEMENTS), (False, size, self.SET_STATEMENTS)
+                ):
+                    (active, counts), statements = self.statements('offer_like', offer.pk)
+                    self.assertEqual(len(statements), expected_statements)
+                    self.assertEqual((active, counts['likes_count']), (expected_active, expected_likes))
+
+                    # El delta deja la misma popularidad que recalcularla desde cero
+                    offer.refresh_from_db()
+                    score = offer.popularity_score
+                    refresh_popularity_scores([offer.pk])
+                    offer.refresh_from_db()
+                    self.assertEqual(score, offer.popularity_score)
+
+                stats = OfferDailyStats.objects.get(offer=offer, date=timezone.localdate())
+                self.assertEqual((stats.views, stats.likes), (0, size))
+
+    def test_set_like_state(self):
+        offer = self.offers[30]
+        for active, expected_likes, expected_statements in (
+            (True, 31, self.SET_STATEMENTS),
+            # Pedir el estado que ya tiene solo lee los contadores
+            (True, 31, 2),
+            (False, 30, self.SET_STATEMENTS),
+            (False, 30, 2),
+        ):
+            (_, counts), statements = self.statements('offer_like', offer.pk, active)
+            self.assertEqual(len(statements), expected_statements)
+            self.assertEqual(counts['likes_count'], expected_likes)
+        offer.refresh_from_db()
+        self.assertEqual(offer.likes_count, offer.likes.count())
+        self.assertEqual(OfferDailyStats.objects.get(offer=offer, date=timezone.localdate()).likes, 30)
+
+    def test_missing_offer(self):
+        for active in (None, True, False):
+            with self.assertRaises(Offer.DoesNotExist):
+                set_reaction(self.viewer, 'offer_like', 0, active)
+        self.assertFalse(Offer.likes.through.objects.filter(user=self.viewer).exists())
+        self.assertFalse(OfferDailyStats.objects.filter(offer_id=0).exists())
+
+    def test_signal_path_keeps_popularity(self):
+        offer = self.offers[1]
+        fans = list(User.objects.filter(username__startswith='fan30_')[:3])
+        offer.likes.add(*fans)
+        fans[0].liked_offers.remove(offer)
+        fans[1].liked_offers.clear()
+        fans[2].delete()
+
+        offer.refresh_from_db()
+        likes = offer.likes.count()
+        self.assertEqual(likes, 1)
+        self.assertEqual(offer.likes_count, likes)
+        self.assertEqual(offer.popularity_score, offer.views + likes * POPULARITY_LIKE_WEIGHT)
+
+    def test_signal_path_reads_removed_likes_once(self):
+        offer = self.offers[30]
+        fans = list(offer.likes.all()[:2])
+        with CaptureQueriesContext(connection) as context:
+            offer.likes.remove(*fans)
+        lookups = [
+            query for query in context.captured_queries
+            if query['sql'].startswith('SELECT') and 'core_offer_likes' in query['sql']
+        ]
+        self.assertEqual(len(lookups), 1)
+
+        # Contador y acumulado diario salen de los mismos ids
+        offer.refresh_from_db()
+        stats = OfferDailyStats.objects.get(offer=offer, date=timezone.localdate())
+        self.assertEqual((offer.likes_count, stats.likes), (28, 28))
+
+
+class ReactionCounterTests(TestCase):
+    """Los contadores guardados de reseñas y respuestas coinciden con un COUNT de sus tablas"""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Comida')
+        cls.business = create_business('negocio')
+        cls.offer = create_offer(cls.business, category)
+        cls.users = [User.objects.create(username=f'cliente{i}') for i in range(4)]
+        cls.reviews = [
+            Review.objects.create(offer=cls.offer, user=user, rating=4, comment='ok') for user in cls.users[:2]
+        ]
+        cls.replies = [
+            ReviewReply.objects.create(review=cls.reviews[0], user=user, comment='gracias')
+            for user in (cls.business, cls.users[2], cls.users[3])
+        ]
+
+    def assertCountersMatch(self):
+        for review in Review.objects.all():
+            likes, dislikes = review.likes.count(), review.dislikes.count()
+            self.assertEqual(
+                (review.likes_count, review.dislikes_count, review.net_likes, review.replies_count),
+                (likes, dislikes, likes - dislikes, review.replies.count()),
+            )
+        for reply in ReviewReply.objects.all():
+            likes, dislikes = reply.likes.count(), reply.dislikes.count()
+            self.assertEqual(
+                (reply.likes_count, reply.dislikes_count, reply.net_likes), (likes, dislikes, likes - dislikes)
+            )
+
+    def react(self):
+        """Reacciones por el servicio y por las relaciones, en ambos sentidos"""
+        review, other = self.reviews
+        reply = self.replies[0]
+        for user in self.users:
+            set_reaction(user, 'review_like', review.pk)
+            set_reaction(user, 'reply_dislike', reply.pk)
+        set_reaction(self.users[0], 'review_dislike', review.pk)
+        set_reaction(self.users[1], 'reply_like', reply.pk)
+        other.likes.add(*self.users[:3])
+        other.dislikes.add(self.users[3])
+        self.users[2].liked_reviews.remove(other)
+        self.users[3].disliked_replies.add(*self.replies[1:])
+        self.replies[2].dislikes.clear()
+
+    def test_reactions(self):
+        self.react()
+        self.assertCountersMatch()
+        # El dislike de cliente0 reemplaza su like
+        review = Review.objects.get(pk=self.reviews[0].pk)
+        self.assertEqual((review.likes_count, review.dislikes_count, review.net_likes), (3, 1, 2))
+
+    def test_user_deletion(self):
+        self.react()
+        self.users[3].delete()
+        self.assertCountersMatch()
+        # Junto con el usuario se borra su respuesta
+        self.assertEqual(Review.objects.get(pk=self.reviews[0].pk).replies_count, 2)
+
+    def test_reply_deletion(self):
+        self.react()
+        self.replies[1].delete()
+        self.assertCountersMatch()
+        self.assertEqual(Review.objects.get(pk=self.reviews[0].pk).replies_count, 2)
+
+    def test_repair_counters(self):
+        self.react()
+        self.offer.likes.add(*self.users[:2])
+        expected_popularity = Offer.objects.get(pk=self.offer.pk).popularity_score
+        Review.objects.filter(pk=self.reviews[0].pk).update(likes_count=9, net_likes=-3, replies_count=0)
+        ReviewReply.objects.filter(pk=self.replies[0].pk).update(dislikes_count=0)
+        Offer.objects.filter(pk=self.offer.pk).update(
+            likes_count=5, popularity_score=expected_popularity + 3 * POPULARITY_LIKE_WEIGHT
+        )
+
+        output = StringIO()
+        call_command('repair_counters', stdout=output)
+        self.assertIn('Offer: 1, Review: 1, ReviewReply: 1', output.getvalue())
+        self.assertCountersMatch()
+        offer = Offer.objects.get(pk=self.offer.pk)
+        self.assertEqual(offer.likes_count, 2)
+        self.assertAlmostEqual(offer.popularity_score, expected_popularity)
+
+        # Sin desviaciones no se toca ninguna fila
+        call_command('repair_counters', stdout=output)
+        self.assertIn('Offer: 0, Review: 0, ReviewReply: 0', output.getvalue())
+
+
+class ReactionsBatchApiTests(TestCase):
+    """reactions_batch_api valida el lote completo y aplicarlo dos veces deja el mismo estado"""
+
+    URL = '/api/reactions/batch/'
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Comida')
+        business = create_business('negocio')
+        cls.offer = create_offer(business, category)
+        cls.review = Review.objects.create(
+            offer=cls.offer, user=User.objects.create(username='autor'), rating=5, comment='ok'
+        )
+        cls.viewer = User.objects.create(username='visitante')
+
+    def setUp(self):
+        self.client.force_login(self.viewer)
+
+    def post(self, operations, raw=None):
+        body = raw if raw is not None else json.dumps({'operations': operations})
+        return self.client.post(self.URL, body, content_type='application/json')
+
+    def test_invalid_payloads(self):
+        valid = {'type': 'offer_like', 'id': self.offer.pk, 'active': True}
+        payloads = [
+            '{"operations": [', 'null', '[]', '{}', '{"operations": {"type": "offer_like"}}',
+            json.dumps({'operations': []}),
+            json.dumps({'operations': [valid] * (BATCH_MAX_OPERATIONS + 1)}),
+            json.dumps({'operations': [{'type': 'offer_like', 'id': self.offer.pk}]}),
+            json.dumps({'operations': [{**valid, 'type': 'offer_love'}]}),
+            json.dumps({'operations': [{**valid, 'active': 'true'}]}),
+        ]
+        payloads += [
+            json.dumps({'operations': [valid, {**valid, 'id': target_id}]})
+            for target_id in (10 ** 30, 2 ** 63, 0, -1, True, 1.5, 'abc', None, [1])
+        ]
+        for payload in payloads:
+            with self.subTest(payload=payload[:80]):
+                self.assertEqual(self.post(None, raw=payload).status_code, 400)
+        # Un lote rechazado no aplica ninguna operación
+        self.assertFalse(self.offer.likes.exists())
+
+    def test_batch_limit(self):
+        operations = [{'type': 'offer_like', 'id': self.offer.pk, 'active': True}] * BATCH_MAX_OPERATIONS
+        self.assertEqual(self.post(operations).status_code, 200)
+
+    def test_replay_and_counters(self):
+        operations = [
+            {'type': 'offer_like', 'id': self.offer.pk, 'active': True},
+            {'type': 'review_dislike', 'id': self.review.pk, 'active': True},
+            # El like llega después y reemplaza al dislike
+            {'type': 'review_like', 'id': self.review.pk, 'active': True},
+            {'type': 'offer_like', 'id': 2 ** 63 - 1, 'active': True},
+            {'type': 'follow_business', 'id': self.review.user_id, 'active': True},
+        ]
+        responses = [self.post(operations), self.post(operations)]
+        for response in responses:
+            self.assertEqual(response.status_code, 200)
+        results = responses[0].json()['results']
+        self.assertEqual(responses[1].json()['results'], results)
+
+        by_target = {(result['type'], result['id']): result for result in results}
+        self.assertEqual(
+            by_target['offer_like', self.offer.pk],
+            {'type': 'offer_like', 'id': self.offer.pk, 'active': True, 'likes_count': 1},
+        )
+        self.assertEqual(by_target['offer_like', 2 ** 63 - 1]['error'], 'not_found')
+        # follow_business solo acepta negocios
+        self.assertEqual(by_target['follow_business', self.review.user_id]['error'], 'not_found')
+
+        # Cada resultado trae los totales después de su operación
+        counters = ('active', 'likes_count', 'dislikes_count', 'net_likes')
+        self.assertEqual([by_target['review_dislike', self.review.pk][key] for key in counters], [True, 0, 1, -1])
+        self.assertEqual([by_target['review_like', self.review.pk][key] for key in counters], [True, 1, 0, 1])
+
+        # Los contadores guardados coinciden con las tablas después de repetir el lote
+        offer = Offer.objects.get(pk=self.offer.pk)
+        review = Review.objects.get(pk=self.review.pk)
+        self.assertEqual((offer.likes_count, offer.likes.count()), (1, 1))
+        refresh_popularity_scores([offer.pk])
+        self.assertEqual(offer.popularity_score, Offer.objects.get(pk=offer.pk).popularity_score)
+        self.assertEqual(
+            (review.likes_count, review.dislikes_count, review.net_likes),
+            (review.likes.count(), review.dislikes.count(), 1),
+        )
+        self.assertEqual(OfferDailyStats.objects.get(offer=offer, date=timezone.localdate()).likes, 1)
+
+
+class NearbyBusinessTests(TestCase):
+    """El prefiltro por bounding box en la base de datos encuentra lo mismo que el índice en memoria"""
+
+    @classmethod
+    def setUpTestData(cls):
+        points = [
+            (8.98, -79.52), (8.99, -79.50), (9.05, -79.45), (9.40, -79.90), (-33.45, -70.66),
+            # A ambos lados del antimeridiano
+            (0.0, 179.99), (0.0, -179.99), (0.5, 179.5),
+        ]
+        for i, (lat, lon) in enumerate(points):
+            create_business(f'negocio{i}', latitude=lat, longitude=lon)
+        create_business('vetado', latitude=8.98, longitude=-79.52, business_vetted=True)
+        create_business('sin ubicación')
+
+    def test_database_prefilter_matches_index(self):
+        for lat, lon, radius in ((8.98, -79.52, 10), (8.98, -79.52, 80), (0.0, 180.0, 60), (0.0, 0.0, 1)):
+            with self.subTest(lat=lat, lon=lon, radius=radius):
+                expected = get_business_index().query_radius(lat, lon, radius)
+                with override_settings(SPATIAL_INDEX_ENABLED=False):
+                    found = find_nearby_businesses(lat, lon, radius)
+                self.assertEqual([pk for pk, _ in found], [pk for pk, _ in expected])
+                for (_, distance), (_, expected_distance) in zip(found, expected):
+                    self.assertAlmostEqual(distance, expected_distance)
+
+    @override_settings(SPATIAL_INDEX_ENABLED=False)
+    def test_database_prefilter_reads_only_the_box(self):
+        with CaptureQueriesContext(connection) as context:
+            found = find_nearby_businesses(8.98, -79.52, 10)
+        self.assertEqual(len(found), 2)
+        self.assertEqual(len(context.captured_queries), 1)
+        self.assertIn('"latitude" BETWEEN', context.captured_queries[0]['sql'])
+
+
+class OfferMapTests(TestCase):
+    """El zoom del mapa se ajusta contando tiles, sin enumerar los del zoom pedido"""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Comida')
+        business = create_business('negocio', latitude=8.98, longitude=-79.52)
+        create_offer(business, category)
+
+    def test_world_box_at_max_zoom(self):
+        started = time.monotonic()
+        response = self.client.get('/api/offers/map/', {'bbox': '-90,-180,90,180', 'zoom': '20'})
+        self.assertLess(time.monotonic() - started, 2)
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertLessEqual(len(get_viewport_tiles(-90, -180, 90, 180, data['zoom'])), MAX_TILES)
+        self.assertEqual(sum(cluster['count'] for cluster in data['clusters']), 1)
+
+    def test_tile_count_matches_tiles(self):
+        viewports = [(-90, -180, 90, 180), (8.9, -79.6, 9.1, -79.4), (-10, 170, 10, -170), (40, 179.9, 41, -179.9)]
+        for viewport in viewports:
+            for zoom in range(0, 9):
+                with self.subTest(viewport=viewport, zoom=zoom):
+                    self.assertEqual(count_viewport_tiles(*viewport, zoom), len(get_viewport_tiles(*viewport, zoom)))
+
+
+@override_settings(VIEW_FLUSH_INTERVAL=3600, VIEW_FLUSH_THRESHOLD=100, VIEW_DEDUP_SECONDS=0)
+class ViewCounterTests(TestCase):
+    """Las visitas se acumulan en memoria y llegan a Offer.views al volcarlas"""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Comida')
+        business = create_business('negocio')
+        cls.offer = create_offer(business, category)
+        cls.other_offer = create_offer(business, category, title='Otra')
+
+    def setUp(self):
+        flush_views()
+        # El hilo de volcado periódico no debe escribir durante la prueba
+        patcher = mock.patch.object(view_counter, '_start_flusher')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(flush_views)
+
+    def visit(self, offer, session=None):
+        request = RequestFactory().get(f'/offers/{offer.pk}/')
+        request.session = session if session is not None else {}
+        return view_counter.record_view(request, offer.pk)
+
+    def assert_views(self, offer, expected):
+        offer.refresh_from_db()
+        self.assertEqual(offer.views, expected)
+
+    def test_flush_writes_pending_views(self):
+        for _ in range(3):
+            self.visit(self.offer)
+        self.visit(self.other_offer)
+        self.assertEqual(view_counter.pending_views(self.offer.pk), 3)
+        self.assert_views(self.offer, 0)
+
+        self.assertEqual(flush_views(), 4)
+        self.assertEqual(view_counter.pending_views(self.offer.pk), 0)
+        self.assert_views(self.offer, 3)
+        self.assert_views(self.other_offer, 1)
+        self.assertEqual(self.offer.popularity_score, 3)
+        stats = OfferDailyStats.objects.get(offer=self.offer, date=timezone.localdate())
+        self.assertEqual(stats.views, 3)
+        self.assertEqual(flush_views(), 0)
+
+    @override_settings(VIEW_FLUSH_THRESHOLD=3)
+    def test_threshold_triggers_flush(self):
+        self.visit(self.offer)
+        self.visit(self.offer)
+        self.assert_views(self.offer, 0)
+        self.visit(self.offer)
+        self.assert_views(self.offer, 3)
+        self.assertEqual(view_counter.pending_views(self.offer.pk), 0)
+
+    def test_failed_flush_keeps_views_pending(self):
+        # Los grupos se escriben en orden: primero el de 1 visita, luego el de 2
+        self.visit(self.other_offer)
+        for _ in range(2):
+            self.visit(self.offer)
+        record_offer_views = view_counter.record_offer_views
+
+        def fail_for_two(offer_ids, count):
+            if count == 2:
+                raise RuntimeError
+            return record_offer_views(offer_ids, count)
+
+        with mock.patch.object(view_counter, 'record_offer_views', side_effect=fail_for_two), \
+                self.assertLogs(view_counter.logger, 'ERROR'):
+            self.assertEqual(flush_views(), 1)
+        # El grupo que falló vuelve al buffer; el que se escribió no se repite
+        self.assertEqual(view_counter.pending_views(self.offer.pk), 2)
+        self.assertEqual(view_counter.pending_views(self.other_offer.pk), 0)
+        self.assert_views(self.offer, 0)
+        self.assertFalse(OfferDailyStats.objects.filter(offer=self.offer).exists())
+
+        self.assertEqual(flush_views(), 2)
+        self.assert_views(self.offer, 2)
+        self.assert_views(self.other_offer, 1)
+
+    @override_settings(VIEW_DEDUP_SECONDS=60)
+    def test_session_counts_one_view_per_window(self):
+        session = {}
+        self.assertTrue(self.visit(self.offer, session))
+        self.assertFalse(self.visit(self.offer, session))
+        self.assertTrue(self.visit(self.other_offer, session))
+        self.assertTrue(self.visit(self.offer))
+
+        # Pasada la ventana la misma sesión vuelve a contar
+        with mock.patch.object(view_counter.time, 'time', return_value=time.time() + 61):
+            self.assertTrue(self.visit(self.offer, session))
+        self.assertEqual(view_counter.pending_views(self.offer.pk), 3)
+
+    def test_worker_exit_flushes(self):
+        self.visit(self.offer)
+        hooks = runpy.run_path(str(settings.BASE_DIR / 'gunicorn.conf.py'))
+        hooks['worker_exit'](None, None)
+        self.assert_views(self.offer, 1)
+
+
+class AutocompleteIndexTests(TestCase):
+    """Los cambios de una oferta llegan a los índices de los demás procesos sin reconstruirlos"""
+
+    STATE = ('_index', '_index_version', '_index_change', '_index_built_at')
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Comida')
+        cls.business = create_business('negocio')
+        cls.offer = create_offer(cls.business, cls.category, title='Pizza familiar')
+
+    def setUp(self):
+        saved = self.process_state()
+        self.addCleanup(self.switch_process, saved)
+        self.switch_process((None, None, 0, 0))
+
+    def process_state(self):
+        return tuple(getattr(autocomplete, name) for name in self.STATE)
+
+    def switch_process(self, state):
+        """Simular otro worker: cada proceso tiene su propio índice"""
+        for name, value in zip(self.STATE, state):
+            setattr(autocomplete, name, value)
+
+    def titles(self, query):
+        return [result['title'] for result in autocomplete.autocomplete(query)]
+
+    def test_offer_change_is_replayed_by_other_process(self):
+        self.assertEqual(self.titles('pizza'), ['Pizza familiar'])
+        other_process = self.process_state()
+
+        # Este proceso no tiene índice: solo registra los cambios
+        self.switch_process((None, None, 0, 0))
+        with self.captureOnCommitCallbacks(execute=True):
+            new_offer = create_offer(self.business, self.category, title='Pizza mediana')
+            self.offer.delete()
+
+        self.switch_process(other_process)
+        with mock.patch.object(autocomplete, '_load_items', side_effect=AssertionError('reconstruido')):
+            self.assertEqual(self.titles('pizza'), ['Pizza mediana'])
+        self.assertIs(autocomplete._index, other_process[0])
+
+        # El proceso que hizo el cambio lo aplica sin volver a leerlo
+        with self.captureOnCommitCallbacks(execute=True):
+            new_offer.title = 'Pizza grande'
+            new_offer.save()
+        self.assertEqual(self.titles('pizza'), ['Pizza grande'])
+
+    def test_lost_change_rebuilds(self):
+        self.titles('pizza')
+        with self.captureOnCommitCallbacks(execute=True):
+            create_offer(self.business, self.category, title='Pizza mediana')
+            create_offer(self.business, self.category, title='Pizza grande')
+        self.switch_process((autocomplete._index, autocomplete._index_version, 0, autocomplete._index_built_at))
+        autocomplete.cache.delete(autocomplete.CHANGE_CACHE_KEY.format(1))
+
+        index = autocomplete._index
+        self.assertEqual(len(self.titles('pizza')), 3)
+        self.assertIsNot(autocomplete._index, index)
+
+    def test_business_change_rebuilds(self):
+        self.titles('pizza')
+        index = autocomplete._index
+        with self.captureOnCommitCallbacks(execute=True):
+            self.business.business_name = 'Pizzería'
+            self.business.save()
+        self.assertEqual(self.titles('pizzer'), ['Pizzería'])
+        self.assertIsNot(autocomplete._index, index)
+
+
+class SearchTextTests(TestCase):
+    """Las búsquedas encuentran palabras sin acentos y subcadenas de search_text"""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Comida')
+        cls.business = create_business('cafeteria', business_name='Cafetería Núñez', location_name='Panamá')
+        cls.coffee = create_offer(cls.business, category, title='Café de la casa')
+        cls.pizza = create_offer(cls.business, category, title='Pizzería del barrio')
+
+    def offer_titles(self, query):
+        return set(search_offers_queryset(Offer.objects.all(), query).values_list('title', flat=True))
+
+    def test_accents_are_folded(self):
+        self.assertEqual(self.offer_titles('CAFE casa'), {'Café de la casa'})
+        self.assertEqual(self.offer_titles('pizzeria'), {'Pizzería del barrio'})
+        businesses = search_businesses_queryset(User.objects.all(), 'nunez panama')
+        self.assertEqual(list(businesses), [self.business])
+
+    def test_substrings_inside_words(self):
+        self.assertEqual(self.offer_titles('zzer'), {'Pizzería del barrio'})
+        self.assertEqual(self.offer_titles('arri zzer'), {'Pizzería del barrio'})
+        self.assertEqual(self.offer_titles('eteri'), {'Café de la casa', 'Pizzería del barrio'})
+        self.assertEqual(self.offer_titles('zzx'), set())
+
+    def test_word_matches_rank_first(self):
+        # El título pesa más que el nombre del negocio
+        ranked = search_offers_queryset(Offer.objects.all(), 'cafe').order_by('-search_rank')
+        self.assertEqual(list(ranked), [self.coffee, self.pizza])
+        self.assertGreater(ranked[1].search_rank, 0)
+        # Las coincidencias solo por subcadena no tienen bm25
+        substring_only = search_offers_queryset(Offer.objects.all(), 'zzer').get()
+        self.assertEqual(substring_only.search_rank, 0)
+
+    def test_edited_and_deleted_offers_leave_the_index(self):
+        self.pizza.title = 'Hamburguesas'
+        self.pizza.save()
+        self.assertEqual(self.offer_titles('zzer'), set())
+        self.assertEqual(self.offer_titles('burgues'), {'Hamburguesas'})
+        self.pizza.delete()
+        self.assertEqual(self.offer_titles('burgues'), set())
+
+
+class OfferPriceTests(TestCase):
+    """final_price, discount_amount y savings_ratio que usan los filtros y órdenes por precio"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Comida')
+        cls.business = create_business('negocio')
+
+    def assert_prices(self, expected, **fields):
+        offer = create_offer(self.business, self.category, **fields)
+        offer.refresh_from_db()
+        final_price, discount_amount, savings_ratio = expected
+        self.assertEqual(offer.final_price, Decimal(final_price))
+        self.assertEqual(offer.discount_amount, Decimal(discount_amount))
+        self.assertAlmostEqual(offer.savings_ratio, savings_ratio)
+        return offer
+
+    def test_percentage(self):
+        self.assert_prices(('85.00', '15.00', 0.15), discount_type='percentage', discount_value=Decimal('15'))
+        self.assert_prices(
+            ('6.66', '3.33', 0.3333), original_price=Decimal('9.99'),
+            discount_type='percentage', discount_value=Decimal('33.33'),
+        )
+
+    def test_fixed(self):
+        self.assert_prices(('70.00', '30.00', 0.3), discount_type='fixed', discount_value=Decimal('30'))
+        # Un descuento mayor que el precio deja la oferta gratis, no negativa
+        self.assert_prices(('0.00', '100.00', 1.0), discount_type='fixed', discount_value=Decimal('150'))
+
+    def test_buy_x_get_y(self):
+        # 2x1 a $12: se pagan 2 y se llevan 3, $8 por unidad. discount_amount
+        # sigue la fórmula original de la plantilla (X pagadas contra X+Y a
+        # precio por unidad), que para NxM siempre da 0
+        self.assert_prices(
+            ('8.00', '0.00', 0.3333), original_price=Decimal('12'),
+            discount_type='buy_x_get_y', quantity_x=2, quantity_y=1,
+        )
+
+    def test_bundle(self):
+        self.assert_prices(
+            ('10.00', '8.00', 0.2857), original_price=Decimal('14'),
+            discount_type='buy_x_for_price', quantity_x=2, bundle_price=Decimal('20'),
+        )
+
+    def test_missing_price(self):
+        # El precio original es opcional en los paquetes: sin él no hay ahorro
+        self.assert_prices(
+            ('10.00', '0.00', 0.0), original_price=None,
+            discount_type='buy_x_for_price', quantity_x=2, bundle_price=Decimal('20'),
+        )
+        self.assert_prices(('0.00', '0.00', 0.0), original_price=None, discount_type='percentage')
+        # Sin los datos del descuento se cobra el precio original
+        self.assert_prices(('100.00', '0.00', 0.0), discount_type='buy_x_get_y', quantity_y=None)
+        self.assertEqual(
+            calculate_offer_prices('fixed', Decimal('50'), None, None, None, None),
+            (Decimal('50.00'), Decimal('0.00'), 0.0)
+        )
+
+    def test_update_fields_recompute_prices(self):
+        offer = self.assert_prices(('90.00', '10.00', 0.1))
+        offer.discount_value = Decimal('25')
+        offer.save(update_fields=['discount_value'])
+        offer.refresh_from_db()
+        self.assertEqual((offer.final_price, offer.discount_amount), (Decimal('75.00'), Decimal('25.00')))
+        self.assertAlmostEqual(offer.savings_ratio, 0.25)
+
+
+class SearchMetricsTests(TestCase):
+    """Los aciertos y fallos del cache de búsqueda se acumulan por proceso y se suman por lotes"""
+
+    def setUp(self):
+        flush_search_metrics()
+        search.cache.delete_many(list(search.METRIC_KEYS.values()))
+        self.addCleanup(flush_search_metrics)
+
+    def search(self, query):
+        return search.get_cached_results({'q': query}, lambda: ({'ids': [1]}, None))
+
+    def stored(self):
+        return search.cache.get_many(list(search.METRIC_KEYS.values()))
+
+    def test_metrics_are_buffered(self):
+        with CaptureQueriesContext(connection) as context:
+            self.search('pizza')
+            self.search('pizza')
+        # Solo se lee y guarda el resultado: las métricas no tocan el cache
+        self.assertFalse([query for query in context.captured_queries if 'search:cache_' in query['sql']])
+        self.assertEqual(self.stored(), {})
+
+        metrics = search.get_search_cache_metrics()
+        self.assertEqual((metrics['hits'], metrics['misses'], metrics['hit_ratio']), (1, 1, 0.5))
+
+        flush_search_metrics()
+        self.assertEqual(self.stored(), {'search:cache_hits': 1, 'search:cache_misses': 1})
+        self.assertEqual(search.get_search_cache_metrics()['hits'], 1)
+
+    def test_threshold_adds_to_shared_counters(self):
+        search.cache.set(search.METRIC_KEYS['hits'], 5, timeout=None)
+        with mock.patch.object(search, 'METRIC_FLUSH_THRESHOLD', 3):
+            for _ in range(3):
+                self.search('pizza')
+        self.assertEqual(self.stored(), {'search:cache_hits': 7, 'search:cache_misses': 1})
+
+    def test_failed_flush_keeps_metrics_pending(self):
+        self.search('pizza')
+        with mock.patch.object(search.cache, 'incr', side_effect=RuntimeError), \
+                self.assertLogs(search.logger, 'ERROR'):
+            flush_search_metrics()
+        self.assertEqual(search.get_search_cache_metrics()['misses'], 1)
+
+        flush_search_metrics()
+        self.assertEqual(self.stored().get('search:cache_misses'), 1)
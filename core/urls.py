@@ -5,6 +5,7 @@ urlpatterns = [
     # Páginas públicas
     path('', views.home, name='home'),
     path('offers/', views.offers_list, name='offers_list'),
+    path('offers/nearby/', views.nearby_offers, name='nearby_offers'),
     path('offers/<int:pk>/', views.offer_detail, name='offer_detail'),
     path('businesses/', views.businesses_list, name='businesses_list'),
     path('business/<int:pk>/', views.business_profile, name='business_profile'),
@@ -47,6 +48,8 @@ urlpatterns = [
     path('offers/<int:offer_id>/review/create/', views.create_review, name='create_review'),
     path('reviews/<int:pk>/edit/', views.edit_review, name='edit_review'),
     path('reviews/<int:pk>/delete/', views.delete_review, name='delete_review'),
+    path('api/offers/<int:offer_id>/reviews/', views.offer_reviews_api, name='offer_reviews_api'),
+    path('api/reviews/<int:review_id>/replies/', views.review_replies_api, name='review_replies_api'),
     path('api/reviews/<int:review_id>/like/', views.toggle_review_like, name='toggle_review_like'),
     path('api/reviews/<int:review_id>/dislike/', views.toggle_review_dislike, name='toggle_review_dislike'),
     path('reviews/<int:review_id>/reply/', views.create_review_reply, name='create_review_reply'),
@@ -59,7 +62,12 @@ urlpatterns = [
     path('api/offers/<int:offer_id>/like/', views.toggle_like, name='toggle_like'),
     path('api/business/<int:business_id>/follow/', views.toggle_follow_business, name='toggle_follow_business'),
     path('api/category/<int:category_id>/follow/', views.toggle_follow_category, name='toggle_follow_category'),
+    path('api/reactions/batch/', views.reactions_batch_api, name='reactions_batch_api'),
     path('api/notifications/<int:notification_id>/read/', views.mark_notification_read, name='mark_notification_read'),
     path('api/notifications/unread-count/', views.get_unread_notifications_count, name='unread_notifications_count'),
     path('api/search/', views.search_api, name='search_api'),
+    path('api/search/metrics/', views.search_cache_metrics_api, name='search_cache_metrics_api'),
+    path('api/offers/map/', views.offers_map_api, name='offers_map_api'),
+    path('api/offers/nearby/', views.nearby_offers_api, name='nearby_offers_api'),
+    path('api/offers/feed/', views.offers_feed_api, name='offers_feed_api'),
 ]
\ No newline at end of file
@@ -1,14 +1,36 @@
-from math import radians, sin, cos, sqrt, atan2
-from django.db.models import Avg, Count, Q
+from math import radians, degrees, sin, cos, sqrt, atan2
+from collections import Counter
+import unicodedata
+from decimal import Decimal, ROUND_HALF_UP
+import numpy as np
+from django.core.cache import cache
+from django.db.models import Avg, Count, Q, F, OuterRef
 from django.utils import timezone
 
 
+EARTH_RADIUS_KM = 6371
+
+
+def get_cache_version(key):
+    """Versión actual de un grupo de entradas del cache (0 si no existe)"""
+    return cache.get(key, 0)
+
+
+def bump_cache_version(key):
+    """Invalidar un grupo de entradas del cache incrementando su versión"""
+    try:
+        return cache.incr(key)
+    except ValueError:
+        cache.add(key, 1, timeout=None)
+        return get_cache_version(key)
+
+
 def calculate_distance(lat1, lon1, lat2, lon2):
     """
     Calcular distancia entre dos puntos usando la fórmula de Haversine
     Retorna la distancia en kilómetros
     """
-    R = 6371  # Radio de la Tierra en km
+    R = EARTH_RADIUS_KM
     
     lat1_rad = radians(lat1)
     lat2_rad = radians(lat2)
@@ -22,68 +44,445 @@ def calculate_distance(lat1, lon1, lat2, lon2):
     return distance
 
 
+def calculate_distances(lat, lon, lats, lons):
+    """
+    Versión vectorizada de calculate_distance: distancia desde un origen a
+    muchos puntos en una sola operación de NumPy.
+    lats y lons pueden ser listas o arrays; retorna un array en kilómetros.
+    """
+    lat1 = np.radians(lat)
+    lat2 = np.radians(np.asarray(lats, dtype=np.float64))
+    delta_lat = lat2 - lat1
+    delta_lon = np.radians(np.asarray(lons, dtype=np.float64) - lon)
+    
+    a = np.sin(delta_lat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(delta_lon / 2) ** 2
+    a = np.clip(a, 0, 1)
+    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+    return EARTH_RADIUS_KM * c
+
+
+def get_bounding_box(lat, lon, radius_km):
+    """
+    Bounding box que contiene el círculo de radio radius_km alrededor del punto.
+    Retorna (min_lat, max_lat, min_lon, max_lon); min_lon puede ser mayor que
+    max_lon si el box cruza el antimeridiano. Si cubre todas las longitudes,
+    retorna min_lon=-180 y max_lon=180.
+    """
+    delta_lat = degrees(radius_km / EARTH_RADIUS_KM)
+    min_lat = max(lat - delta_lat, -90)
+    max_lat = min(lat + delta_lat, 90)
+    
+    # El ancho en longitud depende de la latitud más alejada del ecuador
+    widest = max(abs(min_lat), abs(max_lat))
+    if widest >= 90 or delta_lat >= 90:
+        return min_lat, max_lat, -180, 180
+    delta_lon = delta_lat / cos(radians(widest))
+    if delta_lon >= 180:
+        return min_lat, max_lat, -180, 180
+    
+    min_lon = lon - delta_lon
+    max_lon = lon + delta_lon
+    if min_lon < -180:
+        min_lon += 360
+    if max_lon > 180:
+        max_lon -= 360
+    return min_lat, max_lat, min_lon, max_lon
+
+
+def filter_by_box(queryset, min_lat, max_lat, min_lon, max_lon, prefix=''):
+    """
+    Limitar un queryset a las ubicaciones dentro del box con rangos sobre
+    latitude y longitude (índice user_location_idx). min_lon > max_lon indica
+    que el box cruza el antimeridiano. prefix permite filtrar a través de una
+    relación (ej: 'business__').
+    """
+    queryset = queryset.filter(**{f'{prefix}latitude__range': (min_lat, max_lat)})
+    if min_lon <= max_lon:
+        return queryset.filter(**{f'{prefix}longitude__range': (min_lon, max_lon)})
+    return queryset.filter(
+        Q(**{f'{prefix}longitude__gte': min_lon}) |
+        Q(**{f'{prefix}longitude__lte': max_lon})
+    )
+
+
+def filter_by_radius(queryset, lat, lon, radius_km, prefix=''):
+    """
+    Prefiltro espacial en la base de datos: los registros cuya ubicación cae
+    dentro del bounding box del radio. La distancia exacta se calcula aparte.
+    """
+    return filter_by_box(queryset, *get_bounding_box(lat, lon, radius_km), prefix=prefix)
+
+
 def get_nearby_offers(user_lat, user_lon, max_distance_km=10):
     """
-    Obtener ofertas cercanas a una ubicación
+    Obtener ofertas cercanas a una ubicación.
+    Los negocios dentro del radio salen de spatial.find_nearby_businesses;
+    solo sus ofertas se consultan en la base de datos.
+    """
+    from .spatial import find_nearby_businesses
+    
+    nearby_businesses = find_nearby_businesses(user_lat, user_lon, max_distance_km)
+    return _offers_for_businesses(nearby_businesses)
+
+
+def get_nearby_offers_page(user_lat, user_lon, max_distance_km=10, category=None,
+                           after=None, limit=12):
+    """
+    Una página de ofertas cercanas ordenadas por (distancia, id).
+    after es la clave (distancia, id) de la última oferta de la página anterior.
+    Se consultan solo los negocios que siguen al cursor, por bloques, hasta
+    llenar la página; por eso una página profunda cuesta lo mismo que la primera.
+    Retorna (ofertas, hay_más).
+    """
+    from bisect import bisect_left
+    from .spatial import find_nearby_businesses
+    
+    nearby_businesses = find_nearby_businesses(user_lat, user_lon, max_distance_km)
+    distances = [distance for _, distance in nearby_businesses]
+    position = bisect_left(distances, after[0]) if after else 0
+    
+    offers = []
+    chunk_size = max(limit, 10)
+    while len(offers) <= limit and position < len(nearby_businesses):
+        end = min(position + chunk_size, len(nearby_businesses))
+        # No separar negocios con la misma distancia entre bloques
+        while end < len(nearby_businesses) and distances[end] == distances[end - 1]:
+            end += 1
+        chunk = _offers_for_businesses(nearby_businesses[position:end], category=category)
+        if after:
+            chunk = [offer for offer in chunk if (offer._distance, offer.id) > tuple(after)]
+        offers.extend(chunk)
+        position = end
+    
+    return offers[:limit], len(offers) > limit
+
+
+def _offers_for_businesses(nearby_businesses, category=None):
+    """
+    Ofertas vigentes de una lista de (business_id, distancia), con el atributo
+    distance y ordenadas por (distancia, id).
     """
     from .models import Offer
     
+    if not nearby_businesses:
+        return []
+    distances = dict(nearby_businesses)
+    
     active_offers = Offer.objects.filter(
         is_active=True,
         expires_at__gt=timezone.now(),
         business__business_verified=True,
-        business__business_vetted=False
+        business__business_vetted=False,
+        business_id__in=list(distances)
     ).select_related('business', 'category')
+    if category:
+        active_offers = active_offers.filter(category=category)
     
     nearby_offers = []
     for offer in active_offers:
-        if offer.business.latitude and offer.business.longitude:
-            distance = calculate_distance(
-                user_lat, user_lon,
-                offer.business.latitude, offer.business.longitude
-            )
-            if distance <= max_distance_km:
-                offer.distance = round(distance, 2)
-                nearby_offers.append(offer)
+        offer._distance = distances[offer.business_id]
+        offer.distance = round(offer._distance, 2)
+        nearby_offers.append(offer)
     
     # Ordenar por distancia
-    nearby_offers.sort(key=lambda x: x.distance)
+    nearby_offers.sort(key=lambda x: (x._distance, x.id))
     return nearby_offers
 
 
+# Pesos de la puntuación de popularidad
+POPULARITY_VIEW_WEIGHT = 1
+POPULARITY_LIKE_WEIGHT = 5
+POPULARITY_REVIEW_WEIGHT = 10
+POPULARITY_RATING_WEIGHT = 20
+
+
+def refresh_popularity_scores(offer_ids=None):
+    """
+    Recalcular popularity_score en una sola consulta UPDATE.
+    Los conteos salen de Offer.objects.with_counts(): likes_count guardado y
+    una subconsulta para las reseñas. Sin offer_ids se recalculan todas.
+    """
+    from .models import Offer
+    
+    offers = Offer.objects.all()
+    if offer_ids is not None:
+        offers = offers.filter(pk__in=list(offer_ids))
+    return offers.with_counts().update(popularity_score=(
+        F('views') * POPULARITY_VIEW_WEIGHT +
+        F('likes_total') * POPULARITY_LIKE_WEIGHT +
+        F('reviews_total') * POPULARITY_REVIEW_WEIGHT +
+        F('avg_rating') * POPULARITY_RATING_WEIGHT
+    ))
+
+
+def record_offer_views(offer_ids, count=1):
+    """Sumar count visitas a cada oferta, a su popularidad y a su acumulado del día"""
+    from .models import Offer
+    
+    offer_ids = list(offer_ids)
+    updated = Offer.objects.filter(pk__in=offer_ids).update(
+        views=F('views') + count,
+        popularity_score=F('popularity_score') + count * POPULARITY_VIEW_WEIGHT
+    )
+    record_daily_stats(offer_ids, views=count)
+    return updated
+
+
+def record_daily_stats(offer_ids, day=None, create=True, **deltas):
+    """
+    Sumar deltas (views, likes, reviews, rating_sum) a la fila OfferDailyStats
+    del día de cada oferta. Con create=True es un solo INSERT ... ON CONFLICT
+    DO UPDATE (SQLite y PostgreSQL) que crea la fila si falta; con create=False
+    solo se modifican filas existentes.
+    """
+    from django.db import connection
+    from .models import Offer, OfferDailyStats
+    
+    offer_ids = list(offer_ids)
+    if not offer_ids or not deltas:
+        return
+    day = day or timezone.localdate()
+    
+    if not create:
+        OfferDailyStats.objects.filter(offer_id__in=offer_ids, date=day).update(
+            **{field: F(field) + delta for field, delta in deltas.items()}
+        )
+        return
+    
+    quote = connection.ops.quote_name
+    table = quote(OfferDailyStats._meta.db_table)
+    # Los default de Django no existen en la base: el INSERT lleva todos los contadores
+    fields = ('views', 'likes', 'reviews', 'rating_sum')
+    columns = [quote(OfferDailyStats._meta.get_field(field).column) for field in fields]
+    updates = ', '.join(
+        f'{column} = {table}.{column} + excluded.{column}'
+        for field, column in zip(fields, columns) if field in deltas
+    )
+    # El SELECT sobre core_offer deja fuera las ofertas que ya no existen
+    # (pudieron borrarse antes del volcado) sin otra consulta
+    sql = (
+        f'INSERT INTO {table} ({quote("offer_id")}, {quote("date")}, {", ".join(columns)}) '
+        f'SELECT {quote("id")}, %s, {", ".join(["%s"] * len(columns))} '
+        f'FROM {quote(Offer._meta.db_table)} WHERE {quote("id")} IN ({", ".join(["%s"] * len(offer_ids))}) '
+        f'ON CONFLICT ({quote("offer_id")}, {quote("date")}) DO UPDATE SET {updates}'
+    )
+    params = [connection.ops.adapt_datefield_value(day), *(deltas.get(field, 0) for field in fields), *offer_ids]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+def adjust_reaction_counts(model, counter, target_ids, sign=1, popularity_weight=0):
+    """
+    Sumar (o restar con sign=-1) a likes_count o dislikes_count de Offer, Review
+    o ReviewReply una unidad por cada aparición del id en target_ids. Si el
+    modelo tiene net_likes se ajusta en el mismo UPDATE, y con popularity_weight
+    también popularity_score (peso por unidad, p. ej. POPULARITY_LIKE_WEIGHT).
+    """
+    has_net_likes = any(field.name == 'net_likes' for field in model._meta.concrete_fields)
+    net_sign = -1 if counter == 'dislikes_count' else 1
+    targets_by_delta = {}
+    for target_id, total in Counter(target_ids).items():
+        targets_by_delta.setdefault(total, []).append(target_id)
+    for total, ids in targets_by_delta.items():
+        delta = sign * total
+        updates = {counter: F(counter) + delta}
+        if has_net_likes:
+            updates['net_likes'] = F('net_likes') + net_sign * delta
+        if popularity_weight:
+            updates['popularity_score'] = F('popularity_score') + delta * popularity_weight
+        model.objects.filter(pk__in=ids).update(**updates)
+
+
+def repair_reaction_counters():
+    """
+    Recontar los contadores guardados (likes de ofertas; likes, dislikes,
+    net_likes y respuestas de reseñas y respuestas) desde sus tablas y
+    corregir solo las filas desviadas, junto con la popularidad de las ofertas
+    cuyo likes_count cambia. Retorna {modelo: filas corregidas}.
+    """
+    from .models import Offer, Review, ReviewReply, count_subquery
+    
+    # Modelo -> {contador: (tabla de origen, columna del modelo en la tabla)}
+    sources = {
+        Offer: {'likes_count': (Offer.likes.through, 'offer_id')},
+        Review: {
+            'likes_count': (Review.likes.through, 'review_id'),
+            'dislikes_count': (Review.dislikes.through, 'review_id'),
+            'replies_count': (ReviewReply, 'review_id'),
+        },
+        ReviewReply: {
+            'likes_count': (ReviewReply.likes.through, 'reviewreply_id'),
+            'dislikes_count': (ReviewReply.dislikes.through, 'reviewreply_id'),
+        },
+    }
+    
+    repaired = {}
+    for model, counters in sources.items():
+        expected = {
+            counter: count_subquery(source.objects.filter(**{field: OuterRef('pk')}), field)
+            for counter, (source, field) in counters.items()
+        }
+        if 'dislikes_count' in expected:
+            expected['net_likes'] = expected['likes_count'] - expected['dislikes_count']
+        if model is Offer:
+            # popularity_score sumó el peso de cada like contado: corregir la diferencia
+            # (el SET lee el likes_count anterior de la fila)
+            popularity_fix = {'popularity_score': F('popularity_score') + (
+                expected['likes_count'] - F('likes_count')
+            ) * POPULARITY_LIKE_WEIGHT}
+        else:
+            popularity_fix = {}
+        
+        drifted = Q()
+        for counter in expected:
+            drifted |= ~Q(**{counter: F(f'expected_{counter}')})
+        drifted_ids = model.objects.annotate(
+            **{f'expected_{counter}': value for counter, value in expected.items()}
+        ).filter(drifted).values('pk')
+        repaired[model.__name__] = model.objects.filter(pk__in=drifted_ids).update(**expected, **popularity_fix)
+    return repaired
+
+
+def get_daily_trends(days=30, business=None):
+    """
+    Serie diaria de vistas, likes, reseñas y calificación promedio de los
+    últimos days días (de un negocio o de todo el sitio), leída del acumulado
+    OfferDailyStats. Los días sin actividad aparecen en cero.
+    """
+    from datetime import timedelta
+    from django.db.models import Sum
+    from .models import OfferDailyStats
+    
+    today = timezone.localdate()
+    start = today - timedelta(days=days - 1)
+    
+    rows = OfferDailyStats.objects.filter(date__gte=start)
+    if business is not None:
+        rows = rows.filter(offer__business=business)
+    rows = rows.values('date').annotate(
+        total_views=Sum('views'),
+        total_likes=Sum('likes'),
+        total_reviews=Sum('reviews'),
+        total_rating=Sum('rating_sum'),
+    ).order_by()
+    by_date = {row['date']: row for row in rows}
+    
+    trends = []
+    for offset in range(days):
+        day = start + timedelta(days=offset)
+        row = by_date.get(day, {})
+        reviews = row.get('total_reviews') or 0
+        trends.append({
+            'date': day.isoformat(),
+            'views': row.get('total_views') or 0,
+            'likes': row.get('total_likes') or 0,
+            'reviews': reviews,
+            'avg_rating': round((row.get('total_rating') or 0) / reviews, 2) if reviews > 0 else None,
+        })
+    return trends
+
+
 def get_popular_offers(limit=10):
     """
     Obtener ofertas más populares basadas en vistas, likes y reseñas
     """
     from .models import Offer
     
+    return Offer.objects.live().select_related(
+        'business', 'category'
+    ).order_by('-popularity_score', '-id')[:limit]
+
+
+def compute_trending_offers(now=None):
+    """
+    Recalcular el ranking de tendencias (general y por categoría).
+    La puntuación decae exponencialmente con el tiempo: las vistas y likes
+    pesan según la antigüedad de la oferta y cada reseña según su propia
+    fecha, con una vida media de TRENDING_HALF_LIFE_HOURS.
+    Retorna la cantidad de entradas guardadas.
+    """
+    from math import exp, log
+    from datetime import timedelta
+    from django.conf import settings
+    from django.db import transaction
+    from .models import Offer, Review, TrendingOffer
+    from .search import invalidate_search_results
+    
+    now = now or timezone.now()
+    half_life = getattr(settings, 'TRENDING_HALF_LIFE_HOURS', 48) * 3600
+    decay_rate = log(2) / half_life
+    
+    def decay(moment):
+        return exp(-decay_rate * max((now - moment).total_seconds(), 0))
+    
+    offers = Offer.objects.live().with_counts().values_list(
+        'id', 'category_id', 'created_at', 'views', 'likes_total'
+    )
+    
+    scores = {}
+    categories = {}
+    for offer_id, category_id, created_at, views, likes_total in offers:
+        scores[offer_id] = (
+            views * POPULARITY_VIEW_WEIGHT + likes_total * POPULARITY_LIKE_WEIGHT
+        ) * decay(created_at)
+        categories[offer_id] = category_id
+    
+    # Reseñas recientes: más allá de 10 vidas medias su aporte es despreciable
+    recent_reviews = Review.objects.filter(
+        offer_id__in=list(scores),
+        created_at__gte=now - timedelta(seconds=half_life * 10)
+    ).values_list('offer_id', 'rating', 'created_at')
+    for offer_id, rating, created_at in recent_reviews:
+        weight = POPULARITY_REVIEW_WEIGHT + rating * POPULARITY_RATING_WEIGHT / 5
+        scores[offer_id] += weight * decay(created_at)
+    
+    ranked = sorted(scores.items(), key=lambda item: (-item[1], -item[0]))
+    overall_size = getattr(settings, 'TRENDING_SIZE', 50)
+    category_size = getattr(settings, 'TRENDING_CATEGORY_SIZE', 20)
+    
+    entries = [
+        TrendingOffer(category_id=None, offer_id=offer_id, rank=rank, score=score, computed_at=now)
+        for rank, (offer_id, score) in enumerate(ranked[:overall_size], start=1)
+    ]
+    ranks = {}
+    for offer_id, score in ranked:
+        category_id = categories[offer_id]
+        rank = ranks.get(category_id, 0) + 1
+        if rank > category_size:
+            continue
+        ranks[category_id] = rank
+        entries.append(TrendingOffer(
+            category_id=category_id, offer_id=offer_id, rank=rank, score=score, computed_at=now
+        ))
+    
+    with transaction.atomic():
+        TrendingOffer.objects.all().delete()
+        TrendingOffer.objects.bulk_create(entries)
+    # Los listados con orden "En tendencia" guardados en el cache quedan viejos
+    invalidate_search_results()
+    return len(entries)
+
+
+def get_trending_offers(limit=10, category=None):
+    """
+    Obtener ofertas en tendencia desde el ranking precalculado.
+    Si el ranking todavía no se ha calculado se usan las más populares.
+    """
+    from .models import Offer
+    
     offers = Offer.objects.filter(
+        trending_entries__rank__isnull=False,
+        trending_entries__category=category,
         is_active=True,
         expires_at__gt=timezone.now(),
         business__business_verified=True,
         business__business_vetted=False
-    ).annotate(
-        likes_count=Count('likes'),
-        reviews_count=Count('reviews'),
-        avg_rating=Avg('reviews__rating')
-    ).select_related('business', 'category')
+    ).select_related('business', 'category').order_by('trending_entries__rank')[:limit]
     
-    # Calcular puntuación de popularidad
-    offers_with_score = []
-    for offer in offers:
-        score = (
-            offer.views * 1 +
-            offer.likes_count * 5 +
-            offer.reviews_count * 10 +
-            (offer.avg_rating or 0) * 20
-        )
-        # Crear una tupla con el score para ordenar (no asignar a la propiedad)
-        offers_with_score.append((score, offer))
-    
-    # Ordenar por puntuación (mayor a menor)
-    offers_with_score.sort(key=lambda x: x[0], reverse=True)
-    # Retornar solo los objetos offer, sin el score
-    return [offer for score, offer in offers_with_score[:limit]]
+    offers = list(offers)
+    if not offers and category is None:
+        return list(get_popular_offers(limit=limit))
+    return offers
 
 
 def get_expiring_soon_offers(days=3, limit=10):
@@ -104,11 +503,74 @@ def get_expiring_soon_offers(days=3, limit=10):
     ).select_related('business', 'category').order_by('expires_at')[:limit]
 
 
+def calculate_offer_prices(discount_type, original_price, discount_value,
+                           quantity_x, quantity_y, bundle_price):
+    """
+    Precio final por unidad, cantidad ahorrada y proporción de ahorro (0 a 1)
+    de una oferta. Offer los guarda al guardarse para filtrar y ordenar en SQL.
+    """
+    original_price = Decimal(original_price) if original_price else None
+    discount_value = Decimal(discount_value) if discount_value else None
+    bundle_price = Decimal(bundle_price) if bundle_price else None
+    base_price = original_price or Decimal('0')
+    final_price = base_price
+    discount_amount = Decimal('0')
+    
+    if discount_type == 'percentage':
+        if discount_value and original_price:
+            final_price = original_price - original_price * (discount_value / 100)
+            discount_amount = original_price - final_price
+    elif discount_type == 'fixed':
+        if discount_value and original_price:
+            final_price = max(original_price - discount_value, Decimal('0'))
+            discount_amount = original_price - final_price
+    elif discount_type == 'buy_x_get_y':
+        # Para 2x1: precio por unidad = (precio_original * X) / (X + Y)
+        # Ejemplo: 2x1 con precio $12 = (12 * 2) / (2 + 1) = 24 / 3 = $8 por unidad
+        if quantity_x and quantity_y and original_price:
+            final_price = original_price * quantity_x / (quantity_x + quantity_y)
+            # Ahorro = (precio_original * X) - (precio_final * (X + Y))
+            discount_amount = original_price * quantity_x - final_price * (quantity_x + quantity_y)
+    elif discount_type == 'buy_x_for_price':
+        # Para 2x20$: precio por unidad = bundle_price / X
+        # Ejemplo: 2x20$ = 20 / 2 = $10 por unidad
+        if quantity_x and bundle_price:
+            final_price = bundle_price / quantity_x
+            # Ahorro = (precio_original * X) - bundle_price
+            # Solo si hay precio original (es opcional para este tipo)
+            if original_price:
+                discount_amount = original_price * quantity_x - bundle_price
+    
+    cent = Decimal('0.01')
+    final_price = final_price.quantize(cent, rounding=ROUND_HALF_UP)
+    discount_amount = discount_amount.quantize(cent, rounding=ROUND_HALF_UP)
+    # Ahorro por unidad respecto al precio original
+    savings_ratio = 0.0
+    if original_price:
+        savings_ratio = min(max(float(1 - final_price / original_price), 0.0), 1.0)
+    return final_price, discount_amount, round(savings_ratio, 4)
+
+
+def fold_text(text):
+    """
+    Texto en minúsculas, sin acentos y con espacios simples: 'Café  Olé' -> 'cafe ole'.
+    Es la normalización común de las columnas search_text y de las búsquedas.
+    """
+    text = unicodedata.normalize('NFKD', str(text or '').lower())
+    return ' '.join(''.join(char for char in text if not unicodedata.combining(char)).split())
+
+
+def build_search_text(*parts):
+    """Columna search_text a partir de varios campos de texto"""
+    return fold_text(' '.join(part for part in parts if part))
+
+
 def search_offers(query, category=None, min_price=None, max_price=None):
     """
-    Buscar ofertas con filtros
+    Buscar ofertas con filtros. Con texto, se ordenan por relevancia
     """
     from .models import Offer
+    from .search import order_by_relevance, search_offers_queryset
     
     offers = Offer.objects.filter(
         is_active=True,
@@ -118,24 +580,19 @@ def search_offers(query, category=None, min_price=None, max_price=None):
     )
     
     if query:
-        offers = offers.filter(
-            Q(title__icontains=query) |
-            Q(description__icontains=query) |
-            Q(business__business_name__icontains=query)
-        )
+        offers = order_by_relevance(search_offers_queryset(offers, query), '-popularity_score', '-id')
     
     if category:
         offers = offers.filter(category=category)
     
+    # Precio final por unidad guardado en la oferta (ver calculate_offer_prices)
     if min_price is not None:
-        # Filtrar por precio final calculado es más complejo
-        # Por ahora filtramos por precio original
-        offers = offers.filter(original_price__gte=min_price)
+        offers = offers.filter(final_price__gte=min_price)
     
     if max_price is not None:
-        offers = offers.filter(original_price__lte=max_price)
+        offers = offers.filter(final_price__lte=max_price)
     
-    return offers.select_related('business', 'category').distinct()
+    return offers.select_related('business', 'category')
 
 
 def get_dashboard_stats(business):
@@ -152,7 +609,7 @@ def get_dashboard_stats(business):
     ).count()
     
     total_views = business.offers.aggregate(Sum('views'))['views__sum'] or 0
-    total_likes = sum(offer.likes.count() for offer in business.offers.all())
+    total_likes = Offer.likes.through.objects.filter(offer__business=business).count()
     
     reviews = Review.objects.filter(offer__business=business)
     total_reviews = reviews.count()
@@ -0,0 +1,138 @@
+"""
+Contador de visitas con escritura diferida (write-behind).
+
+offer_detail no escribe en la base de datos en cada visita: las visitas se
+acumulan en memoria por proceso y se vuelcan por lotes con
+UPDATE ... SET views = views + n, agrupando las ofertas que sumaron lo mismo.
+El volcado ocurre cada VIEW_FLUSH_INTERVAL segundos, al acumular
+VIEW_FLUSH_THRESHOLD visitas o al terminar el proceso (atexit y el hook
+worker_exit de gunicorn.conf.py).
+
+Opcionalmente (VIEW_DEDUP_SECONDS > 0) una misma sesión solo cuenta una
+visita por oferta dentro de esa ventana de tiempo.
+"""
+import atexit
+import logging
+import threading
+import time
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+from .utils import record_offer_views
+
+
+logger = logging.getLogger(__name__)
+
+SESSION_KEY = 'viewed_offers'
+
+_lock = threading.Lock()
+_pending = Counter()
+_last_flush = time.monotonic()
+_flusher = None
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _is_duplicate(request, offer_id):
+    """Registrar la visita en la sesión; True si ya se contó dentro de la ventana"""
+    window = _setting('VIEW_DEDUP_SECONDS', 0)
+    if not window or not hasattr(request, 'session'):
+        return False
+
+    now = time.time()
+    viewed = request.session.get(SESSION_KEY, {})
+    last_view = viewed.get(str(offer_id))
+    if last_view is not None and now - last_view < window:
+        return True
+
+    # Guardar solo las visitas que siguen dentro de la ventana
+    viewed = {key: moment for key, moment in viewed.items() if now - moment < window}
+    viewed[str(offer_id)] = now
+    request.session[SESSION_KEY] = viewed
+    return False
+
+
+def record_view(request, offer_id):
+    """
+    Contar una visita a una oferta. Retorna False si la sesión ya la había
+    visto dentro de la ventana de deduplicación.
+    """
+    if _is_duplicate(request, offer_id):
+        return False
+
+    with _lock:
+        _pending[offer_id] += 1
+        pending_total = sum(_pending.values())
+        due = time.monotonic() - _last_flush >= _setting('VIEW_FLUSH_INTERVAL', 10)
+
+    _start_flusher()
+    if due or pending_total >= _setting('VIEW_FLUSH_THRESHOLD', 100):
+        flush_views()
+    return True
+
+
+def pending_views(offer_id):
+    """Visitas de una oferta que todavía no se han escrito"""
+    with _lock:
+        return _pending.get(offer_id, 0)
+
+
+def flush_views():
+    """Escribir las visitas acumuladas. Retorna cuántas se escribieron"""
+    global _pending, _last_flush
+
+    with _lock:
+        batch, _pending = _pending, Counter()
+        _last_flush = time.monotonic()
+    if not batch:
+        return 0
+
+    # Un UPDATE por cada cantidad distinta de visitas
+    groups = defaultdict(list)
+    for offer_id, count in batch.items():
+        groups[count].append(offer_id)
+
+    written = 0
+    try:
+        for count, offer_ids in groups.items():
+            # Las visitas y el acumulado diario se escriben juntos o no se escriben:
+            # si falla a medias el grupo vuelve al buffer sin quedar contado
+            with transaction.atomic():
+                record_offer_views(offer_ids, count)
+            written += count * len(offer_ids)
+            for offer_id in offer_ids:
+                del batch[offer_id]
+    except Exception:
+        # Devolver al buffer lo que no se pudo escribir para el próximo intento
+        logger.exception('No se pudieron guardar las visitas de ofertas')
+        with _lock:
+            _pending.update(batch)
+    return written
+
+
+def _flush_periodically():
+    while True:
+        time.sleep(_setting('VIEW_FLUSH_INTERVAL', 10))
+        try:
+            flush_views()
+        finally:
+            close_old_connections()
+
+
+def _start_flusher():
+    """Hilo que vuelca el buffer aunque el worker no reciba más visitas"""
+    global _flusher
+
+    if _flusher is not None and _flusher.is_alive():
+        return
+    with _lock:
+        if _flusher is None or not _flusher.is_alive():
+            _flusher = threading.Thread(target=_flush_periodically, name='view-counter', daemon=True)
+            _flusher.start()
+
+
+atexit.register(flush_views)
@@ -1,12 +1,18 @@
 from django.shortcuts import render, redirect, get_object_or_404
+from django.template.loader import render_to_string
 from django.contrib.auth import login, logout, authenticate
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import JsonResponse, HttpResponseForbidden
-from django.db.models import Q, Avg, Count
+from django.http import JsonResponse, HttpResponseForbidden, Http404
+from django.core.exceptions import ObjectDoesNotExist
+from django.db.models import Q, F, Count, FilteredRelation
 from django.utils import timezone
+from django.utils.text import Truncator
+from django.templatetags.static import static
 from django.core.paginator import Paginator
+import json
 from datetime import timedelta
+from decimal import Decimal, InvalidOperation
 
 from .models import (User, Offer, Category, Review, ReviewReply, BusinessRequest, 
                      Notification, VetoAppeal, Payment)
@@ -14,16 +20,55 @@ from .forms import (CustomUserCreationForm, CustomAuthenticationForm,
                     BusinessRequestForm, OfferForm, ReviewForm, ReviewReplyForm,
                     VetoAppealForm, UserProfileForm, BusinessProfileForm, 
                     BusinessInitialProfileForm, CategoryForm)
-from .utils import (get_nearby_offers, get_popular_offers, get_expiring_soon_offers,
-                    search_offers, get_dashboard_stats, get_admin_stats)
+from .utils import (get_nearby_offers_page, get_trending_offers, get_expiring_soon_offers,
+                    search_offers, get_dashboard_stats, get_admin_stats, get_daily_trends)
+from .maps import get_offer_clusters
+from .autocomplete import autocomplete
+from .reactions import BATCH_MAX_OPERATIONS, REACTIONS, apply_reactions, toggle_reaction
+from .reviews import load_offer_detail, load_viewer_reactions, get_reviews_page, get_replies_page
+from .search import (search_offers_queryset, search_businesses_queryset,
+                     normalize_query, get_cached_results, fetch_in_order, get_search_cache_metrics,
+                     compute_offer_facets)
+from .pagination import encode_cursor, decode_cursor, KeysetPaginator, KeysetPage
+from .view_counter import record_view, pending_views
+
+
+NEARBY_DEFAULT_RADIUS_KM = 10
+NEARBY_MAX_RADIUS_KM = 100
+NEARBY_PAGE_SIZE = 12
+MAX_OBJECT_ID = 2 ** 63 - 1  # Límite de las llaves primarias (bigint)
+OFFERS_PAGE_SIZE = 12
+# Mayor ahorro primero; coincide con el índice offer_savings_idx
+BEST_DEAL_ORDERING = ('-savings_ratio', '-id')
+OFFER_ORDERINGS = {
+    'relevance': ('-search_rank', '-popularity_score', '-id'),
+    'trending': ('trending_rank', 'id'),
+    'popular': ('-likes_count', '-views', '-id'),  # índice offer_likes_idx
+    'best_deal': BEST_DEAL_ORDERING,
+    'expiring': ('expires_at', 'id'),
+    'price_low': ('final_price', 'id'),
+    'price_high': ('-final_price', '-id'),
+    'recent': ('-created_at', '-id'),
+}
+DISCOUNT_TYPE_LABELS = dict(Offer._meta.get_field('discount_type').choices)
+TREND_PERIODS = (30, 90)
+
+
+def _get_trend_days(request):
+    """Periodo de las gráficas de tendencia (?days=30|90)"""
+    try:
+        days = int(request.GET.get('days', TREND_PERIODS[0]))
+    except ValueError:
+        return TREND_PERIODS[0]
+    return days if days in TREND_PERIODS else TREND_PERIODS[0]
 
 
 # ==================== VISTAS PÚBLICAS ====================
 
 def home(request):
     """Página principal"""
-    # Ofertas populares
-    popular_offers = get_popular_offers(limit=8)
+    # Ofertas en tendencia (ranking precalculado por compute_trending)
+    trending_offers = get_trending_offers(limit=8)
     
     # Ofertas por vencer
     expiring_offers = get_expiring_soon_offers(days=3, limit=6)
@@ -31,17 +76,18 @@ def home(request):
     # Ofertas cercanas (si el usuario tiene ubicación)
     nearby_offers = []
     if request.user.is_authenticated and request.user.latitude and request.user.longitude:
-        nearby_offers = get_nearby_offers(
+        nearby_offers, _ = get_nearby_offers_page(
             request.user.latitude, 
             request.user.longitude,
-            max_distance_km=10
-        )[:6]
+            max_distance_km=NEARBY_DEFAULT_RADIUS_KM,
+            limit=6
+        )
     
     # Categorías
     categories = Category.objects.all()
     
     context = {
-        'popular_offers': popular_offers,
+        'trending_offers': trending_offers,
         'expiring_offers': expiring_offers,
         'nearby_offers': nearby_offers,
         'categories': categories,
@@ -49,50 +95,157 @@ def home(request):
     return render(request, 'home.html', context)
 
 
-def offers_list(request):
-    """Lista de ofertas con filtros"""
-    offers = Offer.objects.filter(
+def _get_price_filter(request, name):
+    """Precio mínimo o máximo de la URL, o None si no es válido"""
+    try:
+        value = Decimal(request.GET.get(name, ''))
+    except InvalidOperation:
+        return None
+    return value if value.is_finite() and value >= 0 else None
+
+
+def _get_offers_page(request, with_facets=True):
+    """
+    Filtros, orden y página de cursor de la lista de ofertas, compartidos por
+    offers_list y offers_feed_api. Las facetas solo se calculan si se piden.
+    """
+    live_offers = Offer.objects.filter(
         is_active=True,
         expires_at__gt=timezone.now(),
         business__business_verified=True,
         business__business_vetted=False
     ).select_related('business', 'category')
+    offers = live_offers
     
     # Filtros
     query = request.GET.get('q', '')
     category_id = request.GET.get('category', '')
-    sort_by = request.GET.get('sort', 'recent')
+    if not category_id.isdigit():
+        category_id = ''
+    sort_by = request.GET.get('sort', 'relevance' if query else 'recent')
+    min_price = _get_price_filter(request, 'min_price')
+    max_price = _get_price_filter(request, 'max_price')
+    discount_type = request.GET.get('discount_type', '')
+    if discount_type not in DISCOUNT_TYPE_LABELS:
+        discount_type = ''
     
     if query:
-        offers = offers.filter(
-            Q(title__icontains=query) |
-            Q(description__icontains=query) |
-            Q(business__business_name__icontains=query)
+        offers = search_offers_queryset(offers, query)
+    elif sort_by == 'relevance':
+        sort_by = 'recent'
+    if sort_by == 'trending':
+        # Solo las ofertas del ranking precalculado (general o de la categoría)
+        ranking = Q(trending_entries__category__isnull=True) if not category_id else Q(
+            trending_entries__category_id=category_id
         )
-    
+        offers = offers.annotate(
+            ranking=FilteredRelation('trending_entries', condition=ranking)
+        ).filter(ranking__isnull=False)
+    
+    # Las facetas cuentan sobre el filtro de texto y, en tendencias, sobre el
+    # mismo ranking que se lista (categoría, tipo y precio los aplica cada faceta)
+    faceted_offers = offers
+    if min_price is not None:
+        offers = offers.filter(final_price__gte=min_price)
+    if max_price is not None:
+        offers = offers.filter(final_price__lte=max_price)
     if category_id:
         offers = offers.filter(category_id=category_id)
+    if discount_type:
+        offers = offers.filter(discount_type=discount_type)
+    
+    # Ordenamiento: cada orden termina en id para que el cursor sea único
+    if sort_by == 'trending':
+        offers = offers.annotate(trending_rank=F('ranking__rank'))
+    elif sort_by not in OFFER_ORDERINGS:
+        sort_by = 'recent'
+    
+    # Paginación por cursor: cada página cuesta lo mismo sin importar la profundidad.
+    # Los ids de cada página se guardan en el cache de resultados y el total sale
+    # de las facetas, así que no hay COUNT aparte.
+    cache_params = {
+        'q': normalize_query(query),
+        'category': category_id,
+        'discount_type': discount_type,
+        'min_price': min_price,
+        'max_price': max_price,
+    }
+    facets = None
+    if with_facets:
+        facets, _ = get_cached_results(
+            {**cache_params, 'facets': 'trending' if sort_by == 'trending' else True},
+            lambda: (compute_offer_facets(
+                faceted_offers, category_id, discount_type, min_price, max_price
+            ), None)
+        )
+    paginator = KeysetPaginator(
+        offers, OFFER_ORDERINGS[sort_by], OFFERS_PAGE_SIZE, count=facets['total'] if facets else None
+    )
+    cursor = request.GET.get('cursor')
+    
+    def compute_page():
+        page = paginator.get_page(cursor)
+        data = {'ids': [offer.pk for offer in page], 'next_cursor': page.next_cursor,
+                'previous_cursor': page.previous_cursor}
+        return data, page
+    
+    data, page_obj = get_cached_results({**cache_params, 'sort': sort_by, 'cursor': cursor}, compute_page)
+    if page_obj is None:
+        page_obj = KeysetPage(
+            fetch_in_order(live_offers, data['ids']), data['next_cursor'], data['previous_cursor'], paginator
+        )
     
-    # Ordenamiento
-    if sort_by == 'popular':
-        offers = offers.annotate(
-            likes_count=Count('likes')
-        ).order_by('-likes_count', '-views')
-    elif sort_by == 'expiring':
-        offers = offers.order_by('expires_at')
-    elif sort_by == 'price_low':
-        offers = offers.order_by('original_price')
-    elif sort_by == 'price_high':
-        offers = offers.order_by('-original_price')
-    else:  # recent
-        offers = offers.order_by('-created_at')
-    
-    # Paginación
-    paginator = Paginator(offers, 12)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    
-    categories = Category.objects.all()
+    return {
+        'page_obj': page_obj,
+        'query': query,
+        'category_id': category_id,
+        'sort_by': sort_by,
+        'discount_type': discount_type,
+        'min_price': min_price,
+        'max_price': max_price,
+        'facets': facets,
+    }
+
+
+def offers_list(request):
+    """Lista de ofertas con filtros"""
+    results = _get_offers_page(request)
+    page_obj = results['page_obj']
+    facets = results['facets']
+    query, category_id, sort_by = results['query'], results['category_id'], results['sort_by']
+    discount_type, min_price, max_price = results['discount_type'], results['min_price'], results['max_price']
+    
+    categories = list(Category.objects.all())
+    for category in categories:
+        category.offers_count = facets['categories'].get(category.id, 0)
+    
+    # Enlaces de las facetas conservando el resto de los filtros
+    filters = request.GET.copy()
+    filters.pop('page', None)
+    filters.pop('cursor', None)
+    
+    def facet_url(**changes):
+        params = filters.copy()
+        for key, value in changes.items():
+            params.pop(key, None)
+            if value is not None and value != '':
+                params[key] = value
+        return '?' + params.urlencode()
+    
+    discount_type_facets = [
+        {'value': value, 'label': label, 'count': facets['discount_types'].get(value, 0),
+         'url': facet_url(discount_type=None if value == discount_type else value),
+         'selected': value == discount_type}
+        for value, label in DISCOUNT_TYPE_LABELS.items()
+    ]
+    price_facets = []
+    for bucket in facets['price_buckets']:
+        bucket_range = tuple(Decimal(limit) if limit is not None else None for limit in (bucket['min'], bucket['max']))
+        price_facets.append({
+            **bucket,
+            'url': facet_url(min_price=bucket['min'], max_price=bucket['max']),
+            'selected': bucket_range == (min_price, max_price),
+        })
     
     context = {
         'page_obj': page_obj,
@@ -100,29 +253,163 @@ def offers_list(request):
         'query': query,
         'selected_category': category_id,
         'sort_by': sort_by,
+        'total_results': facets['total'],
+        'discount_type_facets': discount_type_facets,
+        'price_facets': price_facets,
+        'has_price_filter': min_price is not None or max_price is not None,
+        'clear_price_url': facet_url(min_price=None, max_price=None),
+        'filter_query': filters.urlencode(),
     }
     return render(request, 'offers/list.html', context)
 
 
+def _offer_card(offer):
+    """Campos ya calculados de la tarjeta de una oferta (mismos que offers/list.html)"""
+    if offer.discount_type == 'buy_x_get_y':
+        price_label = f'${offer.final_price:.2f}/unidad'
+    elif offer.discount_type == 'buy_x_for_price':
+        price_label = f'{offer.quantity_x}x${offer.bundle_price}'
+    else:
+        price_label = f'${offer.final_price:.2f}'
+    return {
+        'id': offer.id,
+        'title': offer.title,
+        'business': offer.business.business_name,
+        'category': offer.category.name,
+        'description': Truncator(offer.description).words(15),
+        'offer_display': offer.offer_display,
+        'original_price': str(offer.original_price) if offer.original_price else None,
+        'final_price': str(offer.final_price),
+        'price_label': price_label,
+        'image_url': offer.image.url if offer.image else static('images/default_offer.png'),
+        'views': offer.views,
+        'likes_count': offer.likes_count,
+        'url': f'/offers/{offer.id}/',
+    }
+
+
+def offers_feed_api(request):
+    """
+    Siguiente tanda de tarjetas de la lista de ofertas (mismos filtros y cursor
+    que offers_list), para cargar más resultados sin volver a renderizar la página
+    """
+    page_obj = _get_offers_page(request, with_facets=False)['page_obj']
+    return JsonResponse({
+        'results': [_offer_card(offer) for offer in page_obj],
+        'next_cursor': page_obj.next_cursor,
+    })
+
+
+def _get_nearby_filters(request):
+    """
+    Ubicación, radio, categoría y cursor para las vistas de ofertas cercanas.
+    La ubicación sale de lat/lng en la URL o del perfil del usuario.
+    """
+    lat = request.GET.get('lat')
+    lng = request.GET.get('lng')
+    try:
+        if lat and lng:
+            lat, lng = float(lat), float(lng)
+        elif request.user.is_authenticated and request.user.latitude and request.user.longitude:
+            lat, lng = request.user.latitude, request.user.longitude
+        else:
+            lat, lng = None, None
+        radius = float(request.GET.get('radius') or NEARBY_DEFAULT_RADIUS_KM)
+        category_id = int(request.GET.get('category') or 0) or None
+    except ValueError:
+        return None
+    
+    if lat is not None and not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        return None
+    
+    return {
+        'lat': lat,
+        'lng': lng,
+        'radius': min(max(radius, 1), NEARBY_MAX_RADIUS_KM),
+        'category_id': category_id,
+        'after': decode_cursor(request.GET.get('cursor')),
+    }
+
+
+def _get_nearby_page(filters):
+    """Página de ofertas cercanas y el cursor de la siguiente"""
+    after = filters['after']
+    if after is not None and (len(after) != 2 or not all(isinstance(v, (int, float)) for v in after)):
+        after = None
+    
+    offers, has_more = get_nearby_offers_page(
+        filters['lat'], filters['lng'],
+        max_distance_km=filters['radius'],
+        category=filters['category_id'],
+        after=after,
+        limit=NEARBY_PAGE_SIZE
+    )
+    next_cursor = None
+    if has_more:
+        next_cursor = encode_cursor([offers[-1]._distance, offers[-1].id])
+    return offers, next_cursor
+
+
+def nearby_offers(request):
+    """Ofertas cerca del usuario, ordenadas por distancia"""
+    filters = _get_nearby_filters(request)
+    if filters is None:
+        messages.error(request, 'Los filtros de ubicación no son válidos.')
+        return redirect('nearby_offers')
+    
+    offers, next_cursor = [], None
+    if filters['lat'] is not None:
+        offers, next_cursor = _get_nearby_page(filters)
+    
+    context = {
+        'offers': offers,
+        'next_cursor': next_cursor,
+        'is_first_page': filters['after'] is None,
+        'has_location': filters['lat'] is not None,
+        'lat': request.GET.get('lat', ''),
+        'lng': request.GET.get('lng', ''),
+        'radius': filters['radius'],
+        'selected_category': request.GET.get('category', ''),
+        'categories': Category.objects.all(),
+    }
+    return render(request, 'offers/nearby.html', context)
+
+
+def nearby_offers_api(request):
+    """API de ofertas cercanas con paginación por cursor"""
+    filters = _get_nearby_filters(request)
+    if filters is None:
+        return JsonResponse({'error': 'Parámetros inválidos'}, status=400)
+    if filters['lat'] is None:
+        return JsonResponse({'error': 'Se requiere una ubicación (lat y lng)'}, status=400)
+    
+    offers, next_cursor = _get_nearby_page(filters)
+    results = []
+    for offer in offers:
+        results.append({
+            'id': offer.id,
+            'title': offer.title,
+            'business': offer.business.business_name,
+            'category': offer.category.name,
+            'offer_display': offer.offer_display,
+            'final_price': str(round(offer.final_price, 2)),
+            'distance': offer.distance,
+            'url': f'/offers/{offer.id}/'
+        })
+    
+    return JsonResponse({'results': results, 'next_cursor': next_cursor})
+
+
 def businesses_list(request):
     """Lista de negocios para que usuarios puedan seguir"""
-    businesses = User.objects.filter(
-        role='business',
-        business_verified=True,
-        business_vetted=False
-    ).select_related().annotate(
-        offers_count=Count('offers', filter=Q(offers__is_active=True, offers__expires_at__gt=timezone.now())),
-        followers_count=Count('followers')
-    ).order_by('-followers_count', '-date_joined')
+    businesses = User.objects.active_businesses().with_business_counts()
     
     # Filtros
     query = request.GET.get('q', '')
+    ordering = ('-followers_count', '-date_joined', '-id')
     if query:
-        businesses = businesses.filter(
-            Q(business_name__icontains=query) |
-            Q(business_description__icontains=query) |
-            Q(location_name__icontains=query)
-        )
+        businesses = search_businesses_queryset(businesses, query)
+        ordering = ('-search_rank',) + ordering
     
     # Verificar qué negocios sigue el usuario
     following_ids = []
@@ -130,9 +417,7 @@ def businesses_list(request):
         following_ids = list(request.user.following_businesses.values_list('id', flat=True))
     
     # Paginación
-    paginator = Paginator(businesses, 12)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    page_obj = KeysetPaginator(businesses, ordering, 12).get_page(request.GET.get('cursor'))
     
     context = {
         'page_obj': page_obj,
@@ -144,44 +429,14 @@ def businesses_list(request):
 
 def offer_detail(request, pk):
     """Detalle de una oferta"""
-    offer = get_object_or_404(Offer, pk=pk)
-    
-    # Incrementar vistas
-    offer.views += 1
-    offer.save(update_fields=['views'])
-    
-    # Verificar si el usuario ya dio like
-    user_liked = False
-    if request.user.is_authenticated:
-        user_liked = offer.likes.filter(id=request.user.id).exists()
-    
-    # Reseñas - obtener todas las reseñas con sus relaciones
-    reviews_queryset = offer.reviews.select_related('user').prefetch_related('likes', 'dislikes', 'replies')
-    
-    # Convertir a lista y ordenar por likes netos en Python para evitar conflictos con @property
-    reviews_list = list(reviews_queryset)
-    # Ordenar por likes netos (likes - dislikes), luego por fecha
-    reviews_list.sort(key=lambda r: (r.net_likes, r.created_at), reverse=True)
-    
-    # Crear un queryset ordenado usando los IDs ordenados
-    if reviews_list:
-        ordered_ids = [r.id for r in reviews_list]
-        from django.db.models import Case, When, IntegerField
-        preserved = Case(*[When(pk=pk, then=pos) for pos, pk in enumerate(ordered_ids)], output_field=IntegerField())
-        reviews = reviews_queryset.filter(id__in=ordered_ids).order_by(preserved)
-    else:
-        reviews = reviews_queryset.none()
+    offer = get_object_or_404(Offer.objects.select_related('business', 'category'), pk=pk)
     
-    avg_rating = reviews.aggregate(Avg('rating'))['rating__avg'] or 0
+    # Incrementar vistas: se acumulan en memoria y se guardan por lotes
+    record_view(request, offer.pk)
+    offer.views += pending_views(offer.pk)
     
-    # Verificar si el usuario ya dejó reseña y qué reseñas le gustaron/no le gustaron
-    user_review = None
-    user_liked_reviews = []
-    user_disliked_reviews = []
-    if request.user.is_authenticated:
-        user_review = reviews_queryset.filter(user=request.user).first()
-        user_liked_reviews = list(reviews_queryset.filter(likes=request.user).values_list('id', flat=True))
-        user_disliked_reviews = list(reviews_queryset.filter(dislikes=request.user).values_list('id', flat=True))
+    # Reseñas, respuestas y reacciones del usuario en un número fijo de consultas
+    detail = load_offer_detail(offer, request.user)
     
     # Ofertas relacionadas
     related_offers = Offer.objects.filter(
@@ -190,38 +445,10 @@ def offer_detail(request, pk):
         expires_at__gt=timezone.now()
     ).exclude(pk=pk).select_related('business')[:4]
     
-    # Verificar si el usuario sigue al negocio
-    is_following = False
-    if request.user.is_authenticated:
-        is_following = request.user.following_businesses.filter(id=offer.business.id).exists()
-    
-    # Obtener respuestas con sus likes/dislikes
-    # Usar el queryset original (sin annotate) para evitar problemas
-    from .models import ReviewReply
-    review_ids = list(reviews.values_list('id', flat=True))
-    review_replies = ReviewReply.objects.filter(
-        review_id__in=review_ids
-    ).select_related('user', 'review').prefetch_related('likes', 'dislikes')
-    
-    # Verificar qué respuestas le gustaron/no le gustaron al usuario
-    user_liked_replies = []
-    user_disliked_replies = []
-    if request.user.is_authenticated:
-        user_liked_replies = list(review_replies.filter(likes=request.user).values_list('id', flat=True))
-        user_disliked_replies = list(review_replies.filter(dislikes=request.user).values_list('id', flat=True))
-    
     context = {
         'offer': offer,
-        'user_liked': user_liked,
-        'reviews': reviews,
-        'avg_rating': round(avg_rating, 1),
-        'user_review': user_review,
-        'user_liked_reviews': user_liked_reviews,
-        'user_disliked_reviews': user_disliked_reviews,
-        'user_liked_replies': user_liked_replies,
-        'user_disliked_replies': user_disliked_replies,
+        **detail,
         'related_offers': related_offers,
-        'is_following': is_following,
     }
     return render(request, 'offers/detail.html', context)
 
@@ -432,12 +659,17 @@ def business_dashboard(request):
     stats = get_dashboard_stats(request.user) if is_verified else {}
     recent_offers = request.user.offers.all().order_by('-created_at')[:5] if is_verified else []
     recent_reviews = Review.objects.filter(offer__business=request.user).order_by('-created_at')[:5] if is_verified else []
+    trend_days = _get_trend_days(request)
+    daily_trends = get_daily_trends(days=trend_days, business=request.user) if is_verified else []
     
     context = {
         'stats': stats,
         'recent_offers': recent_offers,
         'recent_reviews': recent_reviews,
         'is_verified': is_verified,
+        'daily_trends': daily_trends,
+        'trend_days': trend_days,
+        'trend_periods': TREND_PERIODS,
     }
     return render(request, 'business_dashboard/dashboard.html', context)
 
@@ -448,7 +680,7 @@ def business_my_offers(request):
     if not request.user.is_business:
         return redirect('home')
     
-    offers = request.user.offers.all().order_by('-created_at')
+    offers = request.user.offers.all()
     
     # Filtros
     status_filter = request.GET.get('status', 'all')
@@ -459,9 +691,7 @@ def business_my_offers(request):
     elif status_filter == 'inactive':
         offers = offers.filter(is_active=False)
     
-    paginator = Paginator(offers, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    page_obj = KeysetPaginator(offers, ('-created_at', '-id'), 10).get_page(request.GET.get('cursor'))
     
     context = {
         'page_obj': page_obj,
@@ -698,15 +928,13 @@ def admin_manage_users(request):
     if not request.user.is_admin:
         return redirect('home')
     
-    users = User.objects.all().order_by('-date_joined')
+    users = User.objects.all()
     
     role_filter = request.GET.get('role', 'all')
     if role_filter != 'all':
         users = users.filter(role=role_filter)
     
-    paginator = Paginator(users, 20)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    page_obj = KeysetPaginator(users, ('-date_joined', '-id'), 20).get_page(request.GET.get('cursor'))
     
     context = {
         'page_obj': page_obj,
@@ -756,11 +984,8 @@ def admin_manage_offers(request):
     if not request.user.is_admin:
         return redirect('home')
     
-    offers = Offer.objects.all().select_related('business', 'category').order_by('-created_at')
-    
-    paginator = Paginator(offers, 20)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    offers = Offer.objects.all().select_related('business', 'category')
+    page_obj = KeysetPaginator(offers, ('-created_at', '-id'), 20).get_page(request.GET.get('cursor'))
     
     return render(request, 'admin_dashboard/manage_offers.html', {'page_obj': page_obj})
 
@@ -805,10 +1030,16 @@ def admin_statistics(request):
         offers_count=Count('offers')
     ).order_by('-offers_count')[:10]
     
+    # Vistas, likes y reseñas por día desde el acumulado diario
+    trend_days = _get_trend_days(request)
+    
     context = {
         'stats': stats,
         'offers_by_day': list(offers_by_day),
         'top_businesses': top_businesses,
+        'daily_trends': get_daily_trends(days=trend_days),
+        'trend_days': trend_days,
+        'trend_periods': TREND_PERIODS,
     }
     return render(request, 'admin_dashboard/statistics.html', context)
 
@@ -885,50 +1116,86 @@ def delete_review(request, pk):
     return redirect('offer_detail', pk=offer_id)
 
 
-@login_required
-def toggle_review_like(request, review_id):
-    """Dar/quitar like a una reseña"""
+def offer_reviews_api(request, offer_id):
+    """Siguiente página de reseñas de una oferta (datos, HTML de cada tarjeta y cursor)"""
+    offer = get_object_or_404(Offer, pk=offer_id)
+    page = get_reviews_page(offer, request.GET.get('cursor'))
+    reactions = load_viewer_reactions(request.user, review_ids=[review.id for review in page])
+    card_context = {
+        'user_liked_reviews': reactions['liked_reviews'],
+        'user_disliked_reviews': reactions['disliked_reviews'],
+    }
+    
+    results = []
+    for review in page:
+        results.append({
+            'id': review.id,
+            'user': review.user.username,
+            'rating': review.rating,
+            'comment': review.comment,
+            'created_at': review.created_at.isoformat(),
+            'likes_count': review.likes_count,
+            'dislikes_count': review.dislikes_count,
+            'net_likes': review.net_likes,
+            'replies_count': review.replies_count,
+            'liked': review.id in reactions['liked_reviews'],
+            'disliked': review.id in reactions['disliked_reviews'],
+            'html': render_to_string(
+                'offers/review_card.html', {'review': review, **card_context}, request=request
+            ),
+        })
+    
+    return JsonResponse({'results': results, 'next_cursor': page.next_cursor})
+
+
+def review_replies_api(request, review_id):
+    """Respuestas de una reseña por páginas, para cargarlas cuando se piden"""
     review = get_object_or_404(Review, pk=review_id)
+    page = get_replies_page(review, request.GET.get('cursor'))
+    reactions = load_viewer_reactions(request.user, reply_ids=[reply.id for reply in page])
+    card_context = {
+        'user_liked_replies': reactions['liked_replies'],
+        'user_disliked_replies': reactions['disliked_replies'],
+    }
     
-    if request.user in review.likes.all():
-        review.likes.remove(request.user)
-        liked = False
-    else:
-        review.likes.add(request.user)
-        # Si tenía dislike, quitarlo
-        if request.user in review.dislikes.all():
-            review.dislikes.remove(request.user)
-        liked = True
+    results = []
+    for reply in page:
+        results.append({
+            'id': reply.id,
+            'user': reply.user.username,
+            'comment': reply.comment,
+            'created_at': reply.created_at.isoformat(),
+            'likes_count': reply.likes_count,
+            'dislikes_count': reply.dislikes_count,
+            'liked': reply.id in reactions['liked_replies'],
+            'disliked': reply.id in reactions['disliked_replies'],
+            'html': render_to_string(
+                'offers/reply_card.html', {'reply': reply, **card_context}, request=request
+            ),
+        })
     
-    return JsonResponse({
-        'liked': liked,
-        'likes_count': review.likes.count(),
-        'dislikes_count': review.dislikes.count(),
-        'net_likes': review.net_likes
-    })
+    return JsonResponse({'results': results, 'next_cursor': page.next_cursor})
+
+
+def _reaction_response(request, kind, target_id, state_key):
+    """Alternar una reacción con el servicio común y responder con el estado y los totales"""
+    try:
+        active, counts = toggle_reaction(request.user, kind, target_id)
+    except ObjectDoesNotExist:
+        raise Http404
+    return JsonResponse({state_key: active, **counts})
+
+
+@login_required
+def toggle_review_like(request, review_id):
+    """Dar/quitar like a una reseña"""
+    return _reaction_response(request, 'review_like', review_id, 'liked')
 
 
 @login_required
 def toggle_review_dislike(request, review_id):
     """Dar/quitar dislike a una reseña"""
-    review = get_object_or_404(Review, pk=review_id)
-    
-    if request.user in review.dislikes.all():
-        review.dislikes.remove(request.user)
-        disliked = False
-    else:
-        review.dislikes.add(request.user)
-        # Si tenía like, quitarlo
-        if request.user in review.likes.all():
-            review.likes.remove(request.user)
-        disliked = True
-    
-    return JsonResponse({
-        'disliked': disliked,
-        'likes_count': review.likes.count(),
-        'dislikes_count': review.dislikes.count(),
-        'net_likes': review.net_likes
-    })
+    return _reaction_response(request, 'review_dislike', review_id, 'disliked')
 
 
 @login_required
@@ -980,43 +1247,13 @@ def create_review_reply(request, review_id):
 @login_required
 def toggle_reply_like(request, reply_id):
     """Dar/quitar like a una respuesta"""
-    reply = get_object_or_404(ReviewReply, pk=reply_id)
-    
-    if request.user in reply.likes.all():
-        reply.likes.remove(request.user)
-        liked = False
-    else:
-        reply.likes.add(request.user)
-        if request.user in reply.dislikes.all():
-            reply.dislikes.remove(request.user)
-        liked = True
-    
-    return JsonResponse({
-        'liked': liked,
-        'likes_count': reply.likes.count(),
-        'dislikes_count': reply.dislikes.count()
-    })
+    return _reaction_response(request, 'reply_like', reply_id, 'liked')
 
 
 @login_required
 def toggle_reply_dislike(request, reply_id):
     """Dar/quitar dislike a una respuesta"""
-    reply = get_object_or_404(ReviewReply, pk=reply_id)
-    
-    if request.user in reply.dislikes.all():
-        reply.dislikes.remove(request.user)
-        disliked = False
-    else:
-        reply.dislikes.add(request.user)
-        if request.user in reply.likes.all():
-            reply.likes.remove(request.user)
-        disliked = True
-    
-    return JsonResponse({
-        'disliked': disliked,
-        'likes_count': reply.likes.count(),
-        'dislikes_count': reply.dislikes.count()
-    })
+    return _reaction_response(request, 'reply_dislike', reply_id, 'disliked')
 
 
 @login_required
@@ -1065,19 +1302,7 @@ def delete_reply(request, pk):
 def toggle_like(request, offer_id):
     """Dar/quitar like a una oferta"""
     if request.method == 'POST':
-        offer = get_object_or_404(Offer, pk=offer_id)
-        
-        if request.user in offer.likes.all():
-            offer.likes.remove(request.user)
-            liked = False
-        else:
-            offer.likes.add(request.user)
-            liked = True
-        
-        return JsonResponse({
-            'liked': liked,
-            'likes_count': offer.likes.count()
-        })
+        return _reaction_response(request, 'offer_like', offer_id, 'liked')
     
     return JsonResponse({'error': 'Método no permitido'}, status=405)
 
@@ -1086,19 +1311,7 @@ def toggle_like(request, offer_id):
 def toggle_follow_business(request, business_id):
     """Seguir/dejar de seguir una empresa"""
     if request.method == 'POST':
-        business = get_object_or_404(User, pk=business_id, role='business')
-        
-        if business in request.user.following_businesses.all():
-            request.user.following_businesses.remove(business)
-            following = False
-        else:
-            request.user.following_businesses.add(business)
-            following = True
-        
-        return JsonResponse({
-            'following': following,
-            'followers_count': business.followers.count()
-        })
+        return _reaction_response(request, 'follow_business', business_id, 'following')
     
     return JsonResponse({'error': 'Método no permitido'}, status=405)
 
@@ -1107,23 +1320,47 @@ def toggle_follow_business(request, business_id):
 def toggle_follow_category(request, category_id):
     """Seguir/dejar de seguir una categoría"""
     if request.method == 'POST':
-        category = get_object_or_404(Category, pk=category_id)
-        
-        if category in request.user.following_categories.all():
-            request.user.following_categories.remove(category)
-            following = False
-        else:
-            request.user.following_categories.add(category)
-            following = True
-        
-        return JsonResponse({
-            'following': following,
-            'followers_count': category.followers.count()
-        })
+        return _reaction_response(request, 'follow_category', category_id, 'following')
     
     return JsonResponse({'error': 'Método no permitido'}, status=405)
 
 
+@login_required
+def reactions_batch_api(request):
+    """
+    Aplicar varias reacciones en una sola petición. Recibe un JSON como
+    {"operations": [{"type": "offer_like", "id": 1, "active": true}, ...]}
+    con los tipos de REACTIONS y el estado deseado de cada una.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Método no permitido'}, status=405)
+    
+    try:
+        payload = json.loads(request.body)['operations']
+        if not isinstance(payload, list):
+            raise TypeError
+    except (ValueError, TypeError, KeyError):
+        return JsonResponse({'error': 'Parámetros inválidos'}, status=400)
+    if not payload or len(payload) > BATCH_MAX_OPERATIONS:
+        return JsonResponse({'error': f'Se requieren entre 1 y {BATCH_MAX_OPERATIONS} operaciones'}, status=400)
+    
+    try:
+        operations = []
+        for operation in payload:
+            kind, target_id, active = operation['type'], operation['id'], operation['active']
+            if kind not in REACTIONS or not isinstance(active, bool) or isinstance(target_id, (bool, float)):
+                raise ValueError
+            # Un id fuera de rango haría fallar la consulta con un error 500
+            target_id = int(target_id)
+            if not 0 < target_id <= MAX_OBJECT_ID:
+                raise ValueError
+            operations.append((kind, target_id, active))
+    except (ValueError, TypeError, KeyError):
+        return JsonResponse({'error': 'Parámetros inválidos'}, status=400)
+    
+    return JsonResponse({'results': apply_reactions(request.user, operations)})
+
+
 @login_required
 def mark_notification_read(request, notification_id):
     """Marcar notificación como leída"""
@@ -1147,45 +1384,59 @@ def search_api(request):
     """API de búsqueda (para autocompletado)"""
     query = request.GET.get('q', '')
     
-    if len(query) < 2:
-        return JsonResponse({'results': []})
+    if request.GET.get('sort') == 'best_deal':
+        return _best_deals_search(request, query)
     
-    # Buscar ofertas
-    offers = Offer.objects.filter(
-        Q(title__icontains=query) | Q(description__icontains=query),
-        is_active=True,
-        expires_at__gt=timezone.now()
-    )[:5]
+    # Ofertas, negocios y categorías desde el índice en memoria (sin consultas)
+    results = autocomplete(query)
     
-    # Buscar empresas
-    businesses = User.objects.filter(
-        business_name__icontains=query,
-        role='business',
-        business_verified=True,
-        business_vetted=False
-    )[:5]
+    return JsonResponse({'results': results})
+
+
+def _best_deals_search(request, query):
+    """Ofertas que coinciden con la búsqueda, mayor ahorro primero y paginadas por cursor"""
+    page = KeysetPaginator(
+        search_offers(query), BEST_DEAL_ORDERING, OFFERS_PAGE_SIZE
+    ).get_page(request.GET.get('cursor'))
     
     results = []
-    
-    for offer in offers:
+    for offer in page:
         results.append({
             'type': 'offer',
             'id': offer.id,
             'title': offer.title,
             'business': offer.business.business_name,
+            'offer_display': offer.offer_display,
+            'final_price': str(offer.final_price),
+            'savings_percentage': round(offer.savings_ratio * 100),
             'url': f'/offers/{offer.id}/'
         })
     
-    for business in businesses:
-        results.append({
-            'type': 'business',
-            'id': business.id,
-            'title': business.business_name,
-            'description': business.business_description[:100],
-            'url': f'/business/{business.id}/'
-        })
+    return JsonResponse({'results': results, 'next_cursor': page.next_cursor})
+
+
+@login_required
+def search_cache_metrics_api(request):
+    """Aciertos y fallos del cache de resultados de búsqueda (solo administradores)"""
+    if not request.user.is_admin:
+        return JsonResponse({'error': 'No autorizado'}, status=403)
     
-    return JsonResponse({'results': results})
+    return JsonResponse(get_search_cache_metrics())
+
+
+def offers_map_api(request):
+    """API de clusters de ofertas para el mapa (bbox=sur,oeste,norte,este y zoom)"""
+    try:
+        south, west, north, east = [float(value) for value in request.GET.get('bbox', '').split(',')]
+        zoom = int(request.GET.get('zoom', 12))
+    except ValueError:
+        return JsonResponse({'error': 'Parámetros inválidos: se requiere bbox=sur,oeste,norte,este y zoom'}, status=400)
+    
+    if not (-90 <= south <= north <= 90 and -180 <= west <= 180 and -180 <= east <= 180):
+        return JsonResponse({'error': 'El bbox está fuera de rango'}, status=400)
+    
+    zoom, clusters = get_offer_clusters(south, west, north, east, zoom)
+    return JsonResponse({'zoom': zoom, 'clusters': clusters})
 
 
 def business_profile(request, pk):
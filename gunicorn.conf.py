@@ -0,0 +1,10 @@
+# Configuración de gunicorn (se carga automáticamente desde el directorio actual)
+
+
+def worker_exit(server, worker):
+    """Guardar las visitas y métricas pendientes en memoria antes de salir"""
+    from core.search import flush_search_metrics
+    from core.view_counter import flush_views
+
+    flush_views()
+    flush_search_metrics()
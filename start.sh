@@ -3,6 +3,7 @@ set -e
 
 echo "🔵 Ejecutando migraciones..."
 python manage.py migrate --noinput
+python manage.py createcachetable
 
 echo "📦 Recolectando archivos estáticos..."
 # Recolectar archivos estáticos con limpieza previa y mostrar información